@@ -0,0 +1,66 @@
+"""
+Векторные calculate_many / totals_by_day против скалярного цикла
+
+    python -m benchmarks.bench_calculator [--rows 100000] [--days 30]
+
+Перед замером проверяется, что результаты совпадают с calculate и
+calculate_total поэлементно.
+"""
+import argparse
+import datetime
+import random
+import time
+from collections import defaultdict
+
+from core.calculator import CalorieCalculator
+
+
+def _best_of(func, runs: int = 5) -> float:
+    best = float("inf")
+    for _ in range(runs):
+        started = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def scalar_totals(dates, calories, limit):
+    by_day = defaultdict(list)
+    for day, value in zip(dates, calories):
+        by_day[day].append(["", value])
+    return {day: CalorieCalculator.calculate_total(by_day[day], limit) for day in sorted(by_day)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--days", type=int, default=30)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    per_100 = [round(rng.uniform(10, 900), rng.choice((0, 1, 2))) for _ in range(args.rows)]
+    weights = [rng.choice((rng.randint(5, 800), round(rng.uniform(5, 800), 1))) for _ in range(args.rows)]
+    start = datetime.date.today() - datetime.timedelta(days=args.days)
+    dates = [start + datetime.timedelta(days=rng.randrange(args.days)) for _ in range(args.rows)]
+
+    scalar = [CalorieCalculator.calculate(c, w) for c, w in zip(per_100, weights)]
+    vector = CalorieCalculator.calculate_many(per_100, weights).tolist()
+    assert vector == scalar, "calculate_many differs from calculate"
+    assert CalorieCalculator.totals_by_day(dates, vector, 2000) == scalar_totals(dates, scalar, 2000), \
+        "totals_by_day differs from calculate_total"
+
+    rows = [
+        ("calculate", lambda: [CalorieCalculator.calculate(c, w) for c, w in zip(per_100, weights)],
+         lambda: CalorieCalculator.calculate_many(per_100, weights)),
+        ("totals_by_day", lambda: scalar_totals(dates, scalar, 2000),
+         lambda: CalorieCalculator.totals_by_day(dates, vector, 2000)),
+    ]
+    print(f"{args.rows} rows, {args.days} days — results identical")
+    print(f"{'operation':<15} {'scalar ms':>10} {'vector ms':>10} {'speedup':>8}")
+    for name, scalar_run, vector_run in rows:
+        scalar_time, vector_time = _best_of(scalar_run), _best_of(vector_run)
+        print(f"{name:<15} {scalar_time * 1000:>10.2f} {vector_time * 1000:>10.2f} {scalar_time / vector_time:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
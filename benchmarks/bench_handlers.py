@@ -0,0 +1,220 @@
+"""
+Микробенчмарк обработчиков BotHandlers
+
+    python -m benchmarks.bench_handlers [--iterations 2000]
+
+Каждый обработчик гоняется с лёгкими фейковыми Update/Context против
+InMemoryDatabase. Для каждого считаются задержка (p50/p95), пиковая память
+на вызов (tracemalloc) и число round trip'ов к БД на вызов. Если обработчик
+выходит за бюджет из BUDGETS, скрипт завершается с кодом 1.
+"""
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+import tracemalloc
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional
+
+from benchmarks.fake_db import InMemoryDatabase
+from bot.handlers import BotHandlers
+from core.calculator import CalorieCalculator
+
+
+class FakeMessage:
+    __slots__ = ("text", "replies")
+
+    def __init__(self, text: str):
+        self.text = text
+        self.replies = 0
+
+    async def reply_text(self, text, **kwargs):
+        self.replies += 1
+
+    async def reply_document(self, document, **kwargs):
+        self.replies += 1
+
+
+class FakeUser:
+    __slots__ = ("id",)
+
+    def __init__(self, user_id: int):
+        self.id = user_id
+
+
+class FakeUpdate:
+    __slots__ = ("message", "effective_user", "effective_chat")
+
+    def __init__(self, user_id: int, text: str):
+        self.message = FakeMessage(text)
+        self.effective_user = FakeUser(user_id)
+        self.effective_chat = self.effective_user
+
+
+class FakeContext:
+    __slots__ = ("user_data", "args")
+
+    def __init__(self, user_data: dict = None):
+        self.user_data = dict(user_data or {})
+        self.args = []
+
+
+@dataclass(frozen=True)
+class Budget:
+    """Бюджет обработчика: round trip'ы к БД и p95 задержки на вызов"""
+    db_calls: float
+    p95_ms: float
+
+
+@dataclass(frozen=True)
+class Scenario:
+    name: str
+    method: str
+    text: str
+    user_data: Optional[dict] = None
+
+
+@dataclass
+class HandlerResult:
+    name: str
+    p50_ms: float
+    p95_ms: float
+    peak_kib: float
+    db_calls: float
+
+    def violations(self, budget: Budget) -> List[str]:
+        problems = []
+        if self.db_calls > budget.db_calls:
+            problems.append(f"{self.name}: {self.db_calls:.2f} DB calls > budget {budget.db_calls}")
+        if self.p95_ms > budget.p95_ms:
+            problems.append(f"{self.name}: p95 {self.p95_ms:.3f} ms > budget {budget.p95_ms} ms")
+        return problems
+
+
+SCENARIOS = [
+    Scenario("start", "start", "/start"),
+    Scenario("handle_start_button", "handle_start_button", "Начать"),
+    Scenario("handle_today_calories", "handle_today_calories", "🔥 Калории сегодня"),
+    Scenario("handle_statistics", "handle_statistics", "📈 Статистика"),
+    Scenario("export_history", "export_history", "/export"),
+    Scenario("start_calories_setup", "start_calories_setup", "📅 Установить суточные калории"),
+    Scenario("set_calories", "set_calories", "2000"),
+    Scenario("start_product_adding", "start_product_adding", "➕ Добавить калории"),
+    Scenario("set_product_name:exact", "set_product_name", "яблоко"),
+    Scenario("set_product_name:lemma", "set_product_name", "Яблоки"),
+    Scenario("set_product_name:typo", "set_product_name", "ябоко"),
+    Scenario("set_product_weight", "set_product_weight", "150",
+             {"product_name": "яблоко", "calories_per_hundred": 52}),
+    Scenario("add_calories_for_today", "add_calories_for_today", "120", {"product_name": "пирог бабушкин"}),
+    Scenario("start_new_product_adding", "start_new_product_adding", "🍗 Добавить продукт"),
+    Scenario("start_new_product_calories", "start_new_product_calories", "Авокадо"),
+    Scenario("save_new_product", "save_new_product", "160", {"product_name_input": "Авокадо"}),
+    Scenario("cancel", "cancel", "/cancel"),
+    Scenario("handle_cancel_button", "handle_cancel_button", "❌ Отмена"),
+]
+
+# Повторный пользователь: профиль в кэше, каталог загружен
+_NO_DB = Budget(db_calls=0, p95_ms=2.0)
+BUDGETS: Dict[str, Budget] = {
+    "start": _NO_DB,
+    "handle_start_button": _NO_DB,
+    "handle_today_calories": Budget(db_calls=1, p95_ms=2.0),
+    "handle_statistics": Budget(db_calls=1, p95_ms=2.0),
+    # Временный файл на диске и запись CSV
+    "export_history": Budget(db_calls=1, p95_ms=5.0),
+    "start_calories_setup": _NO_DB,
+    "set_calories": Budget(db_calls=1, p95_ms=2.0),
+    "start_product_adding": _NO_DB,
+    "set_product_name:exact": _NO_DB,
+    # Промах каталога по сырому вводу проверяется в БД (продукт мог добавить другой процесс)
+    "set_product_name:lemma": Budget(db_calls=1, p95_ms=5.0),
+    "set_product_name:typo": Budget(db_calls=1, p95_ms=5.0),
+    "set_product_weight": Budget(db_calls=1, p95_ms=2.0),
+    "add_calories_for_today": Budget(db_calls=1, p95_ms=2.0),
+    "start_new_product_adding": _NO_DB,
+    "start_new_product_calories": _NO_DB,
+    "save_new_product": Budget(db_calls=1, p95_ms=2.0),
+    "cancel": _NO_DB,
+    "handle_cancel_button": _NO_DB,
+}
+
+USER_ID = 100500
+
+
+async def _prepare() -> BotHandlers:
+    db = InMemoryDatabase()
+    await db.connect()
+    handlers = BotHandlers(db, CalorieCalculator())
+    # Повторный пользователь с лимитом и парой записей за сегодня
+    await handlers.handle_start_button(FakeUpdate(USER_ID, "Начать"), FakeContext())
+    await handlers.set_calories(FakeUpdate(USER_ID, "2000"), FakeContext())
+    await db.add_calories_batch(USER_ID, [("овсянка", 350.0), ("яблоко", 78.0)])
+    return handlers
+
+
+async def _measure(handlers: BotHandlers, scenario: Scenario, iterations: int) -> HandlerResult:
+    method: Callable = getattr(handlers, scenario.method)
+    db: InMemoryDatabase = handlers.db
+
+    # Прогрев: кэши профилей, лемм и т.п. как у живого бота
+    for _ in range(10):
+        await method(FakeUpdate(USER_ID, scenario.text), FakeContext(scenario.user_data))
+
+    timings = []
+    calls_before = db.round_trips
+    for _ in range(iterations):
+        update, context = FakeUpdate(USER_ID, scenario.text), FakeContext(scenario.user_data)
+        started = time.perf_counter()
+        await method(update, context)
+        timings.append(time.perf_counter() - started)
+    db_calls = (db.round_trips - calls_before) / iterations
+
+    tracemalloc.start()
+    peaks = []
+    for _ in range(min(iterations, 200)):
+        update, context = FakeUpdate(USER_ID, scenario.text), FakeContext(scenario.user_data)
+        current, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        await method(update, context)
+        peaks.append(tracemalloc.get_traced_memory()[1] - current)
+    tracemalloc.stop()
+
+    timings.sort()
+    return HandlerResult(
+        name=scenario.name,
+        p50_ms=statistics.median(timings) * 1000,
+        p95_ms=timings[int(len(timings) * 0.95) - 1] * 1000,
+        peak_kib=statistics.mean(peaks) / 1024,
+        db_calls=db_calls
+    )
+
+
+async def run_benchmarks(iterations: int = 2000) -> List[HandlerResult]:
+    handlers = await _prepare()
+    return [await _measure(handlers, scenario, iterations) for scenario in SCENARIOS]
+
+
+def check_budgets(results: List[HandlerResult], budgets: Dict[str, Budget] = None) -> List[str]:
+    budgets = budgets or BUDGETS
+    return [problem for result in results for problem in result.violations(budgets[result.name])]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+
+    results = asyncio.run(run_benchmarks(args.iterations))
+    print(f"{'handler':<28} {'p50 ms':>8} {'p95 ms':>8} {'peak KiB':>9} {'DB calls':>9}")
+    for r in results:
+        print(f"{r.name:<28} {r.p50_ms:>8.3f} {r.p95_ms:>8.3f} {r.peak_kib:>9.1f} {r.db_calls:>9.2f}")
+
+    problems = check_budgets(results)
+    for problem in problems:
+        print(f"OVER BUDGET  {problem}")
+    sys.exit(1 if problems else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""
+Стоимость холодного импорта bot.main
+
+    python -m benchmarks.bench_startup [--runs 10] [--module bot.main]
+
+Каждый замер — отдельный процесс интерпретатора, чтобы не мешал кэш модулей.
+Отдельно меряется первая лемматизация: с ленивым MorphAnalyzer загрузка словарей
+переезжает из импорта в первое обращение.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_IMPORT_SNIPPET = """
+import time
+started = time.perf_counter()
+import {module}
+print(time.perf_counter() - started)
+"""
+
+_LEMMA_SNIPPET = """
+import time
+from core.str_utils import get_lemma_word
+started = time.perf_counter()
+get_lemma_word("яблоки")
+print(time.perf_counter() - started)
+"""
+
+
+def measure(snippet: str, runs: int) -> list:
+    env = dict(os.environ, BOT_TOKEN=os.getenv("BOT_TOKEN", "0:benchmark"))
+    timings = []
+    for _ in range(runs):
+        output = subprocess.check_output([sys.executable, "-c", snippet], cwd=ROOT, env=env,
+                                         stderr=subprocess.DEVNULL, text=True)
+        timings.append(float(output.strip().splitlines()[-1]))
+    return timings
+
+
+def report(title: str, timings: list):
+    print(f"{title:<28} median {statistics.median(timings) * 1000:8.1f} ms"
+          f"   min {min(timings) * 1000:8.1f} ms   max {max(timings) * 1000:8.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--module", default="bot.main")
+    args = parser.parse_args()
+
+    report(f"import {args.module}", measure(_IMPORT_SNIPPET.format(module=args.module), args.runs))
+    report("first get_lemma_word", measure(_LEMMA_SNIPPET, args.runs))
+
+
+if __name__ == "__main__":
+    main()
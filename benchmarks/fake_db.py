@@ -0,0 +1,233 @@
+import datetime
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+from core.db import Database, RangeSummary, UserDaySnapshot, _load_aliases, _load_json
+from core.search import ProductSearchIndex, normalize_name
+
+
+class InMemoryDatabase(Database):
+    """
+    Заменитель Database в памяти для бенчмарков и нагрузочных тестов
+
+    Повторяет публичный API и семантику core.db.Database, но вместо Postgres
+    хранит всё в словарях. Каждый метод, который в настоящей Database ходит
+    в пул, увеличивает счётчик round trip'ов — так видно, сколько запросов
+    к БД стоит обработка одного обновления. Кэш каталога и поисковый индекс
+    используются настоящие.
+    """
+
+    def __init__(self, seed_products: bool = True):
+        super().__init__()
+        self.calls: Counter = Counter()
+        self._users: Dict[int, int] = {}
+        self._products: Dict[str, Tuple[str, int, str]] = {}
+        # нормализованный синоним → каноническое название
+        self._aliases: Dict[str, str] = {}
+        self._history: Dict[Tuple[int, datetime.date], List[List]] = {}
+        self._conversations: Dict[str, Dict[str, int]] = {}
+        self._user_data: Dict[int, dict] = {}
+        if seed_products:
+            for i, product in enumerate(_load_json("products.json")["products_calories_per_hundred"]):
+                name = product["product"]
+                self._products[name] = (str(i), product["calories_per_hundred"], name)
+            for name, aliases in _load_aliases().items():
+                for alias in aliases:
+                    if name in self._products:
+                        self._aliases.setdefault(normalize_name(alias), name)
+
+    @property
+    def round_trips(self) -> int:
+        return sum(self.calls.values())
+
+    def _round_trip(self, name: str):
+        self.calls[name] += 1
+
+    async def connect(self):
+        if self.catalog.loaded:
+            return
+        self.catalog.load(
+            [{"id": info[0], "calories_per_hundred": info[1], "product_name": info[2]}
+             for info in self._products.values()],
+            [{"alias": alias, "product_id": self._products[name][0]} for alias, name in self._aliases.items()]
+        )
+        self.search_index = ProductSearchIndex()
+        for name in self.catalog.names():
+            self.search_index.add(name, self.catalog.aliases(name))
+
+    async def disconnect(self):
+        pass
+
+    async def flush_history(self):
+        pass
+
+    # ─── Users ───
+
+    async def check_user_exists(self, telegram_id: int) -> bool:
+        self._round_trip("check_user_exists")
+        return telegram_id in self._users
+
+    async def add_user(self, telegram_id: int):
+        self._round_trip("add_user")
+        self._users.setdefault(telegram_id, 0)
+
+    async def ensure_user(self, telegram_id: int) -> Optional[int]:
+        self._round_trip("ensure_user")
+        return self._limit(self._users.setdefault(telegram_id, 0))
+
+    async def set_daily_calories(self, telegram_id: int, daily_calories: int) -> bool:
+        self._round_trip("set_daily_calories")
+        if telegram_id not in self._users:
+            return False
+        self._users[telegram_id] = daily_calories
+        return True
+
+    async def get_daily_limit(self, telegram_id: int) -> Optional[int]:
+        self._round_trip("get_daily_limit")
+        return self._limit(self._users.get(telegram_id))
+
+    @staticmethod
+    def _limit(daily_calories: Optional[int]) -> Optional[int]:
+        return daily_calories if daily_calories and daily_calories > 0 else None
+
+    # ─── Products ───
+
+    async def get_product_info(self, product_name: str) -> Optional[Tuple]:
+        info = self.catalog.get(product_name)
+        if info is not None:
+            return info
+        self._round_trip("get_product_info")
+        info = self._products.get(product_name) or self._products.get(self._aliases.get(normalize_name(product_name)))
+        if info is not None:
+            self.catalog.put(info[0], info[2], info[1])
+            self.catalog.put_alias(product_name, info[2])
+        return info
+
+    async def add_product(self, product_name: str, calories_per_hundred: int) -> bool:
+        existing = self.search_index.lookup(product_name)
+        if existing is not None:
+            if normalize_name(existing) != normalize_name(product_name):
+                await self.add_alias(product_name, existing)
+            return False
+        self._round_trip("add_product")
+        if product_name in self._products:
+            return False
+        info = (str(len(self._products)), calories_per_hundred, product_name)
+        self._products[product_name] = info
+        self.catalog.put(info[0], info[2], info[1])
+        self.search_index.add(product_name)
+        return True
+
+    async def add_alias(self, alias: str, product_name: str):
+        self._round_trip("add_alias")
+        self._aliases.setdefault(normalize_name(alias), product_name)
+        self.catalog.put_alias(alias, product_name)
+        self.search_index.add(product_name, [alias])
+
+    async def get_products_info(self) -> List[List]:
+        self._round_trip("get_products_info")
+        return [[name, info[1]] for name, info in self._products.items()]
+
+    # ─── Calories history ───
+
+    def _today(self, telegram_id: int) -> List[List]:
+        return self._history.setdefault((telegram_id, datetime.date.today()), [])
+
+    async def get_today_calories(self, telegram_id: int) -> Optional[List[List]]:
+        self._round_trip("get_today_calories")
+        entries = self._today(telegram_id)
+        return [list(entry) for entry in entries] if entries else None
+
+    async def get_user_day_snapshot(self, telegram_id: int) -> UserDaySnapshot:
+        self._round_trip("get_user_day_snapshot")
+        is_new = telegram_id not in self._users
+        limit = self._limit(self._users.setdefault(telegram_id, 0))
+        entries = self._today(telegram_id)
+        return UserDaySnapshot(
+            telegram_id=telegram_id,
+            daily_limit=limit,
+            total=float(round(sum(c for _, c in entries), 2)),
+            items_count=len(entries),
+            entries=[list(entry) for entry in entries],
+            is_new_user=is_new
+        )
+
+    async def get_range_summary(self, telegram_id: int, start: datetime.date, end: datetime.date,
+                                top_products: Optional[int] = 10) -> RangeSummary:
+        self._round_trip("get_range_summary")
+        return self._summary(telegram_id, start, end, top_products)
+
+    def _summary(self, telegram_id: int, start: datetime.date, end: datetime.date,
+                 top_products: Optional[int]) -> RangeSummary:
+        summary = RangeSummary(telegram_id, start, end, self._limit(self._users.get(telegram_id)))
+        products: Dict[str, List] = {}
+        for (user, day), entries in sorted(self._history.items()):
+            if user != telegram_id or not start <= day <= end or not entries:
+                continue
+            summary.days.append((day, float(round(sum(c for _, c in entries), 2)), len(entries)))
+            for name, calories in entries:
+                stats = products.setdefault(name, [name, 0.0, 0])
+                stats[1] += calories
+                stats[2] += 1
+        if top_products != 0:
+            ranked = sorted(products.values(), key=lambda item: (-item[1], item[0]))
+            summary.products = [tuple(item) for item in ranked[:top_products]]
+        return summary
+
+    async def get_recent_summary(self, telegram_id: int, days: int,
+                                 top_products: Optional[int] = 0) -> RangeSummary:
+        end = datetime.date.today()
+        self._round_trip("get_recent_summary")
+        return self._summary(telegram_id, end - datetime.timedelta(days=days - 1), end, top_products)
+
+    async def stream_history(self, telegram_id: int, start: datetime.date = None, end: datetime.date = None,
+                             batch_size: int = 1000):
+        self._round_trip("stream_history")
+        start = start or datetime.date.min
+        end = end or datetime.date.max
+        for (user, day), entries in sorted(self._history.items()):
+            if user == telegram_id and start <= day <= end:
+                for order_id, (name, calories) in enumerate(entries, 1):
+                    yield day, order_id, name, calories
+
+    async def add_calories_for_today(self, telegram_id: int, calories: float,
+                                     product_name: str) -> Optional[Tuple[int, str, float, float]]:
+        self._round_trip("add_calories_for_today")
+        entries = self._today(telegram_id)
+        entries.append([product_name, round(float(calories), 2)])
+        return len(entries), product_name, round(float(calories), 2), float(round(sum(c for _, c in entries), 2))
+
+    async def add_calories_batch(self, telegram_id: int, entries: List[Tuple[str, float]]) -> float:
+        if not entries:
+            return 0.0
+        self._round_trip("add_calories_batch")
+        today = self._today(telegram_id)
+        today.extend([name, round(float(calories), 2)] for name, calories in entries)
+        return float(round(sum(c for _, c in today), 2))
+
+    # ─── Bot persistence ───
+
+    async def load_conversations(self, name: str, max_age_hours: float) -> Dict[str, int]:
+        self._round_trip("load_conversations")
+        return dict(self._conversations.get(name, {}))
+
+    async def save_conversations(self, name: str, states: Dict[str, Optional[int]]):
+        self._round_trip("save_conversations")
+        stored = self._conversations.setdefault(name, {})
+        for key, state in states.items():
+            if state is None:
+                stored.pop(key, None)
+            else:
+                stored[key] = state
+
+    async def load_user_data(self, max_age_hours: float) -> Dict[int, dict]:
+        self._round_trip("load_user_data")
+        return {telegram_id: dict(data) for telegram_id, data in self._user_data.items()}
+
+    async def save_user_data(self, data: Dict[int, Optional[dict]]):
+        self._round_trip("save_user_data")
+        for telegram_id, value in data.items():
+            if value is None:
+                self._user_data.pop(telegram_id, None)
+            else:
+                self._user_data[telegram_id] = dict(value)
@@ -0,0 +1,238 @@
+"""
+Нагрузочный тест: тысячи пользователей против локального заменителя Bot API
+
+    python -m benchmarks.loadtest [--users 2000] [--sessions 5] [--concurrency 256] [--db memory|postgres]
+
+Поднимает create_application() с base_url на локальный HTTP-сервер, который
+отвечает как Bot API, и с базой в памяти (или настоящей Postgres из .env).
+Каждый пользователь по очереди проходит сценарии «➕ Добавить калории» →
+название → вес и «🔥 Калории сегодня», отправляя следующее сообщение только
+после ответа бота. Задержка — от постановки обновления в очередь до прихода
+sendMessage этому пользователю на заменитель Bot API.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import random
+import statistics
+import time
+from itertools import count
+from typing import Dict, List, Optional
+from urllib.parse import parse_qsl
+
+from telegram import Update
+
+from benchmarks.fake_db import InMemoryDatabase
+from bot.main import create_application
+from core.db import Database
+
+ADD_CALORIES = "➕ Добавить калории"
+TODAY_CALORIES = "🔥 Калории сегодня"
+
+_BOT_TOKEN = "123456:loadtest"
+
+_BOT_USER = {"id": 123456, "is_bot": True, "first_name": "CaloriesCalc", "username": "calories_calc_bot"}
+
+
+class FakeBotApi:
+    """
+    Минимальный HTTP/1.1 сервер, отвечающий на методы Bot API
+
+    sendMessage будит того, кто ждёт ответа для этого chat_id; остальные
+    методы просто возвращают успех.
+    """
+
+    def __init__(self):
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._waiters: Dict[int, asyncio.Future] = {}
+        self._message_ids = count(1)
+        self.requests = 0
+        self.port = 0
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0):
+        self._server = await asyncio.start_server(self._handle, host, port)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        self._server.close()
+        await self._server.wait_closed()
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.port}/bot"
+
+    def expect_reply(self, chat_id: int) -> asyncio.Future:
+        future = asyncio.get_running_loop().create_future()
+        self._waiters[chat_id] = future
+        return future
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method_path = request_line.split()[1].decode()
+                length = 0
+                while True:
+                    header = await reader.readline()
+                    if header in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = header.decode("latin-1").partition(":")
+                    if name.strip().lower() == "content-length":
+                        length = int(value)
+                body = await reader.readexactly(length) if length else b""
+                payload = json.dumps({"ok": True, "result": self._dispatch(method_path, body)}).encode()
+                writer.write(
+                    b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                    b"Content-Length: " + str(len(payload)).encode() + b"\r\n\r\n" + payload
+                )
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    def _dispatch(self, path: str, body: bytes):
+        self.requests += 1
+        endpoint = path.rsplit("/", 1)[-1]
+        if endpoint == "getMe":
+            return _BOT_USER
+        if endpoint != "sendMessage":
+            return True
+        params = dict(parse_qsl(body.decode()))
+        chat_id = int(params["chat_id"])
+        waiter = self._waiters.pop(chat_id, None)
+        if waiter is not None and not waiter.done():
+            waiter.set_result(time.perf_counter())
+        return {
+            "message_id": next(self._message_ids),
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "from": _BOT_USER,
+            "text": params.get("text", "")
+        }
+
+
+class LoadGenerator:
+    """Виртуальные пользователи, которые переписываются с ботом"""
+
+    def __init__(self, app, api: FakeBotApi, products: List[str], timeout: float = 30.0):
+        self.app = app
+        self.api = api
+        self.products = products
+        self.timeout = timeout
+        self.latencies: Dict[str, List[float]] = {}
+        self.errors = 0
+        self._update_ids = count(1)
+
+    async def send(self, user_id: int, text: str, step: str):
+        update = Update.de_json({
+            "update_id": next(self._update_ids),
+            "message": {
+                "message_id": next(self._update_ids),
+                "date": int(time.time()),
+                "chat": {"id": user_id, "type": "private"},
+                "from": {"id": user_id, "is_bot": False, "first_name": f"user{user_id}"},
+                "text": text
+            }
+        }, self.app.bot)
+        reply = self.api.expect_reply(user_id)
+        started = time.perf_counter()
+        await self.app.update_queue.put(update)
+        try:
+            replied = await asyncio.wait_for(reply, self.timeout)
+        except asyncio.TimeoutError:
+            self.errors += 1
+            return
+        self.latencies.setdefault(step, []).append(replied - started)
+
+    async def user_session(self, user_id: int, rng: random.Random, think_time: float):
+        if rng.random() < 0.7:
+            await self.send(user_id, ADD_CALORIES, "add")
+            await asyncio.sleep(rng.uniform(0, think_time))
+            await self.send(user_id, rng.choice(self.products), "name")
+            await asyncio.sleep(rng.uniform(0, think_time))
+            await self.send(user_id, str(rng.randint(30, 400)), "weight")
+        else:
+            await self.send(user_id, TODAY_CALORIES, "today")
+        await asyncio.sleep(rng.uniform(0, think_time))
+
+    async def run_user(self, user_id: int, sessions: int, think_time: float, limiter: asyncio.Semaphore):
+        rng = random.Random(user_id)
+        async with limiter:
+            for _ in range(sessions):
+                await self.user_session(user_id, rng, think_time)
+
+
+def _percentile(sorted_values: List[float], q: float) -> float:
+    index = min(len(sorted_values) - 1, int(round(q * (len(sorted_values) - 1))))
+    return sorted_values[index] * 1000
+
+
+def print_report(generator: LoadGenerator, elapsed: float):
+    everything = sorted(v for values in generator.latencies.values() for v in values)
+    print(f"{'step':<8} {'count':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for step, values in [*sorted(generator.latencies.items()), ("total", everything)]:
+        values = sorted(values)
+        if not values:
+            continue
+        print(f"{step:<8} {len(values):>8} {_percentile(values, 0.5):>8.2f} "
+              f"{_percentile(values, 0.95):>8.2f} {_percentile(values, 0.99):>8.2f}")
+    print(f"\n{len(everything)} updates in {elapsed:.2f}s — {len(everything) / elapsed:.0f} updates/s, "
+          f"{generator.errors} timeouts, mean {statistics.mean(everything) * 1000 if everything else 0:.2f} ms")
+
+
+async def run(users: int, sessions: int, concurrency: int, concurrent_updates: int,
+              think_time: float, use_postgres: bool) -> LoadGenerator:
+    api = FakeBotApi()
+    await api.start()
+    db = Database() if use_postgres else InMemoryDatabase()
+    # Виртуальные пользователи пишут без пауз: ограничение частоты приняло бы их за флуд
+    app, _ = create_application(concurrent_updates, with_updater=False, db=db, base_url=api.base_url,
+                                token=_BOT_TOKEN, rate_limit=0)
+
+    await app.initialize()
+    await app.post_init(app)
+    await app.start()
+    products = db.catalog.names()
+    generator = LoadGenerator(app, api, products)
+    # Пользователи из отдельного диапазона, чтобы не смешиваться с настоящими в Postgres
+    first_user = 9_000_000_000
+    limiter = asyncio.Semaphore(concurrency)
+    started = time.perf_counter()
+    try:
+        await asyncio.gather(*(
+            generator.run_user(first_user + i, sessions, think_time, limiter) for i in range(users)
+        ))
+    finally:
+        elapsed = time.perf_counter() - started
+        await app.stop()
+        await app.shutdown()
+        await app.post_shutdown(app)
+        await api.stop()
+    print_report(generator, elapsed)
+    return generator
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=2000, help="число виртуальных пользователей")
+    parser.add_argument("--sessions", type=int, default=5, help="сценариев на пользователя")
+    parser.add_argument("--concurrency", type=int, default=256, help="пользователей онлайн одновременно")
+    parser.add_argument("--concurrent-updates", type=int, default=64, help="BOT_CONCURRENT_UPDATES бота")
+    parser.add_argument("--think-ms", type=float, default=0, help="максимальная пауза между сообщениями")
+    parser.add_argument("--db", choices=("memory", "postgres"), default="memory")
+    args = parser.parse_args()
+
+    # Лог каждого HTTP-запроса к заменителю Bot API только мешает
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    asyncio.run(run(
+        args.users, args.sessions, args.concurrency, args.concurrent_updates,
+        args.think_ms / 1000, args.db == "postgres"
+    ))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+import logging
+import time
+from collections import OrderedDict
+from typing import Callable, List, Optional, Set, Tuple
+
+from telegram import Update
+
+logger = logging.getLogger(__name__)
+
+# Кнопки и команды, повтор которых ничего не меняет: ответ на второе нажатие
+# тот же, что на первое, пока оно ещё ждёт очереди
+COALESCED_TEXTS = frozenset({"🔥 Калории сегодня", "📈 Статистика", "/start"})
+
+REJECT_COALESCED = "coalesced"
+REJECT_QUEUE_FULL = "queue_full"
+REJECT_RATE_LIMITED = "rate_limited"
+
+# Ответ на первое отброшенное обновление: без него недошедший ввод (например,
+# вес в диалоге добавления) выглядел бы как зависший бот
+TOO_FREQUENT_TEXT = "⏳ Слишком часто. Подождите пару секунд и отправьте последнее сообщение ещё раз"
+
+
+def coalesce_key(update: object) -> Optional[str]:
+    """Ключ склейки для идемпотентного нажатия, None для остальных обновлений"""
+    if not isinstance(update, Update) or update.message is None:
+        return None
+    text = update.message.text
+    return text if text in COALESCED_TEXTS else None
+
+
+class AdmissionController:
+    """
+    Допуск обновлений пользователя до блокировки и обработчиков
+
+    Проверки по порядку:
+      * то же идемпотентное нажатие уже ждёт в очереди пользователя — новое
+        отбрасывается, ответ даст ожидающее;
+      * в очереди пользователя уже max_pending обновлений — отбрасывается;
+      * у пользователя кончились токены (rate в секунду, запас burst) —
+        отбрасывается. rate <= 0 отключает ограничение.
+
+    Отброшенное обновление не ждёт блокировку и не берёт соединение из пула.
+    О первом отказе подряд (кроме склейки) пользователя стоит предупредить —
+    см. should_notify.
+    """
+
+    def __init__(self, rate: float = 1.0, burst: int = 10, max_pending: int = 5,
+                 clock: Callable[[], float] = time.monotonic):
+        self.rate = rate
+        self.burst = burst
+        self.max_pending = max_pending
+        self._clock = clock
+        # uid → [токены, время обновления]; по возрастанию времени
+        self._buckets: "OrderedDict[int, List[float]]" = OrderedDict()
+        self._queued: Set[Tuple[int, str]] = set()
+        # Пользователи, уже получившие TOO_FREQUENT_TEXT с последнего допуска
+        self._notified: Set[int] = set()
+        self.admitted = 0
+        self.rejected = {REJECT_COALESCED: 0, REJECT_QUEUE_FULL: 0, REJECT_RATE_LIMITED: 0}
+
+    def admit(self, uid: int, key: Optional[str], queue_depth: int) -> Optional[str]:
+        """
+        Решение по обновлению
+
+        Args:
+            key: ключ склейки (coalesce_key) или None
+            queue_depth: сколько обновлений пользователя сейчас держат или ждут блокировку
+
+        Returns:
+            None, если обновление допущено (и тогда key помечен ждущим до dequeue),
+            иначе причина отказа
+        """
+        if key is not None and (uid, key) in self._queued:
+            reason = REJECT_COALESCED
+        elif queue_depth > self.max_pending:
+            reason = REJECT_QUEUE_FULL
+        elif not self._take_token(uid):
+            reason = REJECT_RATE_LIMITED
+        else:
+            if key is not None:
+                self._queued.add((uid, key))
+            self._notified.discard(uid)
+            self.admitted += 1
+            return None
+        self.rejected[reason] += 1
+        return reason
+
+    def dequeue(self, uid: int, key: Optional[str]) -> None:
+        """Обновление дождалось блокировки (или отменено) и больше не склеивает повторы"""
+        if key is not None:
+            self._queued.discard((uid, key))
+
+    def should_notify(self, uid: int, reason: str) -> bool:
+        """Предупреждать ли об отказе: один раз до следующего допуска, склейку — никогда"""
+        if reason == REJECT_COALESCED or uid in self._notified:
+            return False
+        self._notified.add(uid)
+        return True
+
+    def _take_token(self, uid: int) -> bool:
+        if self.rate <= 0:
+            return True
+        now = self._clock()
+        bucket = self._buckets.get(uid)
+        if bucket is None:
+            bucket = self._buckets[uid] = [float(self.burst), now]
+        else:
+            bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+            self._buckets.move_to_end(uid)
+        self._prune(now)
+        if bucket[0] < 1:
+            return False
+        bucket[0] -= 1
+        if bucket[0] < 1:
+            logger.info(f"[ADMISSION] user {uid} hit the rate limit")
+        return True
+
+    def _prune(self, now: float) -> None:
+        # Корзина, не тронутая burst / rate секунд, снова полна — хранить её незачем
+        refill = self.burst / self.rate
+        while self._buckets:
+            uid, (_, updated) = next(iter(self._buckets.items()))
+            if now - updated < refill:
+                break
+            del self._buckets[uid]
+            self._notified.discard(uid)
+
+    def stats(self) -> dict:
+        return {
+            "admitted": self.admitted,
+            **self.rejected,
+            "tracked_users": len(self._buckets),
+            "queued_idempotent": len(self._queued),
+        }
@@ -1,5 +1,8 @@
-import asyncio
+import datetime
 import logging
+import tempfile
+from contextlib import aclosing
+from typing import Optional
 from telegram import Update
 from telegram.ext import (
     CommandHandler,
@@ -11,24 +14,42 @@ from telegram.ext import (
 
 from bot.states import DialogState
 from bot.keyboards import Keyboards
+from bot.locks import UserLock, UserLockRegistry
+from bot.profile_cache import MISSING, UserProfileCache
 from core.calculator import CalorieCalculator
 from core.db import Database
+from core.export import EXPORT_FORMATS, ExportError, export_history as export_file
 from core.str_utils import send_card, print_daily_report
 from core.validator import InputValidator, ValidationResult
 
 logger = logging.getLogger(__name__)
 
+# Периоды статистики в днях, по возрастанию
+STATS_PERIODS = (7, 30)
+
 
 class BotHandlers:
     """Обработчики команд с внедрением зависимостей"""
 
-    def __init__(self, db: Database, calculator: CalorieCalculator):
+    def __init__(self, db: Database, calculator: CalorieCalculator, profiles: UserProfileCache = None):
         self.db = db
         self.calculator = calculator
-        self._locks: dict[int, asyncio.Lock] = {}
+        self.profiles = profiles or UserProfileCache()
+        self._locks = UserLockRegistry()
+
+    def _lock(self, uid: int) -> UserLock:
+        return self._locks(uid)
+
+    def lock_stats(self) -> dict:
+        return self._locks.stats()
 
-    def _lock(self, uid: int) -> asyncio.Lock:
-        return self._locks.setdefault(uid, asyncio.Lock())
+    async def _ensure_user(self, user_id: int) -> Optional[int]:
+        """Дневной лимит пользователя; к БД обращается только при промахе кэша профилей"""
+        daily_limit = self.profiles.get(user_id)
+        if daily_limit is MISSING:
+            daily_limit = await self.db.ensure_user(user_id)
+            self.profiles.set(user_id, daily_limit)
+        return daily_limit
 
     async def start(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Обработка команды /start"""
@@ -50,8 +71,7 @@ class BotHandlers:
         """Обработка кнопки 'Начать'"""
         async with self._lock(update.effective_user.id):
             user_id = update.effective_user.id
-            if not await self.db.check_user_exists(user_id):
-                await self.db.add_user(user_id)
+            await self._ensure_user(user_id)
 
             await send_card(
                 update,
@@ -67,21 +87,98 @@ class BotHandlers:
         """Просмотр калорий за сегодня"""
         async with self._lock(update.effective_user.id):
             user_id = update.effective_user.id
-            if not await self.db.check_user_exists(user_id):
-                await self.db.add_user(user_id)
-
-            report = await self.db.get_today_calories(user_id)
-            limit = await self.db.get_daily_limit(user_id)
-
-            if report:
-                text = print_daily_report(report)
+            # Пользователь, лимит и записи за сегодня — один запрос к БД
+            snapshot = await self.db.get_user_day_snapshot(user_id)
+            self.profiles.set(user_id, snapshot.daily_limit)
+
+            if snapshot.items_count:
+                summary = self.calculator.calculate_summary(snapshot.total, snapshot.items_count, snapshot.daily_limit)
+                text = print_daily_report(snapshot.entries, total=summary['total'])
+                limit = snapshot.daily_limit
                 if limit:
                     text += f"\nВаш дневной лимит: {limit} калорий"
+                    if summary['exceeded']:
+                        text += f"\nЛимит превышен на {round(summary['total'] - limit, 2)} калорий"
+                    else:
+                        text += f"\nОсталось: {round(summary['remaining'], 2)} калорий"
                 await update.message.reply_text(text, reply_markup=Keyboards.get_main_keyboard())
             else:
                 await update.message.reply_text("Сегодня калории не записаны",
                                                 reply_markup=Keyboards.get_main_keyboard())
 
+    async def handle_statistics(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Итоги за 7 и 30 дней относительно дневного лимита"""
+        async with self._lock(update.effective_user.id):
+            user_id = update.effective_user.id
+            # Только daily_totals: строк не больше 30, сколько бы записей ни было.
+            # Профиль в кэш не кладём: этот запрос не создаёт пользователя
+            summary = await self.db.get_recent_summary(user_id, STATS_PERIODS[-1], top_products=0)
+
+            if not summary.days:
+                await update.message.reply_text("За последние 30 дней калории не записаны",
+                                                reply_markup=Keyboards.get_main_keyboard())
+                return
+
+            lines = ["📈 <b>Статистика</b>", "━━━━━━━━━━━━━━━"]
+            for period in STATS_PERIODS:
+                since = summary.end - datetime.timedelta(days=period - 1)
+                report = self.calculator.calculate_period(
+                    [total for day, total, _ in summary.days if day >= since], period, summary.daily_limit
+                )
+                lines.append(f"\n<b>За {period} дней</b> (дней с записями: {report['logged_days']})")
+                lines.append(f"🔥 Всего: <b>{report['total']}</b> ккал")
+                lines.append(f"📊 В среднем: <b>{report['average']}</b> ккал/день")
+                if summary.daily_limit:
+                    delta = report['average_delta']
+                    direction = "выше" if delta > 0 else "ниже"
+                    lines.append(f"🎯 Среднее {direction} лимита на {abs(delta)} ккал, "
+                                 f"дней с превышением: {report['days_over_limit']}")
+            if not summary.daily_limit:
+                lines.append("\nУстановите дневной лимит, чтобы сравнивать с ним")
+            await update.message.reply_text("\n".join(lines), parse_mode="HTML",
+                                            reply_markup=Keyboards.get_main_keyboard())
+
+    async def export_history(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Выгрузка всей истории файлом: /export [csv|parquet]"""
+        fmt = context.args[0].lower() if context.args else "csv"
+        if fmt not in EXPORT_FORMATS:
+            await update.message.reply_text(f"Формат: /export {' | '.join(EXPORT_FORMATS)}",
+                                            reply_markup=Keyboards.get_main_keyboard())
+            return
+
+        user_id = update.effective_user.id
+        # Дата в имени файла — последний выгруженный день по часам БД, а не процесса
+        last_day = None
+
+        async def dated(rows):
+            nonlocal last_day
+            async for row in rows:
+                last_day = row[0]
+                yield row
+
+        # Файл на диске: строки идут из курсора прямо в него, в памяти только порция
+        with tempfile.TemporaryFile() as file:
+            async with aclosing(self.db.stream_history(user_id)) as rows:
+                try:
+                    count = await export_file(dated(rows), file, fmt)
+                except ExportError as e:
+                    logger.warning(f"[EXPORT] {fmt} export unavailable for user {user_id}: {e}")
+                    await update.message.reply_text("Этот формат сейчас недоступен, попробуйте /export csv",
+                                                    reply_markup=Keyboards.get_main_keyboard())
+                    return
+
+            if not count:
+                await update.message.reply_text("История пуста — выгружать нечего",
+                                                reply_markup=Keyboards.get_main_keyboard())
+                return
+            file.seek(0)
+            await update.message.reply_document(
+                document=file,
+                filename=f"calories_{user_id}_{last_day:%Y%m%d}.{fmt}",
+                caption=f"📦 Записей в выгрузке: {count}",
+                reply_markup=Keyboards.get_main_keyboard()
+            )
+
     async def start_calories_setup(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Начало установки суточных калорий"""
         await send_card(
@@ -99,9 +196,7 @@ class BotHandlers:
         user_id = update.effective_user.id
 
         async with self._lock(user_id):
-            # ← ДОБАВЬ: создаём пользователя, если нет
-            if not await self.db.check_user_exists(user_id):
-                await self.db.add_user(user_id)
+            await self._ensure_user(user_id)
 
             text_input = update.message.text
 
@@ -119,7 +214,22 @@ class BotHandlers:
                 return DialogState.SET_CALORIES
 
             calories = int(text_input)
-            await self.db.set_daily_calories(user_id, calories)
+            if not await self.db.set_daily_calories(user_id, calories):
+                # Кэш профилей считал пользователя известным, а строки в БД нет
+                self.profiles.invalidate(user_id)
+                await self.db.ensure_user(user_id)
+                if not await self.db.set_daily_calories(user_id, calories):
+                    logger.error(f"[BOT] daily limit not saved for user {user_id}")
+                    await send_card(
+                        update,
+                        context,
+                        title="Ошибка",
+                        fields=[("⚠️", "Не удалось сохранить цель, попробуйте ещё раз")],
+                        footer="Выберите следующее действие ⬇️",
+                        keyboard=Keyboards.get_main_keyboard()
+                    )
+                    return ConversationHandler.END
+            self.profiles.set(user_id, calories if calories > 0 else None)
 
             await send_card(
                 update,
@@ -153,10 +263,26 @@ class BotHandlers:
                 await update.message.reply_text(validation.error_message, reply_markup=Keyboards.get_cancel_keyboard())
                 return DialogState.SET_PRODUCT_NAME
 
-            context.user_data["product_name"] = text_input
-
-            if await self.db.check_product_exists(text_input):
-                product_info = await self.db.get_product_info(text_input)
+            product_info = await self.db.get_product_info(text_input)
+            if product_info is None:
+                matches = self.db.search_products(text_input)
+                if matches and matches[0][1] == 1.0:
+                    # "яблоки", "Яблоко " и синонимы — тот же продукт из каталога
+                    product_info = await self.db.get_product_info(matches[0][0])
+                elif matches and context.user_data.get("suggested_for") != text_input:
+                    context.user_data["suggested_for"] = text_input
+                    await update.message.reply_text(
+                        f"Продукт «{text_input}» не найден.\n"
+                        f"Возможно, вы имели в виду один из вариантов ниже ⬇️\n\n"
+                        f"Если это новый продукт — отправьте название ещё раз",
+                        reply_markup=Keyboards.get_suggestions_keyboard([name for name, _ in matches])
+                    )
+                    return DialogState.SET_PRODUCT_NAME
+
+            context.user_data.pop("suggested_for", None)
+
+            if product_info:
+                context.user_data["product_name"] = product_info[2]
                 await update.message.reply_text(
                     f"🥦 <b>Информация о продукте</b>\n"
                     f"━━━━━━━━━━━━━━━\n"
@@ -170,6 +296,7 @@ class BotHandlers:
                 context.user_data["calories_per_hundred"] = product_info[1]
                 return DialogState.SET_PRODUCT_WEIGHT
             else:
+                context.user_data["product_name"] = text_input
                 await update.message.reply_text(
                     "Продукт не найден. Введите его калорийность на 100 грамм:",
                     reply_markup=Keyboards.get_cancel_keyboard()
@@ -192,20 +319,24 @@ class BotHandlers:
                 weight
             )
 
-            await self.db.add_calories_for_today(
+            added = await self.db.add_calories_for_today(
                 update.effective_user.id,
                 calories,
                 context.user_data["product_name"]
             )
 
+            fields = [
+                ("📛 Продукт:", context.user_data["product_name"]),
+                ("🔥 Калорийность:", f"{calories} ккал")
+            ]
+            if added:
+                fields.append(("📊 За сегодня:", f"{added[3]} ккал"))
+
             await send_card(
                 update,
                 context,
                 title="Запись добавлена!",
-                fields=[
-                    ("📛 Продукт:", context.user_data["product_name"]),
-                    ("🔥 Калорийность:", f"{calories} ккал")
-                ],
+                fields=fields,
                 footer="Выберите следующее действие",
                 keyboard=Keyboards.get_main_keyboard()
             )
@@ -307,8 +438,8 @@ class BotHandlers:
         """Обработка нажатия кнопки отмены"""
         return await self.cancel(update, context)
 
-    def get_conversation_handler(self) -> ConversationHandler:
-        """Создание ConversationHandler"""
+    def get_conversation_handler(self, persistent: bool = False) -> ConversationHandler:
+        """Создание ConversationHandler (persistent — состояние хранится в persistence приложения)"""
         # Regex паттерн для кнопки отмены
         cancel_pattern = r"^(❌ Отмена|Отмена)$"
 
@@ -360,5 +491,7 @@ class BotHandlers:
                 ],
             },
             fallbacks=[CommandHandler('cancel', self.cancel)],
-            allow_reentry=True
+            allow_reentry=True,
+            name="main_conversation",
+            persistent=persistent
         )
\ No newline at end of file
@@ -18,12 +18,20 @@ class Keyboards:
                 [KeyboardButton("📅 Установить суточные калории")],
                 [KeyboardButton("➕ Добавить калории")],
                 [KeyboardButton("🔥 Калории сегодня")],
+                [KeyboardButton("📈 Статистика")],
                 [KeyboardButton("🍗 Добавить продукт")],
                 [KeyboardButton("📸 Распознать еду")]
             ],
             resize_keyboard=True
         )
 
+    @staticmethod
+    def get_suggestions_keyboard(names: list[str]) -> ReplyKeyboardMarkup:
+        return ReplyKeyboardMarkup(
+            [[KeyboardButton(name)] for name in names] + [[KeyboardButton("❌ Отмена")]],
+            resize_keyboard=True
+        )
+
     @staticmethod
     def get_cancel_keyboard() -> ReplyKeyboardMarkup:
         return ReplyKeyboardMarkup(
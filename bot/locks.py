@@ -0,0 +1,101 @@
+import asyncio
+import logging
+import time
+from typing import Dict, List
+
+logger = logging.getLogger(__name__)
+
+
+class UserLockRegistry:
+    """
+    Блокировки по пользователям со счётчиком ссылок
+
+    Lock создаётся только при первом обращении и удаляется, когда его никто
+    не держит и не ждёт, поэтому реестр не растёт с числом пользователей.
+    """
+
+    def __init__(self, slow_wait_threshold: float = 1.0):
+        self.slow_wait_threshold = slow_wait_threshold
+        # uid → [lock, число держателей и ожидающих]
+        self._entries: Dict[int, List] = {}
+        self.acquisitions = 0
+        self.contended = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.max_queue_depth = 0
+
+    def __call__(self, uid: int) -> "UserLock":
+        return UserLock(self, uid)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def queue_depth(self, uid: int) -> int:
+        """Сколько обновлений пользователя сейчас держат или ждут блокировку"""
+        entry = self._entries.get(uid)
+        return entry[1] if entry else 0
+
+    def _retain(self, uid: int) -> List:
+        entry = self._entries.get(uid)
+        if entry is None:
+            entry = self._entries[uid] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        return entry
+
+    def _release(self, uid: int, entry: List) -> None:
+        entry[1] -= 1
+        if entry[1] == 0:
+            del self._entries[uid]
+
+    def _record_wait(self, uid: int, wait: float, depth: int) -> None:
+        self.contended += 1
+        self.total_wait += wait
+        self.max_wait = max(self.max_wait, wait)
+        self.max_queue_depth = max(self.max_queue_depth, depth)
+        if wait >= self.slow_wait_threshold:
+            logger.warning(f"[LOCK] user {uid} waited {wait:.3f}s behind {depth} update(s)")
+
+    def stats(self) -> dict:
+        return {
+            "active_users": len(self._entries),
+            "acquisitions": self.acquisitions,
+            "contended": self.contended,
+            "total_wait": round(self.total_wait, 6),
+            "avg_wait": round(self.total_wait / self.contended, 6) if self.contended else 0.0,
+            "max_wait": round(self.max_wait, 6),
+            "max_queue_depth": self.max_queue_depth,
+        }
+
+
+class UserLock:
+    """Контекстный менеджер блокировки одного пользователя"""
+
+    __slots__ = ("_registry", "_uid", "_entry")
+
+    def __init__(self, registry: UserLockRegistry, uid: int):
+        self._registry = registry
+        self._uid = uid
+        self._entry = None
+
+    async def __aenter__(self):
+        registry = self._registry
+        entry = self._entry = registry._retain(self._uid)
+        lock = entry[0]
+        try:
+            if lock.locked():
+                depth = entry[1] - 1
+                started = time.perf_counter()
+                await lock.acquire()
+                registry._record_wait(self._uid, time.perf_counter() - started, depth)
+            else:
+                await lock.acquire()
+        except BaseException:
+            registry._release(self._uid, entry)
+            raise
+        registry.acquisitions += 1
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self._entry[0].release()
+        self._registry._release(self._uid, self._entry)
+        return False
@@ -1,11 +1,20 @@
+import asyncio
 import os
 from dotenv import load_dotenv
 from telegram.ext import ApplicationBuilder, CommandHandler, MessageHandler, filters
 
+from bot.admission import AdmissionController
 from bot.handlers import BotHandlers
+from bot.persistence import PostgresPersistence
+from bot.profile_cache import UserProfileCache
+from bot.update_processor import PerUserUpdateProcessor
+from bot.workers import ShardSupervisor
 from core.calculator import CalorieCalculator
 from core.db import Database
-from log.log_writer import log
+from core.metrics import (
+    MetricsRegistry, MetricsServer, instrument_admission, instrument_database, instrument_handlers
+)
+from log.log_writer import bind_handler_context, log
 
 load_dotenv()
 
@@ -15,29 +24,93 @@ BOT_TOKEN = os.getenv("BOT_TOKEN")
 async def post_init(application):
     await application.bot_data["db"].connect()
     log('info', "[DB] connected")
+    metrics_port = os.getenv("METRICS_PORT")
+    if metrics_port and "metrics" in application.bot_data:
+        server = MetricsServer(
+            application.bot_data["metrics"],
+            host=os.getenv("METRICS_HOST", "127.0.0.1"),
+            port=int(metrics_port)
+        )
+        await server.start()
+        application.bot_data["metrics_server"] = server
 
 
 async def post_shutdown(application):
+    if "metrics_server" in application.bot_data:
+        await application.bot_data.pop("metrics_server").stop()
+    # Сначала дописываем буфер истории, иначе записи пропадут вместе с пулом
+    await application.bot_data["db"].flush_history()
     await application.bot_data["db"].disconnect()
     log('info', "[DB] disconnected")
 
 
-def create_application() -> tuple:
-    db = Database()
-    calculator = CalorieCalculator()
-    handlers = BotHandlers(db, calculator)
+def create_application(concurrent_updates: int = 1, with_updater: bool = True,
+                       db: Database = None, base_url: str = None,
+                       token: str = None, rate_limit: float = None) -> tuple:
+    """
+    Собирает Application с обработчиками
 
-    app = (
+    db и base_url подменяются нагрузочным тестом: база в памяти и локальный
+    заменитель Bot API вместо api.telegram.org. token и rate_limit заменяют
+    BOT_TOKEN и USER_RATE_LIMIT из окружения
+    """
+    db = db or Database()
+    calculator = CalorieCalculator()
+    profiles = UserProfileCache(
+        max_size=int(os.getenv("USER_CACHE_SIZE", 100_000)),
+        ttl=float(os.getenv("USER_CACHE_TTL", 300))
+    )
+    handlers = BotHandlers(db, calculator, profiles)
+    admission = None
+    if os.getenv("ADMISSION_ENABLED", "1") == "1":
+        admission = AdmissionController(
+            rate=rate_limit if rate_limit is not None else float(os.getenv("USER_RATE_LIMIT", 1)),
+            burst=int(os.getenv("USER_RATE_BURST", 10)),
+            max_pending=int(os.getenv("USER_MAX_PENDING", 5))
+        )
+    processor = None
+    if concurrent_updates > 1 or admission is not None:
+        # Разные пользователи обрабатываются параллельно, обновления одного — по порядку;
+        # допуск отсекает повторы и флуд до блокировки пользователя и запросов к БД
+        processor = PerUserUpdateProcessor(concurrent_updates, admission=admission)
+    metrics = None
+    if os.getenv("METRICS_ENABLED", "1") == "1":
+        # До регистрации обработчиков: в Application должны попасть обёрнутые методы
+        metrics = MetricsRegistry()
+        instrument_database(db, metrics)
+        instrument_handlers(handlers, metrics, lock_stats=processor.locks.stats if processor else None)
+        if admission is not None:
+            instrument_admission(admission, metrics)
+    bind_handler_context(handlers)
+
+    builder = (
         ApplicationBuilder()
-        .token(BOT_TOKEN)
+        .token(token or BOT_TOKEN)
         .post_init(post_init)
         .post_shutdown(post_shutdown)
-        .build()
     )
+    if base_url:
+        builder = builder.base_url(base_url)
+    if processor is not None:
+        builder = builder.concurrent_updates(processor)
+    persistent = os.getenv("BOT_PERSISTENCE", "1") == "1"
+    if persistent:
+        builder = builder.persistence(PostgresPersistence(
+            db,
+            update_interval=float(os.getenv("PERSISTENCE_UPDATE_INTERVAL", 10)),
+            max_age_hours=float(os.getenv("PERSISTENCE_MAX_AGE_HOURS", 24))
+        ))
+    if not with_updater:
+        # Воркер шарда получает обновления от супервизора, а не из Telegram
+        builder = builder.updater(None)
+    app = builder.build()
 
     app.bot_data["db"] = db
+    if metrics is not None:
+        app.bot_data["metrics"] = metrics
 
     app.add_handler(CommandHandler("start", handlers.start))
+    app.add_handler(CommandHandler("export", handlers.export_history))
     app.add_handler(MessageHandler(
         filters.TEXT & filters.Regex("^Начать$"),
         handlers.handle_start_button
@@ -46,16 +119,69 @@ def create_application() -> tuple:
         filters.TEXT & filters.Regex("^🔥 Калории сегодня$"),
         handlers.handle_today_calories
     ))
-    app.add_handler(handlers.get_conversation_handler())
+    app.add_handler(MessageHandler(
+        filters.TEXT & filters.Regex("^📈 Статистика$"),
+        handlers.handle_statistics
+    ))
+    app.add_handler(handlers.get_conversation_handler(persistent))
 
     return app, handlers
 
 
+def webhook_options() -> dict:
+    """
+    Параметры run_webhook из окружения
+
+    WEBHOOK_URL обязателен: без него PTB собрал бы адрес из WEBHOOK_LISTEN и
+    WEBHOOK_PORT, недоступный Telegram, и бот молча не получал бы обновлений
+    """
+    webhook_url = os.getenv("WEBHOOK_URL")
+    if not webhook_url:
+        raise ValueError("BOT_MODE=webhook requires WEBHOOK_URL: the public HTTPS address Telegram should call")
+    return {
+        "listen": os.getenv("WEBHOOK_LISTEN", "127.0.0.1"),
+        "port": int(os.getenv("WEBHOOK_PORT", 8443)),
+        "url_path": os.getenv("WEBHOOK_PATH", "telegram"),
+        "webhook_url": webhook_url,
+        "secret_token": os.getenv("WEBHOOK_SECRET"),
+        "max_connections": int(os.getenv("WEBHOOK_MAX_CONNECTIONS", 40)),
+    }
+
+
+def run_webhook(app, options: dict):
+    """Приём обновлений через webhook на локальном HTTP-сервере (TLS — на прокси перед ботом)"""
+    app.run_webhook(**options)
+
+
+def run_sharded(concurrent_updates: int):
+    """Супервизор: N процессов-воркеров, обновления раздаются по hash(telegram_id) % N"""
+    supervisor = ShardSupervisor(
+        workers=int(os.getenv("BOT_WORKERS", os.cpu_count() or 1)),
+        concurrent_updates=concurrent_updates,
+        health_interval=float(os.getenv("BOT_WORKER_HEALTH_INTERVAL", 5)),
+        heartbeat_timeout=float(os.getenv("BOT_WORKER_HEARTBEAT_TIMEOUT", 30))
+    )
+    try:
+        asyncio.run(supervisor.run_polling(BOT_TOKEN))
+    except KeyboardInterrupt:
+        log('info', "Supervisor stopped")
+
+
 def main():
     """Точка входа"""
     log('info', "Bot is starting...")
-    app, _ = create_application()
-    app.run_polling()
+    mode = os.getenv("BOT_MODE", "polling")
+    concurrent_updates = int(os.getenv("BOT_CONCURRENT_UPDATES", 64 if mode == "webhook" else 1))
+    if mode == "sharded":
+        run_sharded(concurrent_updates)
+        return
+    # Проверяем до сборки приложения, чтобы неверная настройка падала сразу при запуске
+    options = webhook_options() if mode == "webhook" else None
+    app, _ = create_application(concurrent_updates)
+    if mode == "webhook":
+        run_webhook(app, options)
+    else:
+        app.run_polling()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,150 @@
+import asyncio
+import json
+import logging
+from typing import Dict, Optional
+
+from telegram.ext import BasePersistence, PersistenceInput
+
+from core.db import Database
+
+logger = logging.getLogger(__name__)
+
+
+def _encode_key(key: tuple) -> str:
+    return json.dumps(list(key))
+
+
+def _decode_key(key: str) -> tuple:
+    return tuple(json.loads(key))
+
+
+class PostgresPersistence(BasePersistence):
+    """
+    Хранение диалогов ConversationHandler и user_data в Postgres
+
+    Application вызывает update_* для изменённых ключей раз в update_interval.
+    Вызовы только меняют кэш в памяти и помечают ключи грязными; запись в БД
+    идёт одной пачкой на все накопленные изменения.
+    """
+
+    def __init__(self, db: Database, update_interval: float = 10, max_age_hours: float = 24):
+        super().__init__(
+            store_data=PersistenceInput(bot_data=False, chat_data=False, user_data=True, callback_data=False),
+            update_interval=update_interval
+        )
+        self.db = db
+        self.max_age_hours = max_age_hours
+        self._conversations: Dict[str, Dict[tuple, int]] = {}
+        self._user_data: Dict[int, dict] = {}
+        self._dirty_conversations: Dict[str, Dict[str, Optional[int]]] = {}
+        self._dirty_user_data: Dict[int, Optional[dict]] = {}
+        self._flush_task: Optional[asyncio.Task] = None
+        self.flushes = 0
+
+    # ─── Диалоги ───
+
+    async def get_conversations(self, name: str) -> dict:
+        await self.db.connect()
+        stored = await self.db.load_conversations(name, self.max_age_hours)
+        self._conversations[name] = {_decode_key(key): state for key, state in stored.items()}
+        logger.info(f"[PERSISTENCE] loaded {len(stored)} conversations for {name}")
+        return dict(self._conversations[name])
+
+    async def update_conversation(self, name: str, key: tuple, new_state: Optional[object]) -> None:
+        cache = self._conversations.setdefault(name, {})
+        if cache.get(key) == new_state:
+            return
+        if new_state is None:
+            cache.pop(key, None)
+        else:
+            cache[key] = new_state
+        self._dirty_conversations.setdefault(name, {})[_encode_key(key)] = (
+            int(new_state) if new_state is not None else None
+        )
+        self._schedule_flush()
+
+    # ─── user_data ───
+
+    async def get_user_data(self) -> Dict[int, dict]:
+        await self.db.connect()
+        self._user_data = await self.db.load_user_data(self.max_age_hours)
+        return {user_id: dict(data) for user_id, data in self._user_data.items()}
+
+    async def update_user_data(self, user_id: int, data: dict) -> None:
+        if self._user_data.get(user_id) == data:
+            return
+        self._user_data[user_id] = dict(data)
+        self._dirty_user_data[user_id] = dict(data)
+        self._schedule_flush()
+
+    async def drop_user_data(self, user_id: int) -> None:
+        self._user_data.pop(user_id, None)
+        self._dirty_user_data[user_id] = None
+        self._schedule_flush()
+
+    async def refresh_user_data(self, user_id: int, user_data: dict) -> None:
+        pass
+
+    # ─── Сброс в БД ───
+
+    def _schedule_flush(self):
+        # Все update_* одного прохода Application выполняются до запуска задачи,
+        # поэтому они попадают в одну пачку
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_dirty())
+
+    async def _flush_dirty(self):
+        conversations, self._dirty_conversations = self._dirty_conversations, {}
+        user_data, self._dirty_user_data = self._dirty_user_data, {}
+        if not conversations and not user_data:
+            return
+        try:
+            for name, states in conversations.items():
+                await self.db.save_conversations(name, states)
+            if user_data:
+                await self.db.save_user_data(user_data)
+            self.flushes += 1
+        except Exception:
+            logger.exception("[PERSISTENCE] flush failed, changes will be retried")
+            # Не затираем более свежие изменения, пришедшие во время записи
+            for name, states in conversations.items():
+                pending = self._dirty_conversations.setdefault(name, {})
+                for key, state in states.items():
+                    pending.setdefault(key, state)
+            for user_id, value in user_data.items():
+                self._dirty_user_data.setdefault(user_id, value)
+
+    async def flush(self) -> None:
+        """Вызывается Application при остановке: дописывает всё несохранённое"""
+        if self._flush_task is not None:
+            await self._flush_task
+        await self._flush_dirty()
+
+    # ─── Не используются: бот хранит только диалоги и user_data ───
+
+    async def get_chat_data(self) -> dict:
+        return {}
+
+    async def update_chat_data(self, chat_id: int, data: dict) -> None:
+        pass
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        pass
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: dict) -> None:
+        pass
+
+    async def get_bot_data(self) -> dict:
+        return {}
+
+    async def update_bot_data(self, data: dict) -> None:
+        pass
+
+    async def refresh_bot_data(self, bot_data: dict) -> None:
+        pass
+
+    async def get_callback_data(self):
+        return None
+
+    async def update_callback_data(self, data) -> None:
+        pass
@@ -0,0 +1,50 @@
+import time
+from collections import OrderedDict
+from typing import Callable, Optional, Tuple
+
+# Отличает "пользователь не в кэше" от "лимит не установлен" (None)
+MISSING = object()
+
+
+class UserProfileCache:
+    """LRU-кэш профилей пользователей (известен ли пользователь + дневной лимит) с TTL"""
+
+    def __init__(self, max_size: int = 100_000, ttl: float = 300.0, clock: Callable[[], float] = time.monotonic):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._clock = clock
+        self._profiles: "OrderedDict[int, Tuple[Optional[int], float]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, telegram_id: int):
+        """
+        Дневной лимит известного пользователя
+
+        Returns:
+            Лимит (или None, если не установлен) либо MISSING, если профиля нет в кэше
+        """
+        entry = self._profiles.get(telegram_id)
+        if entry is None or entry[1] <= self._clock():
+            if entry is not None:
+                del self._profiles[telegram_id]
+            self.misses += 1
+            return MISSING
+        self._profiles.move_to_end(telegram_id)
+        self.hits += 1
+        return entry[0]
+
+    def set(self, telegram_id: int, daily_limit: Optional[int]) -> None:
+        self._profiles[telegram_id] = (daily_limit, self._clock() + self.ttl)
+        self._profiles.move_to_end(telegram_id)
+        while len(self._profiles) > self.max_size:
+            self._profiles.popitem(last=False)
+
+    def invalidate(self, telegram_id: int) -> None:
+        self._profiles.pop(telegram_id, None)
+
+    def stats(self) -> dict:
+        return {"size": len(self._profiles), "hits": self.hits, "misses": self.misses}
+
+    def __len__(self) -> int:
+        return len(self._profiles)
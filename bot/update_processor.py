@@ -0,0 +1,103 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Optional
+
+from telegram import Update
+from telegram.error import TelegramError
+from telegram.ext import BaseUpdateProcessor
+
+from bot.admission import TOO_FREQUENT_TEXT, AdmissionController, coalesce_key
+from bot.locks import UserLockRegistry
+
+logger = logging.getLogger(__name__)
+
+
+def update_user_id(update: object) -> Optional[int]:
+    """telegram_id автора обновления (или чата, если автора нет)"""
+    if not isinstance(update, Update):
+        return None
+    if update.effective_user:
+        return update.effective_user.id
+    if update.effective_chat:
+        return update.effective_chat.id
+    return None
+
+
+# PTB берёт свой семафор до do_process_update, то есть пока обновление ещё
+# ждёт блокировку пользователя: очередь одного пользователя занимала бы слоты
+# всех. Поэтому семафор PTB не ограничивает, а слоты берутся под блокировкой
+_PTB_UNBOUNDED = 2 ** 31 - 1
+
+
+class PerUserUpdateProcessor(BaseUpdateProcessor):
+    """
+    Обработка обновлений разных пользователей параллельно, одного — строго по очереди
+
+    Блокировка берётся вокруг всего process_update, включая выбор состояния
+    в ConversationHandler, поэтому параллельность не ломает диалоги.
+    Слот из max_concurrent_updates обновление занимает только после своей
+    блокировки: пользователь держит не больше одного слота, сколько бы
+    обновлений у него ни ждало. PTB поэтому создаёт задачу на каждое
+    обновление и при max_concurrent_updates == 1, и очередь пользователя
+    видна допуску в любом режиме.
+
+    С admission обновление сначала проходит допуск: отброшенное не ждёт
+    блокировку, а на первый отказ подряд пользователь получает TOO_FREQUENT_TEXT.
+    """
+
+    def __init__(self, max_concurrent_updates: int, locks: UserLockRegistry = None,
+                 admission: AdmissionController = None):
+        super().__init__(_PTB_UNBOUNDED)
+        if max_concurrent_updates < 1:
+            raise ValueError("max_concurrent_updates must be a positive integer")
+        self.max_handlers = max_concurrent_updates
+        self._slots = asyncio.BoundedSemaphore(max_concurrent_updates)
+        self.locks = locks or UserLockRegistry()
+        self.admission = admission
+
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        uid = update_user_id(update)
+        if uid is None:
+            async with self._slots:
+                await coroutine
+            return
+        if self.admission is None:
+            async with self.locks(uid):
+                async with self._slots:
+                    await coroutine
+            return
+
+        key = coalesce_key(update)
+        reason = self.admission.admit(uid, key, self.locks.queue_depth(uid))
+        if reason is not None:
+            coroutine.close()
+            if self.admission.should_notify(uid, reason):
+                await self._notify_rejected(update)
+            return
+        queued = True
+        try:
+            async with self.locks(uid):
+                self.admission.dequeue(uid, key)
+                queued = False
+                async with self._slots:
+                    await coroutine
+        finally:
+            if queued:
+                # Ожидание блокировки отменено
+                self.admission.dequeue(uid, key)
+
+    async def _notify_rejected(self, update: Update) -> None:
+        message = update.effective_message
+        if message is None:
+            return
+        async with self._slots:
+            try:
+                await message.reply_text(TOO_FREQUENT_TEXT)
+            except TelegramError as e:
+                logger.warning(f"[ADMISSION] rejection notice not sent: {e}")
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
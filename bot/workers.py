@@ -0,0 +1,201 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import queue as queue_module
+import time
+from typing import List, Optional
+
+from telegram import Bot, Update
+
+logger = logging.getLogger(__name__)
+
+# Ключи обновления, у которых есть автор в поле "from"
+_UPDATE_KINDS = (
+    "message", "edited_message", "callback_query", "inline_query",
+    "chosen_inline_result", "shipping_query", "pre_checkout_query",
+    "poll_answer", "my_chat_member", "chat_member", "chat_join_request",
+)
+
+
+def extract_user_id(update_data: dict) -> Optional[int]:
+    """telegram_id автора из JSON обновления (или id чата, если автора нет)"""
+    for kind in _UPDATE_KINDS:
+        payload = update_data.get(kind)
+        if not payload:
+            continue
+        author = payload.get("from") or payload.get("user")
+        if author:
+            return author["id"]
+        chat = payload.get("chat")
+        if chat:
+            return chat["id"]
+    return None
+
+
+def shard_for(telegram_id: Optional[int], shards: int) -> int:
+    """Номер воркера: все обновления пользователя попадают в один процесс"""
+    return hash(telegram_id) % shards if telegram_id is not None else 0
+
+
+def worker_main(index: int, queue, heartbeats, concurrent_updates: int):
+    """Точка входа процесса-воркера: обрабатывает обновления своего шарда"""
+    if os.getenv("METRICS_PORT"):
+        # Свой порт метрик у каждого воркера: METRICS_PORT + 1 + index
+        os.environ["METRICS_PORT"] = str(int(os.environ["METRICS_PORT"]) + 1 + index)
+    asyncio.run(_serve(index, queue, heartbeats, concurrent_updates))
+
+
+async def _serve(index: int, queue, heartbeats, concurrent_updates: int):
+    # Импорт здесь: bot.main сам импортирует этот модуль для run_sharded
+    from bot.main import create_application
+
+    app, _ = create_application(concurrent_updates, with_updater=False)
+    await app.initialize()
+    await app.post_init(app)
+    await app.start()
+    logger.info(f"[WORKER {index}] started, pid {os.getpid()}")
+
+    async def beat():
+        while True:
+            heartbeats[index] = time.time()
+            await asyncio.sleep(1)
+
+    heartbeat = asyncio.create_task(beat())
+    loop = asyncio.get_running_loop()
+    try:
+        while True:
+            data = await loop.run_in_executor(None, queue.get)
+            if data is None:
+                break
+            await app.update_queue.put(Update.de_json(data, app.bot))
+    finally:
+        heartbeat.cancel()
+        # Порядок как у run_polling PTB: shutdown() дописывает persistence в БД,
+        # поэтому post_shutdown (отключение от БД) — последним
+        await app.stop()
+        await app.shutdown()
+        await app.post_shutdown(app)
+        logger.info(f"[WORKER {index}] stopped")
+
+
+class ShardSupervisor:
+    """
+    Запускает N процессов-воркеров и раздаёт им обновления по hash(telegram_id) % N
+
+    Обновления одного пользователя всегда обрабатывает один процесс, поэтому
+    порядок и блокировки внутри процесса остаются корректными. Упавший или
+    зависший (без heartbeat) воркер перезапускается с новой очередью: убитый
+    процесс мог оставить захваченной блокировку старой.
+    """
+
+    def __init__(self, workers: int, concurrent_updates: int = 1,
+                 health_interval: float = 5.0, heartbeat_timeout: float = 30.0):
+        self.workers = workers
+        self.concurrent_updates = concurrent_updates
+        self.health_interval = health_interval
+        self.heartbeat_timeout = heartbeat_timeout
+        self._context = multiprocessing.get_context("spawn")
+        self._queues = [self._context.Queue() for _ in range(workers)]
+        self._heartbeats = self._context.Array("d", workers)
+        self._processes: List[Optional[multiprocessing.Process]] = [None] * workers
+        self.restarts = 0
+        self.dispatched = [0] * workers
+
+    def _spawn(self, index: int):
+        process = self._context.Process(
+            target=worker_main,
+            args=(index, self._queues[index], self._heartbeats, self.concurrent_updates),
+            name=f"bot-worker-{index}",
+            daemon=True
+        )
+        # Время запуска вместо heartbeat, пока воркер поднимает пул и прогревает его
+        self._heartbeats[index] = time.time()
+        process.start()
+        self._processes[index] = process
+
+    def start(self):
+        for index in range(self.workers):
+            self._spawn(index)
+        logger.info(f"[SUPERVISOR] started {self.workers} workers")
+
+    def dispatch(self, update_data: dict) -> int:
+        index = shard_for(extract_user_id(update_data), self.workers)
+        self._queues[index].put(update_data)
+        self.dispatched[index] += 1
+        return index
+
+    async def check_health(self) -> int:
+        """Перезапускает мёртвые и зависшие воркеры, возвращает число перезапусков"""
+        restarted = 0
+        now = time.time()
+        for index, process in enumerate(self._processes):
+            stale = now - self._heartbeats[index] > self.heartbeat_timeout
+            if process is not None and process.is_alive() and not stale:
+                continue
+            if process is not None and process.is_alive():
+                logger.warning(f"[SUPERVISOR] worker {index} missed heartbeats, terminating")
+                process.terminate()
+                # join блокирует — ждём в потоке, чтобы не останавливать раздачу обновлений
+                await asyncio.to_thread(process.join, 5)
+            else:
+                logger.warning(f"[SUPERVISOR] worker {index} died with code {process.exitcode if process else None}")
+            self._replace_queue(index)
+            self._spawn(index)
+            restarted += 1
+        self.restarts += restarted
+        return restarted
+
+    def _replace_queue(self, index: int):
+        """Переносит необработанные обновления в новую очередь воркера"""
+        old, fresh = self._queues[index], self._context.Queue()
+        moved = 0
+        while True:
+            try:
+                # Без ожидания: если блокировку чтения держал убитый процесс, сразу Empty
+                fresh.put(old.get_nowait())
+            except (queue_module.Empty, OSError, EOFError):
+                break
+            moved += 1
+        old.close()
+        old.cancel_join_thread()
+        self._queues[index] = fresh
+        if moved:
+            logger.info(f"[SUPERVISOR] moved {moved} pending updates to worker {index}'s new queue")
+
+    def stop(self, timeout: float = 30.0):
+        for queue in self._queues:
+            queue.put(None)
+        deadline = time.monotonic() + timeout
+        for process in self._processes:
+            if process is None:
+                continue
+            process.join(max(0.0, deadline - time.monotonic()))
+            if process.is_alive():
+                process.terminate()
+        logger.info(f"[SUPERVISOR] stopped, {self.restarts} restarts")
+
+    async def run_polling(self, token: str, poll_timeout: int = 30):
+        """Забирает обновления через getUpdates и раздаёт их воркерам"""
+        self.start()
+
+        async def health_loop():
+            while True:
+                await asyncio.sleep(self.health_interval)
+                await self.check_health()
+
+        health = asyncio.create_task(health_loop())
+        offset = None
+        try:
+            async with Bot(token) as bot:
+                await bot.delete_webhook()
+                while True:
+                    updates = await bot.get_updates(
+                        offset=offset, timeout=poll_timeout, allowed_updates=Update.ALL_TYPES
+                    )
+                    for update in updates:
+                        offset = update.update_id + 1
+                        self.dispatch(update.to_dict())
+        finally:
+            health.cancel()
+            self.stop()
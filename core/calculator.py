@@ -1,3 +1,9 @@
+import datetime
+from typing import Dict, Sequence
+
+_EPOCH_ORDINAL = datetime.date(1970, 1, 1).toordinal()
+
+
 class CalorieCalculator:
     """Бизнес-логика расчёта калорий"""
 
@@ -15,6 +21,68 @@ class CalorieCalculator:
         """
         return round(calories_per_100 * weight / 100, 2)
 
+    @staticmethod
+    def calculate_many(calories_per_100: Sequence[float], weights: Sequence[float]):
+        """
+        Векторный calculate для массивов порций
+
+        Результат поэлементно совпадает с calculate: произведение считается в
+        том же порядке операций, а значения, у которых третий знак близок к
+        половине, доокругляются через round() — np.round округляет x * 100
+        и на таких границах может разойтись с round(x, 2).
+
+        Args:
+            calories_per_100: калорийность на 100г для каждой порции
+            weights: вес каждой порции в граммах
+
+        Returns:
+            np.ndarray калорийности порций
+        """
+        # numpy нужен только отчётам и импорту: не тянем его при старте бота
+        import numpy as np
+
+        raw = np.asarray(calories_per_100, dtype=np.float64) * np.asarray(weights, dtype=np.float64) / 100
+        result = np.round(raw, 2)
+        scaled = raw * 100
+        near_half = np.flatnonzero(np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6)
+        for i in near_half:
+            result[i] = round(float(raw[i]), 2)
+        return result
+
+    @staticmethod
+    def totals_by_day(dates: Sequence[datetime.date], calories: Sequence[float],
+                      limit: int = None) -> Dict[datetime.date, dict]:
+        """
+        Итоги по дням за один проход, как calculate_total для каждого дня
+
+        Суммы копятся по записям в исходном порядке (np.bincount), поэтому
+        совпадают с sum() по записям дня до последнего бита.
+
+        Args:
+            dates: дата каждой записи
+            calories: калорийность каждой записи
+            limit: дневной лимит (опционально)
+
+        Returns:
+            Словарь {дата: отчёт calculate_summary} в порядке дат
+        """
+        import numpy as np
+
+        if isinstance(dates, np.ndarray) and dates.dtype.kind == "M":
+            days = dates.astype("datetime64[D]").astype(np.int64) + _EPOCH_ORDINAL
+        else:
+            # Поэлементный toordinal быстрее, чем приведение объектов date к datetime64
+            days = np.fromiter((day.toordinal() for day in dates), dtype=np.int64, count=len(dates))
+        if days.size == 0:
+            return {}
+        unique_days, index = np.unique(days, return_inverse=True)
+        totals = np.bincount(index, weights=np.asarray(calories, dtype=np.float64), minlength=len(unique_days))
+        counts = np.bincount(index, minlength=len(unique_days))
+        return {
+            day: CalorieCalculator.calculate_summary(float(total), int(count), limit)
+            for day, total, count in zip(map(datetime.date.fromordinal, unique_days.tolist()), totals, counts)
+        }
+
     @staticmethod
     def calculate_total(today_calories: list, limit: int = None) -> dict:
         """
@@ -28,10 +96,25 @@ class CalorieCalculator:
             Словарь с отчётом
         """
         total = sum(item[1] for item in today_calories) if today_calories else 0
+        items_count = len(today_calories) if today_calories else 0
+        return CalorieCalculator.calculate_summary(total, items_count, limit)
 
+    @staticmethod
+    def calculate_summary(total: float, items_count: int, limit: int = None) -> dict:
+        """
+        Отчёт за день по готовому агрегату (без списка записей)
+
+        Args:
+            total: сумма калорий за день
+            items_count: количество записей
+            limit: дневной лимит (опционально)
+
+        Returns:
+            Словарь с отчётом, как у calculate_total
+        """
         result = {
             'total': total,
-            'items_count': len(today_calories) if today_calories else 0
+            'items_count': items_count
         }
 
         if limit:
@@ -39,4 +122,32 @@ class CalorieCalculator:
             result['remaining'] = max(0, limit - total)
             result['exceeded'] = total > limit
 
-        return result
\ No newline at end of file
+        return result
+
+    @staticmethod
+    def calculate_period(day_totals: Sequence[float], days: int, limit: int = None) -> dict:
+        """
+        Отчёт за период по итогам отдельных дней
+
+        Args:
+            day_totals: итог каждого дня с записями
+            days: длина периода в днях (дни без записей считаются нулевыми)
+            limit: дневной лимит (опционально)
+
+        Returns:
+            Словарь: total, average (на день периода), logged_days;
+            с лимитом — limit, average_delta (среднее минус лимит), days_over_limit
+        """
+        total = round(sum(day_totals), 2)
+        result = {
+            'total': total,
+            'average': round(total / days, 2) if days else 0.0,
+            'logged_days': len(day_totals)
+        }
+
+        if limit:
+            result['limit'] = limit
+            result['average_delta'] = round(result['average'] - limit, 2)
+            result['days_over_limit'] = sum(1 for day_total in day_totals if day_total > limit)
+
+        return result
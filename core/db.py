@@ -1,9 +1,18 @@
+import asyncio
 import asyncpg
+import itertools
 import json
 import os
 import logging
-from typing import Optional, List, Tuple
+import time
+from collections import OrderedDict
+from typing import AsyncIterator, Awaitable, Callable, Optional, List, Tuple, Dict, TypeVar
 import datetime
+from dataclasses import dataclass, field
+
+from core.history_writer import BufferedHistoryWriter
+from core.migrations import MigrationRunner
+from core.search import ProductSearchIndex, normalize_name
 
 logger = logging.getLogger(__name__)
 
@@ -14,55 +23,631 @@ def _load_json(filename: str) -> list:
         return json.load(f)
 
 
+def _base_product_names() -> List[str]:
+    """Названия продуктов из products.json, которыми засевается пустая таблица"""
+    return [p["product"] for p in _load_json("products.json")["products_calories_per_hundred"]]
+
+
+def _load_aliases() -> Dict[str, List[str]]:
+    """Синонимы из параллельных списков products_ru / products_en"""
+    data = _load_json("products.json")
+    aliases: Dict[str, List[str]] = {}
+    for name_ru, name_en in zip(data["products_ru"], data["products_en"]):
+        aliases.setdefault(name_ru, []).append(name_en)
+    return aliases
+
+
+@dataclass
+class UserDaySnapshot:
+    """Пользователь, его лимит и записи за сегодня — результат одного запроса"""
+    telegram_id: int
+    daily_limit: Optional[int]
+    total: float = 0.0
+    items_count: int = 0
+    entries: List[List] = field(default_factory=list)
+    is_new_user: bool = False
+
+
+@dataclass
+class RangeSummary:
+    """Итоги пользователя за период: по дням из daily_totals и по продуктам"""
+    telegram_id: int
+    start: datetime.date
+    end: datetime.date
+    daily_limit: Optional[int]
+    # (дата, сумма калорий, число записей) только для дней с записями
+    days: List[Tuple[datetime.date, float, int]] = field(default_factory=list)
+    # (продукт, сумма калорий, число записей) по убыванию суммы
+    products: List[Tuple[str, float, int]] = field(default_factory=list)
+
+    @property
+    def total(self) -> float:
+        return round(sum(total for _, total, _ in self.days), 2)
+
+    @property
+    def items_count(self) -> int:
+        return sum(count for _, _, count in self.days)
+
+
+class ProductCatalog:
+    """
+    Кэш каталога продуктов в памяти процесса
+
+    Любое известное название — каноническое или синоним на любом языке —
+    находится одним обращением к словарю по нормализованному ключу.
+    При max_size кэш хранит не больше max_size продуктов и вытесняет давно
+    не запрошенные; промах дочитывается из БД (Database.get_product_info).
+    """
+
+    def __init__(self, max_size: Optional[int] = None):
+        self.max_size = max_size
+        # каноническое название → (id, калорийность, каноническое название); по давности обращения
+        self._products: "OrderedDict[str, Tuple[str, int, str]]" = OrderedDict()
+        # нормализованное название или синоним → (id, калорийность, каноническое название)
+        self._lookup: Dict[str, Tuple[str, int, str]] = {}
+        self._aliases: Dict[str, List[str]] = {}
+        self.loaded = False
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def load(self, rows, alias_rows=()) -> None:
+        """Полностью заменяет содержимое кэша строками products и product_aliases"""
+        self._products = OrderedDict()
+        self._lookup = {}
+        self._aliases = {}
+        self.extend(rows, alias_rows)
+        self.loaded = True
+
+    def extend(self, rows, alias_rows=()) -> None:
+        """Добавляет страницу строк products и синонимы этих продуктов"""
+        by_id = {}
+        for row in rows:
+            info = self.put(row["id"], row["product_name"], row["calories_per_hundred"])
+            by_id[info[0]] = info
+        for row in alias_rows:
+            info = by_id.get(str(row["product_id"]))
+            if info is not None:
+                self.put_alias(row["alias"], info[2])
+
+    def get(self, product_name: str) -> Optional[Tuple]:
+        info = self._lookup.get(normalize_name(product_name))
+        if info is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            if info[2] in self._products:
+                self._products.move_to_end(info[2])
+        return info
+
+    def put(self, product_id, product_name: str, calories_per_hundred: int) -> Tuple[str, int, str]:
+        info = (str(product_id), calories_per_hundred, product_name)
+        self._products[product_name] = info
+        self._products.move_to_end(product_name)
+        self._lookup.setdefault(normalize_name(product_name), info)
+        while self.max_size is not None and len(self._products) > self.max_size:
+            self._evict()
+        return info
+
+    def _evict(self) -> None:
+        product_name, _ = self._products.popitem(last=False)
+        for key in (normalize_name(product_name), *self._aliases.pop(product_name, ())):
+            entry = self._lookup.get(key)
+            if entry is not None and entry[2] == product_name:
+                del self._lookup[key]
+        self.evictions += 1
+
+    def put_alias(self, alias: str, product_name: str) -> None:
+        """Синоним для уже известного продукта"""
+        info = self._products.get(product_name)
+        key = normalize_name(alias)
+        if info is None or key in self._lookup:
+            return
+        self._lookup[key] = info
+        self._aliases.setdefault(product_name, []).append(key)
+
+    def aliases(self, product_name: str) -> List[str]:
+        return self._aliases.get(product_name, [])
+
+    def stats(self) -> dict:
+        """Счётчики попаданий: каждый hit — сэкономленный запрос к БД"""
+        return {"size": len(self._products), "aliases": len(self._lookup) - len(self._products),
+                "hits": self.hits, "misses": self.misses, "evictions": self.evictions}
+
+    def names(self) -> List[str]:
+        return list(self._products)
+
+    def __len__(self) -> int:
+        return len(self._products)
+
+
+# Создаёт пользователя, если его нет, и отдаёт ровно одну строку настроек.
+# INSERT ... DO NOTHING не перезаписывает строку существующего пользователя;
+# в том же снимке SELECT ещё не видит вставленную строку, поэтому дублей нет
+_ENSURE_USER_CTE = """
+    inserted AS (
+        INSERT INTO calories_config (telegram_id) VALUES ($1)
+        ON CONFLICT DO NOTHING
+        RETURNING daily_calories
+    ), config AS (
+        SELECT daily_calories, TRUE AS is_new FROM inserted
+        UNION ALL
+        SELECT daily_calories, FALSE FROM calories_config WHERE telegram_id = $1
+    )"""
+
+
+_SQL_ENSURE_USER = f"WITH {_ENSURE_USER_CTE} SELECT daily_calories FROM config LIMIT 1"
+
+_SQL_SET_DAILY_CALORIES = "UPDATE calories_config SET daily_calories = $1 WHERE telegram_id = $2"
+
+# Точное название или нормализованный синоним
+_SQL_GET_PRODUCT = """SELECT id, calories_per_hundred, product_name FROM products WHERE product_name = $1
+    UNION ALL
+    SELECT p.id, p.calories_per_hundred, p.product_name
+    FROM product_aliases a
+    JOIN products p ON p.id = a.product_id
+    WHERE a.alias = $2
+    LIMIT 1"""
+
+_SQL_ADD_ALIAS = """INSERT INTO product_aliases (alias, product_id)
+    SELECT $1, id FROM products WHERE product_name = $2
+    ON CONFLICT DO NOTHING"""
+
+# Синонимы из products.json для продуктов, которые есть в таблице
+_SQL_SEED_ALIASES = """INSERT INTO product_aliases (alias, product_id)
+    SELECT a.alias, p.id
+    FROM unnest($1::text[], $2::text[]) AS a(alias, product_name)
+    JOIN products p USING (product_name)
+    ON CONFLICT DO NOTHING"""
+
+_SQL_ADD_PRODUCT = """INSERT INTO products (product_name, calories_per_hundred) VALUES ($1, $2)
+    ON CONFLICT DO NOTHING
+    RETURNING id"""
+
+_SQL_TODAY_CALORIES = """SELECT product_name, calories
+    FROM user_calories_history
+    WHERE telegram_id = $1 AND date = CURRENT_DATE
+    ORDER BY order_id"""
+
+_DAY_SNAPSHOT_JOINS = """
+    LEFT JOIN daily_totals t ON t.telegram_id = $1 AND t.date = CURRENT_DATE
+    LEFT JOIN LATERAL (
+        SELECT array_agg(product_name ORDER BY order_id) AS names,
+               array_agg(calories ORDER BY order_id) AS calories
+        FROM user_calories_history
+        WHERE telegram_id = $1 AND date = CURRENT_DATE
+    ) AS h ON TRUE"""
+
+_SQL_USER_DAY_SNAPSHOT = f"""WITH {_ENSURE_USER_CTE}
+    SELECT c.daily_calories, c.is_new, t.total, t.items_count, h.names, h.calories
+    FROM (SELECT * FROM config LIMIT 1) AS c{_DAY_SNAPSHOT_JOINS}"""
+
+# Тот же день без создания пользователя — для реплик; нет строки, если пользователя нет
+_SQL_USER_DAY_READ = f"""SELECT c.daily_calories, FALSE AS is_new, t.total, t.items_count, h.names, h.calories
+    FROM calories_config c{_DAY_SNAPSHOT_JOINS}
+    WHERE c.telegram_id = $1"""
+
+# Строка пользователя есть всегда (лимит), дни — по одной строке из daily_totals:
+# стоимость зависит от числа дней в периоде, а не от числа записей
+_SQL_RANGE_DAYS = """SELECT c.daily_calories, t.date, t.total, t.items_count
+    FROM (SELECT $1::bigint AS telegram_id) AS u
+    LEFT JOIN calories_config c ON c.telegram_id = u.telegram_id
+    LEFT JOIN daily_totals t ON t.telegram_id = u.telegram_id AND t.date BETWEEN $2 AND $3
+    ORDER BY t.date"""
+
+# То же за последние $2 дней; «сегодня» — CURRENT_DATE базы, как у записи калорий
+_SQL_RECENT_DAYS = """SELECT CURRENT_DATE AS today, c.daily_calories, t.date, t.total, t.items_count
+    FROM (SELECT $1::bigint AS telegram_id) AS u
+    LEFT JOIN calories_config c ON c.telegram_id = u.telegram_id
+    LEFT JOIN daily_totals t ON t.telegram_id = u.telegram_id
+        AND t.date BETWEEN CURRENT_DATE - ($2::int - 1) AND CURRENT_DATE
+    ORDER BY t.date"""
+
+# Агрегат в БД по покрывающему индексу истории; наружу уходят только строки продуктов
+_SQL_RANGE_PRODUCTS = """SELECT product_name, SUM(calories) AS total, COUNT(*) AS items_count
+    FROM user_calories_history
+    WHERE telegram_id = $1 AND date BETWEEN $2 AND $3
+    GROUP BY product_name
+    ORDER BY total DESC, product_name
+    LIMIT $4"""
+
+# Порядок совпадает с покрывающим индексом истории: index-only scan без сортировки.
+# Без верхней границы ($3 IS NULL) читается всё, что уже записано по часам БД
+_SQL_STREAM_HISTORY = """SELECT date, order_id, product_name, calories
+    FROM user_calories_history
+    WHERE telegram_id = $1 AND date BETWEEN $2 AND COALESCE($3::date, 'infinity')
+    ORDER BY date, order_id"""
+
+_SQL_ADD_CALORIES = """WITH totals AS (
+        INSERT INTO daily_totals AS t (telegram_id, date, last_order_id, total, items_count)
+        VALUES ($1, CURRENT_DATE, 1, $2, 1)
+        ON CONFLICT (telegram_id, date) DO UPDATE
+        SET last_order_id = t.last_order_id + 1,
+            total = t.total + EXCLUDED.total,
+            items_count = t.items_count + 1
+        RETURNING last_order_id, total
+    ), inserted AS (
+        INSERT INTO user_calories_history (telegram_id, calories, product_name, order_id, date)
+        SELECT $1, $2, $3, last_order_id, CURRENT_DATE FROM totals
+        RETURNING order_id, product_name, calories
+    )
+    SELECT i.order_id, i.product_name, i.calories, totals.total AS daily_total
+    FROM inserted i, totals"""
+
+_SQL_ADD_CALORIES_BATCH = """WITH entries AS (
+        SELECT e.product_name, e.calories, e.ord
+        FROM unnest($2::text[], $3::numeric[]) WITH ORDINALITY AS e(product_name, calories, ord)
+    ), totals AS (
+        INSERT INTO daily_totals AS t (telegram_id, date, last_order_id, total, items_count)
+        SELECT $1, CURRENT_DATE, COUNT(*), SUM(calories), COUNT(*) FROM entries
+        ON CONFLICT (telegram_id, date) DO UPDATE
+        SET last_order_id = t.last_order_id + EXCLUDED.last_order_id,
+            total = t.total + EXCLUDED.total,
+            items_count = t.items_count + EXCLUDED.items_count
+        RETURNING last_order_id, total
+    ), inserted AS (
+        INSERT INTO user_calories_history (telegram_id, calories, product_name, order_id, date)
+        SELECT $1, e.calories, e.product_name,
+               totals.last_order_id - cardinality($2::text[]) + e.ord, CURRENT_DATE
+        FROM entries e, totals
+    )
+    SELECT total FROM totals"""
+
+# Базовые продукты из products.json: попадают в каталог первыми при любом ограничении
+_SQL_CATALOG_BASE = """SELECT id, calories_per_hundred, product_name FROM products
+    WHERE product_name = ANY($1::text[])
+    ORDER BY product_name"""
+
+# Остальные по названию после $1, по уникальному индексу: без OFFSET, и набор
+# при ограничении одинаков от запуска к запуску
+_SQL_CATALOG_PAGE = """SELECT id, calories_per_hundred, product_name FROM products
+    WHERE ($1::text IS NULL OR product_name > $1) AND product_name <> ALL($3::text[])
+    ORDER BY product_name LIMIT $2"""
+
+_SQL_CATALOG_ALIASES = "SELECT alias, product_id FROM product_aliases WHERE product_id = ANY($1::uuid[])"
+
+_CATALOG_PAGE_SIZE = 5000
+
+_SQL_ENSURE_PARTITIONS = """SELECT ensure_history_partition((CURRENT_DATE + make_interval(months => m))::date)
+    FROM generate_series(0, $1::int) AS m"""
+
+# Горизонт партиций истории и как часто его продлевать
+_PARTITION_MONTHS_AHEAD = 12
+_PARTITION_CHECK_SECONDS = 6 * 3600
+
+# Ошибки соединения с репликой: чтение повторяется на primary, реплика
+# выводится из ротации на _REPLICA_RETRY_SECONDS
+_REPLICA_ERRORS = (OSError, asyncio.TimeoutError, asyncpg.PostgresConnectionError, asyncpg.InterfaceError)
+_REPLICA_RETRY_SECONDS = 30.0
+
+T = TypeVar("T")
+
+# Читающие запросы горячего пути с аргументами, которые ничего не находят.
+# Прогрев выполняет каждый на соединении: так запрос попадает в кэш
+# подготовленных запросов asyncpg, которым пользуются fetch/fetchrow/execute
+# (prepare() этот кэш не заполняет). Пишущие запросы не прогреваются — их
+# нельзя выполнить без побочных эффектов, а на репликах они не нужны
+HOT_QUERIES = (
+    (_SQL_GET_PRODUCT, ("", "")),
+    (_SQL_USER_DAY_READ, (0,)),
+    (_SQL_RECENT_DAYS, (0, 30)),
+)
+
+
+async def _extend_catalog(conn, catalog: ProductCatalog, rows) -> int:
+    """Добавляет в каталог строки products, сколько влезет, с их синонимами; возвращает число синонимов"""
+    if catalog.max_size is not None:
+        rows = rows[:catalog.max_size - len(catalog)]
+    if not rows:
+        return 0
+    alias_rows = await conn.fetch(_SQL_CATALOG_ALIASES, [row["id"] for row in rows])
+    catalog.extend(rows, alias_rows)
+    return len(alias_rows)
+
+
+def _connection_options() -> dict:
+    """Адрес и учётные данные Postgres из окружения"""
+    return {
+        "host": os.getenv("DB_HOST", "localhost"),
+        "port": int(os.getenv("DB_PORT", 5432)),
+        "database": os.getenv("DB_NAME", "calories_db"),
+        "user": os.getenv("DB_USER", "postgres"),
+        "password": os.getenv("DB_PASSWORD", "postgres"),
+    }
+
+
+def _pool_options() -> dict:
+    """Размеры пула, кэш запросов и таймауты из окружения"""
+    command_timeout = os.getenv("DB_COMMAND_TIMEOUT")
+    return {
+        "min_size": int(os.getenv("DB_POOL_MIN_SIZE", 1)),
+        "max_size": int(os.getenv("DB_POOL_MAX_SIZE", 5)),
+        "statement_cache_size": int(os.getenv("DB_STATEMENT_CACHE_SIZE", 100)),
+        "command_timeout": float(command_timeout) if command_timeout else None,
+        "max_inactive_connection_lifetime": float(os.getenv("DB_MAX_INACTIVE_LIFETIME", 300)),
+    }
+
+
+# Периоды длиннее этого читаются серверным курсором, а не одним fetch
+_CURSOR_RANGE_DAYS = 62
+_CURSOR_PREFETCH = 500
+
+
+def _limit_or_none(daily_calories: Optional[int]) -> Optional[int]:
+    return daily_calories if daily_calories and daily_calories > 0 else None
+
+
 class Database:
-    """Управление базой данных через asyncpg"""
+    """
+    Управление базой данных через asyncpg
 
-    def __init__(self):
+    С replica_dsns (или DB_REPLICA_DSNS через запятую) чтения идут по кругу
+    на пулы реплик. Пользователь, который недавно писал, ещё
+    read_your_writes_window секунд читает с primary, чтобы увидеть свои
+    записи несмотря на отставание реплик. Реплика с ошибкой соединения
+    выводится из ротации, а чтение повторяется на primary.
+    """
+
+    def __init__(self, replica_dsns: Optional[List[str]] = None, read_your_writes_window: Optional[float] = None,
+                 catalog_max_size: Optional[int] = None):
         self._pool: Optional[asyncpg.Pool] = None
+        self._replicas: List[asyncpg.Pool] = []
+        self._replica_turn = itertools.count()
+        # индекс реплики → время, до которого на неё не читаем
+        self._replica_down: Dict[int, float] = {}
+        if replica_dsns is None:
+            replica_dsns = [dsn.strip() for dsn in os.getenv("DB_REPLICA_DSNS", "").split(",") if dsn.strip()]
+        self.replica_dsns = replica_dsns
+        if read_your_writes_window is None:
+            read_your_writes_window = float(os.getenv("DB_READ_YOUR_WRITES_SECONDS", 5))
+        self.read_your_writes_window = read_your_writes_window
+        # telegram_id → время последней записи; по возрастанию времени
+        self._recent_writes: "OrderedDict[int, float]" = OrderedDict()
+        self._clock = time.monotonic
+        if catalog_max_size is None:
+            catalog_max_size = int(os.getenv("PRODUCT_CATALOG_MAX_SIZE", 50000))
+        # 0 — без ограничения
+        self.catalog = ProductCatalog(catalog_max_size or None)
+        self.search_index = ProductSearchIndex()
+        self.history_writer: Optional[BufferedHistoryWriter] = None
+        self._partition_task: Optional[asyncio.Task] = None
 
     async def connect(self):
-        """Создаёт пул соединений и инициализирует схему"""
-        self._pool = await asyncpg.create_pool(
-            host=os.getenv("DB_HOST", "localhost"),
-            port=int(os.getenv("DB_PORT", 5432)),
-            database=os.getenv("DB_NAME", "calories_db"),
-            user=os.getenv("DB_USER", "postgres"),
-            password=os.getenv("DB_PASSWORD", "postgres"),
-            min_size=1,
-            max_size=5
-        )
+        """Создаёт пул соединений, инициализирует схему и прогревает пул"""
+        if self._pool is not None:
+            # Уже подключены: persistence загружает данные раньше post_init
+            return
+        self._pool = await asyncpg.create_pool(**_connection_options(), **_pool_options())
+        await self._connect_replicas()
         await self._init_schema()
+        self._partition_task = asyncio.create_task(self._maintain_partitions())
+        await self._load_catalog()
+        if os.getenv("DB_POOL_WARMUP", "1") == "1":
+            await self.warmup()
+            for replica in self._replicas:
+                await self.warmup(replica)
+        if os.getenv("HISTORY_WRITE_BEHIND", "0") == "1":
+            self.history_writer = BufferedHistoryWriter(
+                self._pool,
+                flush_interval=int(os.getenv("HISTORY_FLUSH_INTERVAL_MS", 50)) / 1000,
+                batch_size=int(os.getenv("HISTORY_FLUSH_ROWS", 500)),
+                wait_for_flush=os.getenv("HISTORY_ACK", "flushed") == "flushed"
+            )
+            self.history_writer.start()
+            logger.info("[DB] write-behind history writer enabled")
         logger.info("[DB] connected to PostgreSQL")
 
+    async def _connect_replicas(self):
+        for dsn in self.replica_dsns:
+            try:
+                self._replicas.append(await asyncpg.create_pool(dsn, **_pool_options()))
+            except (OSError, asyncpg.PostgresError) as e:
+                # Без реплики бот работает, просто читает с primary
+                logger.warning(f"[DB] replica unavailable, reads stay on primary: {e}")
+        if self._replicas:
+            logger.info(f"[DB] {len(self._replicas)} read replicas connected")
+
+    def _mark_write(self, telegram_id: int):
+        """Запоминает запись пользователя для read-your-writes"""
+        if not self._replicas:
+            return
+        now = self._clock()
+        self._recent_writes[telegram_id] = now
+        self._recent_writes.move_to_end(telegram_id)
+        # Самые старые записи в начале: чистим, пока окно истекло
+        while self._recent_writes:
+            oldest_id, written_at = next(iter(self._recent_writes.items()))
+            if now - written_at <= self.read_your_writes_window:
+                break
+            del self._recent_writes[oldest_id]
+
+    def _read_pool(self, telegram_id: Optional[int] = None):
+        """
+        Пул для чтения: реплика по кругу или primary, если пользователь только
+        что писал либо все реплики выведены из ротации
+        """
+        if not self._replicas:
+            return self._pool
+        now = self._clock()
+        if telegram_id is not None:
+            written_at = self._recent_writes.get(telegram_id)
+            if written_at is not None and now - written_at <= self.read_your_writes_window:
+                return self._pool
+        for _ in range(len(self._replicas)):
+            index = next(self._replica_turn) % len(self._replicas)
+            if self._replica_down.get(index, 0.0) <= now:
+                return self._replicas[index]
+        return self._pool
+
+    def _replica_failed(self, pool, error: BaseException):
+        index = self._replicas.index(pool)
+        self._replica_down[index] = self._clock() + _REPLICA_RETRY_SECONDS
+        logger.warning(f"[DB] replica {index} failed, reading from primary for {_REPLICA_RETRY_SECONDS:.0f}s: "
+                       f"{error!r}")
+
+    async def _acquire_read(self, telegram_id: Optional[int] = None):
+        """(пул, соединение) для чтения; при недоступной реплике — primary"""
+        pool = self._read_pool(telegram_id)
+        if pool is not self._pool:
+            try:
+                return pool, await pool.acquire()
+            except _REPLICA_ERRORS as e:
+                self._replica_failed(pool, e)
+                pool = self._pool
+        return pool, await pool.acquire()
+
+    async def _read(self, telegram_id: Optional[int], query: Callable[[asyncpg.Connection], Awaitable[T]]) -> T:
+        """
+        Выполняет query(conn) на пуле чтения
+
+        При ошибке соединения с репликой запрос повторяется на primary, поэтому
+        query не должен ничего отдавать наружу до завершения.
+        """
+        pool, conn = await self._acquire_read(telegram_id)
+        try:
+            return await query(conn)
+        except _REPLICA_ERRORS as e:
+            if pool is self._pool:
+                raise
+            self._replica_failed(pool, e)
+        finally:
+            await pool.release(conn)
+        async with self._pool.acquire() as conn:
+            return await query(conn)
+
+    async def warmup(self, pool=None):
+        """
+        Открывает min_size соединений пула и выполняет на каждом читающие запросы горячего пути
+
+        pool — по умолчанию primary; реплики прогреваются тем же методом.
+        """
+        pool = pool or self._pool
+        min_size = pool.get_min_size()
+        # Держим соединения одновременно, чтобы пул отдал разные
+        connections = [await pool.acquire() for _ in range(min_size)]
+        try:
+            for conn in connections:
+                for query, args in HOT_QUERIES:
+                    # Первый настоящий запрос на соединении не платит за разбор и планирование
+                    await conn.fetch(query, *args)
+        finally:
+            for conn in connections:
+                await pool.release(conn)
+        logger.info(f"[DB] pool warmed up: {min_size} connections, {len(HOT_QUERIES)} statements each")
+
+    def pool_stats(self) -> dict:
+        """Заполненность пула: сколько соединений занято относительно max_size; реплики — суммарно"""
+        if self._pool is None:
+            return {"size": 0, "idle": 0, "in_use": 0, "max_size": 0, "saturation": 0.0,
+                    "replicas": 0, "replicas_down": 0, "replica_size": 0, "replica_in_use": 0}
+        size = self._pool.get_size()
+        idle = self._pool.get_idle_size()
+        max_size = self._pool.get_max_size()
+        now = self._clock()
+        return {
+            "size": size,
+            "idle": idle,
+            "in_use": size - idle,
+            "max_size": max_size,
+            "saturation": round((size - idle) / max_size, 3),
+            "replicas": len(self._replicas),
+            "replicas_down": sum(1 for until in self._replica_down.values() if until > now),
+            "replica_size": sum(replica.get_size() for replica in self._replicas),
+            "replica_in_use": sum(replica.get_size() - replica.get_idle_size() for replica in self._replicas),
+        }
+
+    async def flush_history(self):
+        """Сбрасывает буфер отложенной записи истории"""
+        if self.history_writer:
+            await self.history_writer.close()
+
     async def disconnect(self):
         """Закрывает пул соединений"""
+        if self._partition_task is not None:
+            self._partition_task.cancel()
+            self._partition_task = None
+        await self.flush_history()
+        for replica in self._replicas:
+            await replica.close()
+        self._replicas = []
+        self._replica_down.clear()
         if self._pool:
             await self._pool.close()
+            self._pool = None
             logger.info("[DB] disconnected")
 
     async def _init_schema(self):
-        """Применяет schema.sql"""
-        schema_path = os.path.join(os.path.dirname(__file__), "sql\\schema.sql")
-        with open(schema_path, encoding="utf-8") as f:
-            schema = f.read()
-        async with self._pool.acquire() as conn:
-            await conn.execute(schema)
+        """Применяет миграции и создаёт партиции истории на год вперёд"""
+        await MigrationRunner(self._pool).run()
+        await self.ensure_history_partitions()
         await self._init_products()
 
+    async def ensure_history_partitions(self, months_ahead: int = _PARTITION_MONTHS_AHEAD):
+        """Создаёт недостающие помесячные партиции истории от текущего месяца БД"""
+        async with self._pool.acquire() as conn:
+            await conn.execute(_SQL_ENSURE_PARTITIONS, months_ahead)
+
+    async def _maintain_partitions(self):
+        """Периодически докладывает партиции: бот может работать без перезапуска дольше горизонта"""
+        while True:
+            await asyncio.sleep(_PARTITION_CHECK_SECONDS)
+            try:
+                await self.ensure_history_partitions()
+            except (OSError, asyncpg.PostgresError) as e:
+                logger.warning(f"[DB] history partition check failed: {e!r}")
+
     async def _init_products(self):
         async with self._pool.acquire() as conn:
             count = await conn.fetchval("SELECT COUNT(*) FROM products")
-            if count > 0:
-                return
+            if count == 0:
+                data = _load_json("products.json")
+                products = data["products_calories_per_hundred"]  # ← берём нужный ключ
 
-            data = _load_json("products.json")
-            products = data["products_calories_per_hundred"]  # ← берём нужный ключ
+                await conn.executemany(
+                    "INSERT INTO products (product_name, calories_per_hundred) VALUES ($1, $2) ON CONFLICT DO NOTHING",
+                    [(p["product"], p["calories_per_hundred"]) for p in products]
+                )
+                logger.info(f"[DB] inserted {len(products)} products")
 
-            await conn.executemany(
-                "INSERT INTO products (product_name, calories_per_hundred) VALUES ($1, $2) ON CONFLICT DO NOTHING",
-                [(p["product"], p["calories_per_hundred"]) for p in products]
-            )
-            logger.info(f"[DB] inserted {len(products)} products")
+            if not await conn.fetchval("SELECT EXISTS (SELECT 1 FROM product_aliases)"):
+                pairs = [(alias, name) for name, aliases in _load_aliases().items() for alias in aliases]
+                await conn.execute(
+                    _SQL_SEED_ALIASES,
+                    [normalize_name(alias) for alias, _ in pairs],
+                    [name for _, name in pairs]
+                )
+                logger.info(f"[DB] seeded aliases for {len(pairs)} product names")
+
+    async def _load_catalog(self):
+        """
+        Загружает products и product_aliases в кэш каталога и поисковый индекс
+
+        Загружается не больше catalog.max_size продуктов: сначала базовые из
+        products.json, затем остальные по алфавиту, страницами. Точный поиск
+        дочитывает остальные из БД при первом обращении, а нечёткий поиск
+        (search_products, подсказки при опечатке) видит только загруженные.
+        """
+        catalog = ProductCatalog(self.catalog.max_size)
+        base_names = _base_product_names()
+        async with self._pool.acquire() as conn:
+            alias_count = await _extend_catalog(conn, catalog, await conn.fetch(_SQL_CATALOG_BASE, base_names))
+            last_name = None
+            while catalog.max_size is None or len(catalog) < catalog.max_size:
+                limit = _CATALOG_PAGE_SIZE
+                if catalog.max_size is not None:
+                    limit = min(limit, catalog.max_size - len(catalog))
+                rows = await conn.fetch(_SQL_CATALOG_PAGE, last_name, limit, base_names)
+                alias_count += await _extend_catalog(conn, catalog, rows)
+                if len(rows) < limit:
+                    break
+                last_name = rows[-1]["product_name"]
+        catalog.loaded = True
+        self.catalog = catalog
+
+        self.search_index = ProductSearchIndex()
+        for name in self.catalog.names():
+            self.search_index.add(name, self.catalog.aliases(name))
+        logger.info(f"[DB] product catalog loaded: {len(self.catalog)} products, {alias_count} aliases")
 
     # ──────────────────────────────────────────
     # Users
@@ -77,88 +662,343 @@ class Database:
             return row is not None
 
     async def add_user(self, telegram_id: int):
+        self._mark_write(telegram_id)
         async with self._pool.acquire() as conn:
             await conn.execute(
                 "INSERT INTO calories_config (telegram_id) VALUES ($1) ON CONFLICT DO NOTHING",
                 telegram_id
             )
 
+    async def ensure_user(self, telegram_id: int) -> Optional[int]:
+        """Создаёт пользователя при необходимости и возвращает его дневной лимит за один запрос"""
+        # Только что созданного пользователя на репликах может ещё не быть
+        self._mark_write(telegram_id)
+        async with self._pool.acquire() as conn:
+            daily_calories = await conn.fetchval(
+                _SQL_ENSURE_USER,
+                telegram_id
+            )
+            return _limit_or_none(daily_calories)
+
     async def set_daily_calories(self, telegram_id: int, daily_calories: int) -> bool:
+        self._mark_write(telegram_id)
         async with self._pool.acquire() as conn:
             result = await conn.execute(
-                "UPDATE calories_config SET daily_calories = $1 WHERE telegram_id = $2",
+                _SQL_SET_DAILY_CALORIES,
                 daily_calories, telegram_id
             )
             return result == "UPDATE 1"
 
     async def get_daily_limit(self, telegram_id: int) -> Optional[int]:
-        async with self._pool.acquire() as conn:
-            row = await conn.fetchrow(
-                "SELECT daily_calories FROM calories_config WHERE telegram_id = $1",
-                telegram_id
-            )
-            return row["daily_calories"] if row and row["daily_calories"] > 0 else None
+        row = await self._read(telegram_id, lambda conn: conn.fetchrow(
+            "SELECT daily_calories FROM calories_config WHERE telegram_id = $1",
+            telegram_id
+        ))
+        return row["daily_calories"] if row and row["daily_calories"] > 0 else None
 
     # ──────────────────────────────────────────
     # Products
     # ──────────────────────────────────────────
 
     async def check_product_exists(self, product_name: str) -> bool:
-        async with self._pool.acquire() as conn:
-            row = await conn.fetchrow(
-                "SELECT 1 FROM products WHERE product_name = $1",
-                product_name
-            )
-            return row is not None
+        return await self.get_product_info(product_name) is not None
 
     async def get_product_info(self, product_name: str) -> Optional[Tuple]:
+        """(id, калорийность, каноническое название) по названию или синониму"""
+        info = self.catalog.get(product_name)
+        if info is not None:
+            return info
+
+        # Промах кэша: продукт или синоним мог добавить другой процесс бота
         async with self._pool.acquire() as conn:
             row = await conn.fetchrow(
-                "SELECT id, calories_per_hundred, product_name FROM products WHERE product_name = $1",
-                product_name
+                _SQL_GET_PRODUCT,
+                product_name, normalize_name(product_name)
             )
-            return (str(row["id"]), row["calories_per_hundred"], row["product_name"]) if row else None
+        if row is None:
+            return None
+        info = self.catalog.put(row["id"], row["product_name"], row["calories_per_hundred"])
+        self.catalog.put_alias(product_name, row["product_name"])
+        return info
 
     async def add_product(self, product_name: str, calories_per_hundred: int) -> bool:
+        """
+        Добавляет продукт в каталог
+
+        Если название — другая форма или синоним уже известного продукта
+        ("Яблоки", "apple"), новая строка не создаётся: название сохраняется
+        синонимом существующего продукта.
+
+        Returns:
+            True, если создан новый продукт
+        """
+        existing = self.search_index.lookup(product_name)
+        if existing is not None:
+            if normalize_name(existing) != normalize_name(product_name):
+                await self.add_alias(product_name, existing)
+            return False
+
         async with self._pool.acquire() as conn:
-            result = await conn.execute(
-                "INSERT INTO products (product_name, calories_per_hundred) VALUES ($1, $2) ON CONFLICT DO NOTHING",
+            row = await conn.fetchrow(
+                _SQL_ADD_PRODUCT,
                 product_name, calories_per_hundred
             )
-            return result == "INSERT 0 1"
+        if row is None:
+            return False
+        self.catalog.put(row["id"], product_name, calories_per_hundred)
+        self.search_index.add(product_name)
+        return True
 
-    async def get_products_info(self) -> List[List]:
+    async def add_alias(self, alias: str, product_name: str):
+        """Сохраняет alias синонимом продукта product_name"""
         async with self._pool.acquire() as conn:
-            rows = await conn.fetch("SELECT product_name, calories_per_hundred FROM products")
-            return [[row["product_name"], row["calories_per_hundred"]] for row in rows]
+            await conn.execute(
+                _SQL_ADD_ALIAS,
+                normalize_name(alias), product_name
+            )
+        self.catalog.put_alias(alias, product_name)
+        self.search_index.add(product_name, [alias])
+
+    def search_products(self, query: str, limit: int = 5) -> List[Tuple[str, float]]:
+        """Нечёткий поиск без обращения к БД — только по загруженной части каталога (см. _load_catalog)"""
+        return self.search_index.search(query, limit)
+
+    async def get_products_info(self) -> List[List]:
+        rows = await self._read(None, lambda conn: conn.fetch("SELECT product_name, calories_per_hundred FROM products"))
+        return [[row["product_name"], row["calories_per_hundred"]] for row in rows]
 
     # ──────────────────────────────────────────
     # Calories history
     # ──────────────────────────────────────────
 
     async def get_today_calories(self, telegram_id: int) -> Optional[List[List]]:
+        rows = await self._read(telegram_id, lambda conn: conn.fetch(_SQL_TODAY_CALORIES, telegram_id))
+        return [[row["product_name"], float(row["calories"])] for row in rows] if rows else None
+
+    async def get_user_day_snapshot(self, telegram_id: int) -> UserDaySnapshot:
+        """
+        Создаёт пользователя при необходимости и возвращает его день за один запрос
+
+        С репликами день сначала читается с реплики; на primary (с созданием
+        пользователя) запрос идёт, только если реплика пользователя не знает.
+        """
+        row = None
+        if self._read_pool(telegram_id) is not self._pool:
+            row = await self._read(telegram_id, lambda conn: conn.fetchrow(_SQL_USER_DAY_READ, telegram_id))
+        if row is None:
+            self._mark_write(telegram_id)
+            async with self._pool.acquire() as conn:
+                row = await conn.fetchrow(
+                    _SQL_USER_DAY_SNAPSHOT,
+                    telegram_id
+                )
+                if row is None:
+                    # Пользователя одновременно создал другой процесс: наш INSERT
+                    # дождался его и ничего не вставил, а снимок запроса строку ещё
+                    # не видит. Повтор идёт с новым снимком, где она уже есть
+                    row = await conn.fetchrow(
+                        _SQL_USER_DAY_SNAPSHOT,
+                        telegram_id
+                    )
+        limit = _limit_or_none(row["daily_calories"])
+        entries = [[name, float(calories)] for name, calories in zip(row["names"] or [], row["calories"] or [])]
+        return UserDaySnapshot(
+            telegram_id=telegram_id,
+            daily_limit=limit,
+            total=float(row["total"] or 0),
+            items_count=row["items_count"] or 0,
+            entries=entries,
+            is_new_user=row["is_new"]
+        )
+
+    async def get_range_summary(self, telegram_id: int, start: datetime.date, end: datetime.date,
+                                top_products: Optional[int] = 10) -> RangeSummary:
+        """
+        Итоги за период [start, end]: по дням и по продуктам, агрегированные в БД
+
+        Args:
+            top_products: сколько продуктов вернуть; 0 — не считать разбивку
+                по продуктам (тогда читается только daily_totals), None — все
+
+        Длинные периоды читаются серверным курсором порциями по _CURSOR_PREFETCH строк.
+        """
+        stream = (end - start).days > _CURSOR_RANGE_DAYS or top_products is None
+
+        async def query(conn) -> RangeSummary:
+            summary = RangeSummary(telegram_id=telegram_id, start=start, end=end, daily_limit=None)
+            async for row in self._rows(conn, stream, _SQL_RANGE_DAYS, telegram_id, start, end):
+                summary.daily_limit = _limit_or_none(row["daily_calories"])
+                if row["date"] is not None:
+                    summary.days.append((row["date"], float(row["total"]), row["items_count"]))
+            if top_products != 0:
+                async for row in self._rows(conn, stream, _SQL_RANGE_PRODUCTS,
+                                            telegram_id, start, end, top_products):
+                    summary.products.append((row["product_name"], float(row["total"]), row["items_count"]))
+            return summary
+
+        return await self._read(telegram_id, query)
+
+    async def get_recent_summary(self, telegram_id: int, days: int,
+                                 top_products: Optional[int] = 0) -> RangeSummary:
+        """
+        Итоги за последние days дней, включая сегодня
+
+        Границы периода считает БД по CURRENT_DATE, поэтому «сегодня» совпадает
+        с датой, под которой записываются калории, независимо от часового пояса
+        процесса бота. top_products — как в get_range_summary.
+        """
+        async def query(conn) -> RangeSummary:
+            rows = await conn.fetch(_SQL_RECENT_DAYS, telegram_id, days)
+            end = rows[0]["today"]
+            summary = RangeSummary(telegram_id=telegram_id, start=end - datetime.timedelta(days=days - 1),
+                                   end=end, daily_limit=_limit_or_none(rows[0]["daily_calories"]))
+            summary.days = [(row["date"], float(row["total"]), row["items_count"])
+                            for row in rows if row["date"] is not None]
+            if top_products != 0:
+                for row in await conn.fetch(_SQL_RANGE_PRODUCTS, telegram_id, summary.start, end, top_products):
+                    summary.products.append((row["product_name"], float(row["total"]), row["items_count"]))
+            return summary
+
+        return await self._read(telegram_id, query)
+
+    @staticmethod
+    async def _rows(conn, stream: bool, query: str, *args):
+        """Строки запроса: серверным курсором в транзакции или одним fetch"""
+        if not stream:
+            for row in await conn.fetch(query, *args):
+                yield row
+            return
+        async with conn.transaction(readonly=True):
+            async for row in conn.cursor(query, *args, prefetch=_CURSOR_PREFETCH):
+                yield row
+
+    async def stream_history(self, telegram_id: int, start: datetime.date = None, end: datetime.date = None,
+                             batch_size: int = 1000) -> AsyncIterator[Tuple[datetime.date, int, str, float]]:
+        """
+        Вся история пользователя за период построчно: (дата, order_id, продукт, калории)
+
+        Строки читаются серверным курсором порциями по batch_size, поэтому память
+        не зависит от длины истории. Соединение занято, пока генератор не исчерпан
+        или не закрыт. end=None — без верхней границы.
+        """
+        start = start or datetime.date.min
+        # Строки уходят наружу по мере чтения, поэтому на primary переходим
+        # только при ошибке получения соединения, а не посреди выгрузки
+        pool, conn = await self._acquire_read(telegram_id)
+        try:
+            async with conn.transaction(readonly=True):
+                cursor = await conn.cursor(_SQL_STREAM_HISTORY, telegram_id, start, end)
+                while True:
+                    rows = await cursor.fetch(batch_size)
+                    for row in rows:
+                        yield row["date"], row["order_id"], row["product_name"], float(row["calories"])
+                    if len(rows) < batch_size:
+                        break
+        finally:
+            await pool.release(conn)
+
+    async def add_calories_for_today(self, telegram_id: int, calories: float,
+                                     product_name: str) -> Optional[Tuple[int, str, float, float]]:
+        """
+        Добавляет запись за сегодня одним атомарным запросом
+
+        Returns:
+            (order_id, product_name, calories, итог за день с учётом записи);
+            None в режиме отложенной записи — номер и итог появятся после сброса буфера
+        """
+        self._mark_write(telegram_id)
+        if self.history_writer:
+            await self.history_writer.add(telegram_id, calories, product_name)
+            return None
+
+        async with self._pool.acquire() as conn:
+            # order_id и итог дня выдаёт upsert в daily_totals: строка блокируется,
+            # параллельные процессы не получат дубль номера
+            row = await conn.fetchrow(
+                _SQL_ADD_CALORIES,
+                telegram_id, calories, product_name
+            )
+            return row["order_id"], row["product_name"], float(row["calories"]), float(row["daily_total"])
+
+    async def add_calories_batch(self, telegram_id: int, entries: List[Tuple[str, float]]) -> float:
+        """
+        Добавляет несколько записей [продукт, калории] за сегодня за один запрос
+
+        Returns:
+            Итог за день с учётом добавленных записей
+        """
+        if not entries:
+            return 0.0
+        names = [name for name, _ in entries]
+        calories = [value for _, value in entries]
+        self._mark_write(telegram_id)
+        async with self._pool.acquire() as conn:
+            daily_total = await conn.fetchval(
+                _SQL_ADD_CALORIES_BATCH,
+                telegram_id, names, calories
+            )
+            return float(daily_total)
+
+    # ──────────────────────────────────────────
+    # Bot persistence
+    # ──────────────────────────────────────────
+
+    async def load_conversations(self, name: str, max_age_hours: float) -> Dict[str, int]:
+        """Незавершённые диалоги, обновлявшиеся не раньше max_age_hours назад"""
         async with self._pool.acquire() as conn:
             rows = await conn.fetch(
-                """SELECT product_name, calories
-                   FROM user_calories_history
-                   WHERE telegram_id = $1 AND date = CURRENT_DATE
-                   ORDER BY order_id""",
-                telegram_id
+                """SELECT key, state FROM bot_conversations
+                   WHERE name = $1 AND updated_at > now() - make_interval(secs => $2)""",
+                name, max_age_hours * 3600
             )
-            return [[row["product_name"], float(row["calories"])] for row in rows] if rows else None
+            return {row["key"]: row["state"] for row in rows}
 
-    async def add_calories_for_today(self, telegram_id: int, calories: float, product_name: str):
+    async def save_conversations(self, name: str, states: Dict[str, Optional[int]]):
+        """Пакетно сохраняет состояния; None — диалог завершён, строка удаляется"""
+        upserts = [(key, state) for key, state in states.items() if state is not None]
+        deletes = [key for key, state in states.items() if state is None]
         async with self._pool.acquire() as conn:
-            # Считаем текущий максимальный order_id за сегодня
-            max_order = await conn.fetchval(
-                """SELECT COALESCE(MAX(order_id), 0)
-                   FROM user_calories_history
-                   WHERE telegram_id = $1 AND date = CURRENT_DATE""",
-                telegram_id
+            async with conn.transaction():
+                if upserts:
+                    await conn.execute(
+                        """INSERT INTO bot_conversations (name, key, state)
+                           SELECT $1, key, state FROM unnest($2::text[], $3::int[]) AS u(key, state)
+                           ON CONFLICT (name, key) DO UPDATE
+                           SET state = EXCLUDED.state, updated_at = now()""",
+                        name, [key for key, _ in upserts], [state for _, state in upserts]
+                    )
+                if deletes:
+                    await conn.execute(
+                        "DELETE FROM bot_conversations WHERE name = $1 AND key = ANY($2::text[])",
+                        name, deletes
+                    )
+
+    async def load_user_data(self, max_age_hours: float) -> Dict[int, dict]:
+        async with self._pool.acquire() as conn:
+            rows = await conn.fetch(
+                """SELECT telegram_id, data FROM bot_user_data
+                   WHERE updated_at > now() - make_interval(secs => $1)""",
+                max_age_hours * 3600
             )
-            await conn.execute(
-                """INSERT INTO user_calories_history
-                   (telegram_id, calories, product_name, order_id, date)
-                   VALUES ($1, $2, $3, $4, CURRENT_DATE)""",
-                telegram_id, calories, product_name, max_order + 1
-            )
\ No newline at end of file
+            return {row["telegram_id"]: json.loads(row["data"]) for row in rows}
+
+    async def save_user_data(self, data: Dict[int, Optional[dict]]):
+        """Пакетно сохраняет user_data; None — данные пользователя удаляются"""
+        upserts = [(telegram_id, value) for telegram_id, value in data.items() if value is not None]
+        deletes = [telegram_id for telegram_id, value in data.items() if value is None]
+        async with self._pool.acquire() as conn:
+            async with conn.transaction():
+                if upserts:
+                    await conn.execute(
+                        """INSERT INTO bot_user_data (telegram_id, data)
+                           SELECT telegram_id, data::jsonb FROM unnest($1::bigint[], $2::text[]) AS u(telegram_id, data)
+                           ON CONFLICT (telegram_id) DO UPDATE
+                           SET data = EXCLUDED.data, updated_at = now()""",
+                        [telegram_id for telegram_id, _ in upserts],
+                        [json.dumps(value, ensure_ascii=False) for _, value in upserts]
+                    )
+                if deletes:
+                    await conn.execute(
+                        "DELETE FROM bot_user_data WHERE telegram_id = ANY($1::bigint[])",
+                        deletes
+                    )
@@ -0,0 +1,76 @@
+import codecs
+import csv
+import datetime
+from typing import AsyncIterable, BinaryIO, Tuple
+
+EXPORT_FORMATS = ("csv", "parquet")
+COLUMNS = ("date", "order_id", "product_name", "calories")
+
+HistoryRow = Tuple[datetime.date, int, str, float]
+
+
+class ExportError(RuntimeError):
+    """Выгрузка в запрошенном формате невозможна"""
+
+
+async def write_csv(rows: AsyncIterable[HistoryRow], fileobj: BinaryIO) -> int:
+    """
+    Пишет строки истории в CSV по мере поступления
+
+    Returns:
+        Число записанных строк
+    """
+    # utf-8-sig: Excel иначе не узнаёт кодировку кириллицы
+    text = codecs.getwriter("utf-8-sig")(fileobj)
+    writer = csv.writer(text)
+    writer.writerow(COLUMNS)
+    count = 0
+    async for row in rows:
+        writer.writerow(row)
+        count += 1
+    return count
+
+
+async def write_parquet(rows: AsyncIterable[HistoryRow], fileobj: BinaryIO, row_group_size: int = 10_000) -> int:
+    """
+    Пишет строки истории в Parquet группами по row_group_size строк
+
+    В памяти держится только текущая группа.
+
+    Returns:
+        Число записанных строк
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ExportError("Parquet export requires pyarrow") from None
+
+    schema = pa.schema([
+        ("date", pa.date32()),
+        ("order_id", pa.int32()),
+        ("product_name", pa.string()),
+        ("calories", pa.float64()),
+    ])
+    columns = [[] for _ in COLUMNS]
+    count = 0
+    with pq.ParquetWriter(fileobj, schema) as writer:
+        async for row in rows:
+            for column, value in zip(columns, row):
+                column.append(value)
+            count += 1
+            if len(columns[0]) >= row_group_size:
+                writer.write_table(pa.Table.from_arrays(columns, schema=schema))
+                columns = [[] for _ in COLUMNS]
+        if columns[0] or count == 0:
+            writer.write_table(pa.Table.from_arrays(columns, schema=schema))
+    return count
+
+
+async def export_history(rows: AsyncIterable[HistoryRow], fileobj: BinaryIO, fmt: str = "csv") -> int:
+    """Выгрузка в формате fmt из EXPORT_FORMATS, возвращает число строк"""
+    if fmt == "csv":
+        return await write_csv(rows, fileobj)
+    if fmt == "parquet":
+        return await write_parquet(rows, fileobj)
+    raise ExportError(f"Unknown export format: {fmt}")
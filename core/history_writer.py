@@ -0,0 +1,197 @@
+import asyncio
+import datetime
+import logging
+from typing import List, Optional, Tuple
+
+import asyncpg
+
+logger = logging.getLogger(__name__)
+
+_BUFFER_COLUMNS = ["seq", "telegram_id", "added_at", "calories", "product_name"]
+
+# Раздаёт order_id и обновляет daily_totals для всей пачки одним запросом.
+# Дата — added_at::date в часовом поясе сессии, то есть тот CURRENT_DATE,
+# который был в БД в момент add(), а не в момент сброса.
+# ORDER BY в upsert фиксирует порядок блокировок строк daily_totals,
+# чтобы параллельные сбросы из разных процессов не взаимоблокировались
+_FLUSH_SQL = """
+    WITH buffered AS (
+        SELECT seq, telegram_id, added_at::date AS date, calories, product_name
+        FROM history_buffer
+    ), batch AS (
+        SELECT telegram_id, date, calories, product_name,
+               row_number() OVER (PARTITION BY telegram_id, date ORDER BY seq) AS rn
+        FROM buffered
+    ), per_day AS (
+        SELECT telegram_id, date, COUNT(*) AS items_count, SUM(calories) AS total
+        FROM buffered
+        GROUP BY telegram_id, date
+    ), totals AS (
+        INSERT INTO daily_totals AS t (telegram_id, date, last_order_id, total, items_count)
+        SELECT telegram_id, date, items_count, total, items_count
+        FROM per_day
+        ORDER BY telegram_id, date
+        ON CONFLICT (telegram_id, date) DO UPDATE
+        SET last_order_id = t.last_order_id + EXCLUDED.last_order_id,
+            total = t.total + EXCLUDED.total,
+            items_count = t.items_count + EXCLUDED.items_count
+        RETURNING telegram_id, date, last_order_id
+    )
+    INSERT INTO user_calories_history (telegram_id, calories, product_name, order_id, date)
+    SELECT b.telegram_id, b.calories, b.product_name, t.last_order_id - p.items_count + b.rn, b.date
+    FROM batch b
+    JOIN per_day p USING (telegram_id, date)
+    JOIN totals t USING (telegram_id, date)
+"""
+
+_CLOSE = object()
+
+
+class BufferedHistoryWriter:
+    """
+    Отложенная (write-behind) запись истории калорий
+
+    Записи копятся в asyncio.Queue и сбрасываются каждые flush_interval секунд
+    или по batch_size строк: COPY во временную таблицу и один INSERT ... SELECT,
+    который раздаёт order_id и обновляет daily_totals.
+
+    wait_for_flush=True — add() возвращается после записи в БД;
+    False — сразу после постановки в очередь (запись может потеряться при падении процесса).
+    Дата записи — дата БД на момент add(), как у CURRENT_DATE синхронной записи.
+
+    Неудавшийся сброс повторяется с паузами retry_delays. Если и повторы не
+    прошли, ожидающие add() получают ошибку, а уже подтверждённые записи
+    (wait_for_flush=False) остаются в буфере до следующего сброса.
+    """
+
+    def __init__(self, pool: asyncpg.Pool, flush_interval: float = 0.05, batch_size: int = 500,
+                 wait_for_flush: bool = True, retry_delays: Tuple[float, ...] = (0.1, 0.5, 2.0)):
+        self._pool = pool
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.wait_for_flush = wait_for_flush
+        self.retry_delays = retry_delays
+        self._queue: asyncio.Queue = asyncio.Queue()
+        # Подтверждённые записи из неудавшегося сброса: уйдут первыми в следующем
+        self._carry: List[tuple] = []
+        self._task: Optional[asyncio.Task] = None
+        # Будит фоновую задачу раньше flush_interval: набралась пачка или вызван close()
+        self._wakeup = asyncio.Event()
+        self._closed = False
+        self.rows_written = 0
+        self.flushes = 0
+        self.failed_flushes = 0
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def add(self, telegram_id: int, calories: float, product_name: str):
+        """Ставит запись в очередь на сброс"""
+        if self._closed:
+            raise RuntimeError("history writer is closed")
+        future = asyncio.get_running_loop().create_future() if self.wait_for_flush else None
+        added_at = datetime.datetime.now(datetime.timezone.utc)
+        self._queue.put_nowait((telegram_id, added_at, calories, product_name, future))
+        if self._queue.qsize() >= self.batch_size:
+            self._wakeup.set()
+        if future is not None:
+            await future
+
+    async def close(self):
+        """Сбрасывает всё, что осталось в буфере, и останавливает фоновую задачу"""
+        if self._closed:
+            return
+        self._closed = True
+        if self._task is None:
+            self.start()
+        self._queue.put_nowait(_CLOSE)
+        self._wakeup.set()
+        await self._task
+        logger.info(f"[DB] history writer closed: {self.rows_written} rows in {self.flushes} flushes")
+
+    def stats(self) -> dict:
+        return {
+            "queued": self._queue.qsize(),
+            "carried": len(self._carry),
+            "rows_written": self.rows_written,
+            "flushes": self.flushes,
+            "failed_flushes": self.failed_flushes,
+        }
+
+    async def _run(self):
+        closing = False
+        while not closing:
+            item = await self._queue.get()
+            if item is _CLOSE:
+                break
+            batch = [item]
+            # Даём пачке набраться, если очередь ещё не заполнила её целиком
+            if self._queue.qsize() < self.batch_size - 1 and not self._wakeup.is_set():
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+            if not self._closed:
+                self._wakeup.clear()
+            while len(batch) < self.batch_size and not self._queue.empty():
+                item = self._queue.get_nowait()
+                if item is _CLOSE:
+                    closing = True
+                    break
+                batch.append(item)
+            # close() ставит маркер последним, после него в очереди ничего нет
+            await self._flush(batch)
+        if self._carry:
+            await self._flush([])
+        if self._carry:
+            logger.error(f"[DB] history writer closed with {len(self._carry)} unwritten acknowledged rows")
+
+    async def _flush(self, batch: List[tuple]):
+        batch = self._carry + batch
+        self._carry = []
+        if not batch:
+            return
+        records = [
+            (seq, telegram_id, added_at, calories, product_name)
+            for seq, (telegram_id, added_at, calories, product_name, _) in enumerate(batch)
+        ]
+        for delay in (*self.retry_delays, None):
+            try:
+                await self._write(records)
+                break
+            except Exception as e:
+                self.failed_flushes += 1
+                if delay is not None:
+                    logger.warning(f"[DB] history flush of {len(batch)} rows failed, retrying in {delay}s: {e!r}")
+                    await asyncio.sleep(delay)
+                    continue
+                logger.exception(f"[DB] history flush of {len(batch)} rows failed")
+                for item in batch:
+                    future = item[-1]
+                    if future is None:
+                        self._carry.append(item)
+                    elif not future.done():
+                        future.set_exception(e)
+                return
+
+        self.flushes += 1
+        self.rows_written += len(batch)
+        for *_, future in batch:
+            if future is not None and not future.done():
+                future.set_result(None)
+
+    async def _write(self, records: List[tuple]):
+        async with self._pool.acquire() as conn:
+            async with conn.transaction():
+                await conn.execute(
+                    """CREATE TEMP TABLE IF NOT EXISTS history_buffer (
+                           seq          INTEGER,
+                           telegram_id  BIGINT,
+                           added_at     TIMESTAMPTZ,
+                           calories     NUMERIC(8, 2),
+                           product_name TEXT
+                       ) ON COMMIT DELETE ROWS"""
+                )
+                await conn.copy_records_to_table("history_buffer", records=records, columns=_BUFFER_COLUMNS)
+                await conn.execute(_FLUSH_SQL)
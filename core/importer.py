@@ -0,0 +1,200 @@
+"""
+Потоковый импорт каталога продуктов из CSV / JSON Lines
+
+    python -m core.importer products.csv [--format csv|jsonl] [--batch-size 10000]
+                            [--name-field product_name] [--calories-field calories_per_hundred]
+                            [--delimiter ,]
+
+Файл читается построчно и уходит в Postgres пачками: COPY во временную
+таблицу и один INSERT ... ON CONFLICT, который трогает только новые и
+изменившиеся продукты. Повторный импорт того же файла ничего не пишет.
+Запущенные боты увидят новые продукты сразу (промах кэша идёт в БД),
+новую калорийность уже закэшированных — после перезапуска.
+"""
+import argparse
+import asyncio
+import csv
+import json
+import sys
+import time
+from dataclasses import dataclass
+from typing import Iterable, Iterator, List, Optional, TextIO, Tuple
+
+import asyncpg
+
+from core.db import _connection_options
+from core.migrations import MigrationRunner
+
+_STAGING_COLUMNS = ["seq", "product_name", "calories_per_hundred"]
+
+# Для повторяющихся в пачке названий побеждает последняя строка файла.
+# changed отсекает совпадающие с таблицей строки до upsert, чтобы не брать
+# на них блокировки; WHERE в DO UPDATE защищает от гонки с параллельной записью
+_MERGE_SQL = """
+    WITH incoming AS (
+        SELECT DISTINCT ON (product_name) product_name, calories_per_hundred
+        FROM product_staging
+        ORDER BY product_name, seq DESC
+    ), changed AS (
+        SELECT i.product_name, i.calories_per_hundred
+        FROM incoming i
+        LEFT JOIN products p USING (product_name)
+        WHERE p.calories_per_hundred IS DISTINCT FROM i.calories_per_hundred
+    ), upserted AS (
+        INSERT INTO products AS p (product_name, calories_per_hundred)
+        SELECT product_name, calories_per_hundred FROM changed
+        ORDER BY product_name
+        ON CONFLICT (product_name) DO UPDATE
+        SET calories_per_hundred = EXCLUDED.calories_per_hundred
+        WHERE p.calories_per_hundred IS DISTINCT FROM EXCLUDED.calories_per_hundred
+        RETURNING (xmax = 0) AS inserted
+    )
+    SELECT (SELECT COUNT(*) FROM incoming) AS distinct_rows,
+           COUNT(*) FILTER (WHERE inserted) AS inserted,
+           COUNT(*) FILTER (WHERE NOT inserted) AS updated
+    FROM upserted
+"""
+
+
+@dataclass
+class ImportStats:
+    read: int = 0
+    skipped: int = 0
+    inserted: int = 0
+    updated: int = 0
+    unchanged: int = 0
+    elapsed: float = 0.0
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.read / self.elapsed if self.elapsed else 0.0
+
+
+def parse_calories(value) -> Optional[int]:
+    """Калорийность на 100г целым числом; None для пустых и некорректных значений"""
+    if value is None or value == "":
+        return None
+    try:
+        calories = round(float(value))
+    except (TypeError, ValueError):
+        return None
+    return calories if calories >= 0 else None
+
+
+def read_products(stream: TextIO, fmt: str = "csv", name_field: str = "product_name",
+                  calories_field: str = "calories_per_hundred",
+                  delimiter: str = ",") -> Iterator[Optional[Tuple[str, int]]]:
+    """
+    Построчно отдаёт (название, калорийность) из CSV или JSON Lines
+
+    Для строк без названия или с некорректной калорийностью отдаёт None,
+    чтобы вызывающий посчитал их пропущенными.
+    """
+    if fmt == "csv":
+        records: Iterable[dict] = csv.DictReader(stream, delimiter=delimiter)
+    elif fmt == "jsonl":
+        records = (json.loads(line) for line in stream if line.strip())
+    else:
+        raise ValueError(f"Unknown import format: {fmt}")
+
+    for record in records:
+        name = " ".join(str(record.get(name_field) or "").split())
+        calories = parse_calories(record.get(calories_field))
+        yield (name, calories) if name and calories is not None else None
+
+
+class ProductImporter:
+    """Загрузка каталога пачками через COPY во временную таблицу"""
+
+    def __init__(self, conn: asyncpg.Connection, batch_size: int = 10_000):
+        self.conn = conn
+        self.batch_size = batch_size
+        self.stats = ImportStats()
+
+    async def import_rows(self, rows: Iterable[Optional[Tuple[str, int]]], progress=None) -> ImportStats:
+        started = time.perf_counter()
+        batch: List[tuple] = []
+        for row in rows:
+            self.stats.read += 1
+            if row is None:
+                self.stats.skipped += 1
+                continue
+            batch.append((self.stats.read, *row))
+            if len(batch) >= self.batch_size:
+                await self._merge(batch)
+                batch = []
+                self.stats.elapsed = time.perf_counter() - started
+                if progress:
+                    progress(self.stats)
+        await self._merge(batch)
+        self.stats.elapsed = time.perf_counter() - started
+        return self.stats
+
+    async def _merge(self, batch: List[tuple]):
+        if not batch:
+            return
+        async with self.conn.transaction():
+            await self.conn.execute(
+                """CREATE TEMP TABLE IF NOT EXISTS product_staging (
+                       seq                  BIGINT,
+                       product_name         TEXT,
+                       calories_per_hundred INTEGER
+                   ) ON COMMIT DELETE ROWS"""
+            )
+            await self.conn.copy_records_to_table("product_staging", records=batch, columns=_STAGING_COLUMNS)
+            row = await self.conn.fetchrow(_MERGE_SQL)
+        self.stats.inserted += row["inserted"]
+        self.stats.updated += row["updated"]
+        self.stats.unchanged += row["distinct_rows"] - row["inserted"] - row["updated"]
+
+
+def _report(stats: ImportStats, final: bool = False):
+    prefix = "done" if final else "progress"
+    print(
+        f"[IMPORT] {prefix}: {stats.read} rows read, {stats.inserted} inserted, {stats.updated} updated, "
+        f"{stats.unchanged} unchanged, {stats.skipped} skipped — "
+        f"{stats.rows_per_second:,.0f} rows/s in {stats.elapsed:.1f}s",
+        file=sys.stderr
+    )
+
+
+async def run_import(path: str, fmt: str, batch_size: int, name_field: str, calories_field: str,
+                     delimiter: str) -> ImportStats:
+    pool = await asyncpg.create_pool(**_connection_options(), min_size=1, max_size=1)
+    try:
+        await MigrationRunner(pool).run()
+        stream = sys.stdin if path == "-" else open(path, encoding="utf-8-sig", newline="")
+        try:
+            rows = read_products(stream, fmt, name_field, calories_field, delimiter)
+            async with pool.acquire() as conn:
+                stats = await ProductImporter(conn, batch_size).import_rows(rows, progress=_report)
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+    finally:
+        await pool.close()
+    _report(stats, final=True)
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path", help="файл CSV / JSON Lines или - для stdin")
+    parser.add_argument("--format", choices=("csv", "jsonl"), default=None,
+                        help="по умолчанию определяется по расширению")
+    parser.add_argument("--batch-size", type=int, default=10_000)
+    parser.add_argument("--name-field", default="product_name")
+    parser.add_argument("--calories-field", default="calories_per_hundred")
+    parser.add_argument("--delimiter", default=",", help="разделитель CSV (\\t для TSV)")
+    args = parser.parse_args()
+
+    from dotenv import load_dotenv
+    load_dotenv()
+
+    fmt = args.format or ("jsonl" if args.path.endswith((".jsonl", ".ndjson")) else "csv")
+    delimiter = "\t" if args.delimiter == "\\t" else args.delimiter
+    asyncio.run(run_import(args.path, fmt, args.batch_size, args.name_field, args.calories_field, delimiter))
+
+
+if __name__ == "__main__":
+    main()
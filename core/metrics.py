@@ -0,0 +1,325 @@
+import asyncio
+import functools
+import inspect
+import logging
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Границы корзин в секундах: от долей миллисекунды до долгих запросов
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_labels(labels: Tuple[Tuple[str, str], ...], extra: str = "") -> str:
+    parts = [f'{key}="{value}"' for key, value in labels]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Histogram:
+    """Гистограмма в стиле Prometheus: счётчики по корзинам, сумма и количество"""
+
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        # Последняя ячейка — +Inf
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def render(self, name: str, labels: Tuple[Tuple[str, str], ...]) -> List[str]:
+        lines = []
+        cumulative = 0
+        for bound, count in zip((*self.buckets, "+Inf"), self.counts):
+            cumulative += count
+            le = 'le="%s"' % bound
+            lines.append(f"{name}_bucket{_format_labels(labels, le)} {cumulative}")
+        lines.append(f"{name}_sum{_format_labels(labels)} {self.sum}")
+        lines.append(f"{name}_count{_format_labels(labels)} {self.count}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    Метрики процесса в памяти и их выдача в текстовом формате Prometheus
+
+    Гистограммы и счётчики обновляются на горячем пути (без блокировок — всё
+    в одном event loop). Значения, которые и так считают другие компоненты
+    (пул, блокировки, кэши), снимаются коллекторами только в момент запроса.
+    """
+
+    def __init__(self):
+        self._histograms: Dict[str, Dict[tuple, Histogram]] = {}
+        self._counters: Dict[str, Dict[tuple, float]] = {}
+        self._help: Dict[str, Tuple[str, str]] = {}
+        self._collectors: List[Callable[[], Iterable[Tuple[str, str, str, float]]]] = []
+
+    def histogram(self, name: str, help_text: str, **labels) -> Histogram:
+        self._help.setdefault(name, ("histogram", help_text))
+        series = self._histograms.setdefault(name, {})
+        key = tuple(sorted(labels.items()))
+        histogram = series.get(key)
+        if histogram is None:
+            histogram = series[key] = Histogram()
+        return histogram
+
+    def inc(self, name: str, help_text: str, value: float = 1, **labels) -> None:
+        self._help.setdefault(name, ("counter", help_text))
+        series = self._counters.setdefault(name, {})
+        key = tuple(sorted(labels.items()))
+        series[key] = series.get(key, 0) + value
+
+    def counter_value(self, name: str, **labels) -> float:
+        return self._counters.get(name, {}).get(tuple(sorted(labels.items())), 0)
+
+    def add_collector(self, collector: Callable[[], Iterable[Tuple[str, str, str, float]]]) -> None:
+        """collector() отдаёт (имя, тип, описание, значение) на момент запроса"""
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        lines = []
+        for name, series in self._histograms.items():
+            kind, help_text = self._help[name]
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+            for labels, histogram in series.items():
+                lines += histogram.render(name, labels)
+        for name, series in self._counters.items():
+            kind, help_text = self._help[name]
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+            lines += [f"{name}{_format_labels(labels)} {value}" for labels, value in series.items()]
+        for collector in self._collectors:
+            try:
+                samples = list(collector())
+            except Exception:
+                logger.exception("[METRICS] collector failed")
+                continue
+            for name, kind, help_text, value in samples:
+                lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}", f"{name} {value}"]
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+
+def _timed(func: Callable, histogram: Histogram, on_error: Callable[[], None]) -> Callable:
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            except Exception:
+                on_error()
+                raise
+            finally:
+                histogram.observe(time.perf_counter() - started)
+    else:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            except Exception:
+                on_error()
+                raise
+            finally:
+                histogram.observe(time.perf_counter() - started)
+    return wrapper
+
+
+def instrument(obj, metric: str, label: str, registry: MetricsRegistry = REGISTRY,
+               skip: Iterable[str] = (), coroutines_only: bool = False) -> List[str]:
+    """
+    Оборачивает публичные методы объекта замером времени и подсчётом ошибок
+
+    Обёртки ставятся на экземпляр, поэтому код, который берёт методы через
+    self (в том числе регистрация обработчиков), видит уже обёрнутые версии.
+
+    Returns:
+        Имена обёрнутых методов
+    """
+    wrapped = []
+    for name, func in inspect.getmembers(type(obj), inspect.isfunction):
+        if name.startswith("_") or name in skip:
+            continue
+        if coroutines_only and not inspect.iscoroutinefunction(func):
+            continue
+        if inspect.isasyncgenfunction(func):
+            # Время генератора — это время потребителя, замер вызова ничего не скажет
+            continue
+        histogram = registry.histogram(f"{metric}_duration_seconds", f"Latency of {label} calls", **{label: name})
+        on_error = functools.partial(registry.inc, f"{metric}_errors_total", f"Failed {label} calls", **{label: name})
+        setattr(obj, name, _timed(getattr(obj, name), histogram, on_error))
+        wrapped.append(name)
+    return wrapped
+
+
+class _TimedAcquire:
+    """Контекст pool.acquire(), замеряющий ожидание свободного соединения"""
+
+    __slots__ = ("_context", "_histogram")
+
+    def __init__(self, context, histogram: Histogram):
+        self._context = context
+        self._histogram = histogram
+
+    async def __aenter__(self):
+        started = time.perf_counter()
+        connection = await self._context.__aenter__()
+        self._histogram.observe(time.perf_counter() - started)
+        return connection
+
+    async def __aexit__(self, *exc_info):
+        return await self._context.__aexit__(*exc_info)
+
+    def __await__(self):
+        started = time.perf_counter()
+        connection = yield from self._context.__await__()
+        self._histogram.observe(time.perf_counter() - started)
+        return connection
+
+
+class InstrumentedPool:
+    """Прокси пула asyncpg: всё как у пула, но acquire() замеряет ожидание"""
+
+    def __init__(self, pool, histogram: Histogram):
+        self._pool = pool
+        self._wait = histogram
+
+    def acquire(self, *args, **kwargs) -> _TimedAcquire:
+        return _TimedAcquire(self._pool.acquire(*args, **kwargs), self._wait)
+
+    def __getattr__(self, name):
+        return getattr(self._pool, name)
+
+
+def instrument_database(db, registry: MetricsRegistry = REGISTRY) -> None:
+    """Замеры всех запросов Database, ожидания пула и заполненности пула"""
+    instrument(db, "calories_db", "method", registry, skip={"pool_stats"})
+    pool_wait = registry.histogram("calories_db_pool_wait_seconds", "Time spent waiting for a pool connection")
+    replica_wait = registry.histogram("calories_db_replica_pool_wait_seconds",
+                                      "Time spent waiting for a read replica connection")
+    connect = db.connect
+
+    @functools.wraps(connect)
+    async def connect_and_wrap_pool():
+        await connect()
+        if db._pool is not None and not isinstance(db._pool, InstrumentedPool):
+            db._pool = InstrumentedPool(db._pool, pool_wait)
+        db._replicas = [
+            replica if isinstance(replica, InstrumentedPool) else InstrumentedPool(replica, replica_wait)
+            for replica in db._replicas
+        ]
+
+    db.connect = connect_and_wrap_pool
+
+    def pool_samples():
+        stats = db.pool_stats()
+        yield "calories_db_pool_size", "gauge", "Open pool connections", stats["size"]
+        yield "calories_db_pool_in_use", "gauge", "Pool connections in use", stats["in_use"]
+        yield "calories_db_pool_max_size", "gauge", "Pool max_size", stats["max_size"]
+        if stats["replicas"]:
+            yield "calories_db_replicas", "gauge", "Configured read replicas", stats["replicas"]
+            yield "calories_db_replicas_down", "gauge", "Read replicas out of rotation", stats["replicas_down"]
+            yield "calories_db_replica_pool_size", "gauge", "Open replica pool connections", stats["replica_size"]
+            yield "calories_db_replica_pool_in_use", "gauge", "Replica pool connections in use", \
+                stats["replica_in_use"]
+        catalog = db.catalog.stats()
+        yield "calories_catalog_hits_total", "counter", "Product catalog cache hits", catalog["hits"]
+        yield "calories_catalog_misses_total", "counter", "Product catalog cache misses", catalog["misses"]
+        yield "calories_catalog_evictions_total", "counter", "Product catalog cache evictions", catalog["evictions"]
+
+    registry.add_collector(pool_samples)
+
+
+def instrument_handlers(handlers, registry: MetricsRegistry = REGISTRY,
+                        lock_stats: Callable[[], dict] = None) -> None:
+    """
+    Замеры всех обработчиков BotHandlers и ожидания блокировок пользователей
+
+    lock_stats — источник статистики блокировок; по умолчанию блокировки
+    самих обработчиков. С PerUserUpdateProcessor очереди пользователей стоят
+    на блокировках процессора, и передавать нужно их статистику.
+    """
+    instrument(handlers, "calories_handler", "handler", registry, coroutines_only=True)
+    lock_stats = lock_stats or handlers.lock_stats
+
+    def lock_samples():
+        stats = lock_stats()
+        yield "calories_lock_wait_seconds_total", "counter", "Total time updates waited for a user lock", \
+            stats["total_wait"]
+        yield "calories_lock_waits_total", "counter", "Lock acquisitions that had to wait", stats["contended"]
+        yield "calories_lock_wait_seconds_max", "gauge", "Longest user lock wait", stats["max_wait"]
+        yield "calories_lock_acquisitions_total", "counter", "User lock acquisitions", stats["acquisitions"]
+        yield "calories_lock_active_users", "gauge", "Users holding or waiting for a lock", stats["active_users"]
+        profiles = handlers.profiles.stats()
+        yield "calories_profile_cache_hits_total", "counter", "User profile cache hits", profiles["hits"]
+        yield "calories_profile_cache_misses_total", "counter", "User profile cache misses", profiles["misses"]
+
+    registry.add_collector(lock_samples)
+
+
+def instrument_admission(admission, registry: MetricsRegistry = REGISTRY) -> None:
+    """Счётчики допуска обновлений: пропущенные и отброшенные по причинам"""
+
+    def admission_samples():
+        stats = admission.stats()
+        yield "calories_admission_admitted_total", "counter", "Updates admitted to handlers", stats["admitted"]
+        yield "calories_admission_coalesced_total", "counter", "Repeated idempotent presses dropped", \
+            stats["coalesced"]
+        yield "calories_admission_queue_full_total", "counter", "Updates dropped on a full user queue", \
+            stats["queue_full"]
+        yield "calories_admission_rate_limited_total", "counter", "Updates dropped by the user rate limit", \
+            stats["rate_limited"]
+
+    registry.add_collector(admission_samples)
+
+
+class MetricsServer:
+    """HTTP-эндпоинт /metrics на asyncio, без сторонних зависимостей"""
+
+    def __init__(self, registry: MetricsRegistry = REGISTRY, host: str = "127.0.0.1", port: int = 9100):
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        logger.info(f"[METRICS] serving on http://{self.host}:{self.port}/metrics")
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            request_line = await reader.readline()
+            while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                pass
+            parts = request_line.split()
+            if len(parts) >= 2 and parts[1].split(b"?")[0] == b"/metrics":
+                status, body = b"200 OK", self.registry.render().encode()
+            else:
+                status, body = b"404 Not Found", b"not found\n"
+            writer.write(
+                b"HTTP/1.1 " + status + b"\r\nContent-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+                b"Content-Length: " + str(len(body)).encode() + b"\r\nConnection: close\r\n\r\n" + body
+            )
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
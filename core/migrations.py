@@ -0,0 +1,115 @@
+import hashlib
+import logging
+import os
+import re
+from dataclasses import dataclass
+from typing import List
+
+import asyncpg
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(__file__), "sql", "migrations")
+
+# Ключ advisory lock: несколько процессов бота не применяют миграции одновременно
+_ADVISORY_LOCK_KEY = 0x43414C4F
+
+
+class MigrationError(RuntimeError):
+    """Применённая миграция не совпадает с файлом в репозитории"""
+
+
+@dataclass(frozen=True)
+class Migration:
+    """Файл миграции вида NNNN_name.sql"""
+    version: int
+    name: str
+    sql: str
+
+    @property
+    def checksum(self) -> str:
+        return hashlib.sha256(self.sql.encode("utf-8")).hexdigest()
+
+
+def load_migrations(path: str = MIGRATIONS_DIR) -> List[Migration]:
+    """Читает миграции из каталога в порядке версий"""
+    migrations = []
+    for filename in sorted(os.listdir(path)):
+        match = re.match(r"^(\d+)_(\w+)\.sql$", filename)
+        if not match:
+            continue
+        with open(os.path.join(path, filename), encoding="utf-8") as f:
+            migrations.append(Migration(int(match.group(1)), match.group(2), f.read()))
+    return migrations
+
+
+def schema_fingerprint(applied) -> str:
+    """Отпечаток схемы по парам (версия, checksum)"""
+    digest = hashlib.sha256()
+    for version, checksum in applied:
+        digest.update(f"{version}:{checksum};".encode("utf-8"))
+    return digest.hexdigest()
+
+
+class MigrationRunner:
+    """Применяет версионированные миграции, пропуская работу при совпадении отпечатка"""
+
+    def __init__(self, pool: asyncpg.Pool, migrations: List[Migration] = None):
+        self._pool = pool
+        self._migrations = migrations if migrations is not None else load_migrations()
+
+    @property
+    def fingerprint(self) -> str:
+        return schema_fingerprint((m.version, m.checksum) for m in self._migrations)
+
+    async def _applied(self, conn) -> dict:
+        try:
+            rows = await conn.fetch("SELECT version, checksum FROM schema_migrations ORDER BY version")
+        except asyncpg.UndefinedTableError:
+            return {}
+        return {row["version"]: row["checksum"] for row in rows}
+
+    async def run(self) -> int:
+        """
+        Применяет недостающие миграции
+
+        Returns:
+            Количество применённых миграций
+        """
+        async with self._pool.acquire() as conn:
+            applied = await self._applied(conn)
+            if schema_fingerprint(applied.items()) == self.fingerprint:
+                logger.info("[DB] schema is up to date, migrations skipped")
+                return 0
+
+            await conn.execute("SELECT pg_advisory_lock($1)", _ADVISORY_LOCK_KEY)
+            try:
+                await conn.execute(
+                    """CREATE TABLE IF NOT EXISTS schema_migrations (
+                           version    INTEGER PRIMARY KEY,
+                           name       TEXT NOT NULL,
+                           checksum   TEXT NOT NULL,
+                           applied_at TIMESTAMPTZ NOT NULL DEFAULT now()
+                       )"""
+                )
+                # Пока ждали блокировку, миграции мог применить другой процесс
+                applied = await self._applied(conn)
+                count = 0
+                for migration in self._migrations:
+                    if migration.version in applied:
+                        if applied[migration.version] != migration.checksum:
+                            raise MigrationError(
+                                f"migration {migration.version}_{migration.name} was changed after being applied"
+                            )
+                        continue
+                    async with conn.transaction():
+                        await conn.execute(migration.sql)
+                        await conn.execute(
+                            "INSERT INTO schema_migrations (version, name, checksum) VALUES ($1, $2, $3)",
+                            migration.version, migration.name, migration.checksum
+                        )
+                    logger.info(f"[DB] applied migration {migration.version}_{migration.name}")
+                    count += 1
+                return count
+            finally:
+                await conn.execute("SELECT pg_advisory_unlock($1)", _ADVISORY_LOCK_KEY)
@@ -0,0 +1,94 @@
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from core.str_utils import get_lemma_phrase
+
+
+def normalize_name(text: str) -> str:
+    """Нижний регистр, ё → е, схлопывание пробелов"""
+    return " ".join(text.lower().replace("ё", "е").split())
+
+
+def lemmatize_name(text: str) -> str:
+    """Нормальная форма каждого слова названия"""
+    return get_lemma_phrase(normalize_name(text))
+
+
+def trigrams(text: str) -> Set[str]:
+    """Символьные триграммы с краевыми пробелами, как в pg_trgm"""
+    result = set()
+    for word in text.split():
+        padded = f"  {word} "
+        result.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return result
+
+
+class ProductSearchIndex:
+    """Нечёткий поиск продуктов: леммы + триграммы, с синонимами"""
+
+    MIN_SCORE = 0.35
+
+    def __init__(self):
+        # ключ (нормализованный или лемматизированный) → каноническое название
+        self._exact: Dict[str, str] = {}
+        # триграмма → множество ключей, в которых она встречается
+        self._postings: Dict[str, Set[str]] = defaultdict(set)
+        self._key_trigrams: Dict[str, int] = {}
+        self._key_product: Dict[str, str] = {}
+
+    def __len__(self) -> int:
+        return len(set(self._key_product.values()))
+
+    def add(self, product_name: str, aliases: Iterable[str] = ()) -> None:
+        """Индексирует продукт под его названием и синонимами"""
+        for name in (product_name, *aliases):
+            key = normalize_name(name)
+            if not key:
+                continue
+            self._exact.setdefault(key, product_name)
+            self._exact.setdefault(lemmatize_name(key), product_name)
+            if key in self._key_product:
+                continue
+            grams = trigrams(key)
+            self._key_product[key] = product_name
+            self._key_trigrams[key] = len(grams)
+            for gram in grams:
+                self._postings[gram].add(key)
+
+    def lookup(self, query: str) -> Optional[str]:
+        """Точное совпадение по нормализованной форме или лемме"""
+        key = normalize_name(query)
+        return self._exact.get(key) or self._exact.get(lemmatize_name(key))
+
+    def search(self, query: str, limit: int = 5) -> List[Tuple[str, float]]:
+        """
+        Ранжированные подсказки по запросу
+
+        Returns:
+            Список (каноническое название, score), score 1.0 — точное совпадение
+        """
+        exact = self.lookup(query)
+        results: List[Tuple[str, float]] = [(exact, 1.0)] if exact else []
+
+        query_grams = trigrams(lemmatize_name(query)) | trigrams(normalize_name(query))
+        if not query_grams:
+            return results
+
+        shared: Dict[str, int] = defaultdict(int)
+        for gram in query_grams:
+            for key in self._postings.get(gram, ()):
+                shared[key] += 1
+
+        # Коэффициент Дайса; для продукта берём лучший из его ключей
+        best: Dict[str, float] = {}
+        for key, count in shared.items():
+            score = 2 * count / (len(query_grams) + self._key_trigrams[key])
+            product = self._key_product[key]
+            if score >= self.MIN_SCORE and score > best.get(product, 0):
+                best[product] = score
+
+        if exact:
+            best.pop(exact, None)
+        ranked = sorted(best.items(), key=lambda item: (-item[1], item[0]))
+        results.extend((name, round(score, 3)) for name, score in ranked)
+        return results[:limit]
@@ -0,0 +1,46 @@
+-- Помесячные партиции user_calories_history и индекс под запросы "за день"
+
+CREATE OR REPLACE FUNCTION ensure_history_partition(day DATE) RETURNS void AS $$
+DECLARE
+    month_start DATE := date_trunc('month', day)::date;
+    partition_name TEXT := format('user_calories_history_%s', to_char(month_start, 'YYYY_MM'));
+BEGIN
+    EXECUTE format(
+        'CREATE TABLE IF NOT EXISTS %I PARTITION OF user_calories_history FOR VALUES FROM (%L) TO (%L)',
+        partition_name, month_start, (month_start + INTERVAL '1 month')::date
+    );
+END;
+$$ LANGUAGE plpgsql;
+
+ALTER TABLE user_calories_history RENAME TO user_calories_history_legacy;
+
+CREATE TABLE user_calories_history (
+    id          UUID NOT NULL DEFAULT gen_random_uuid(),
+    telegram_id BIGINT NOT NULL,
+    calories    NUMERIC(8, 2) NOT NULL,
+    product_name TEXT NOT NULL,
+    order_id    INTEGER NOT NULL,
+    date        DATE NOT NULL DEFAULT CURRENT_DATE,
+    PRIMARY KEY (id, date)
+) PARTITION BY RANGE (date);
+
+-- INCLUDE делает выборку "за сегодня" index-only
+CREATE INDEX user_calories_history_user_day_idx
+    ON user_calories_history (telegram_id, date, order_id)
+    INCLUDE (product_name, calories);
+
+-- Страховка на случай, если партиция месяца не была создана заранее
+CREATE TABLE user_calories_history_default PARTITION OF user_calories_history DEFAULT;
+
+SELECT ensure_history_partition(month)
+FROM (
+    SELECT DISTINCT date_trunc('month', date)::date AS month FROM user_calories_history_legacy
+    UNION
+    SELECT (CURRENT_DATE + make_interval(months => m))::date FROM generate_series(0, 12) AS m
+) AS months;
+
+INSERT INTO user_calories_history (id, telegram_id, calories, product_name, order_id, date)
+SELECT id, telegram_id, calories, product_name, order_id, date
+FROM user_calories_history_legacy;
+
+DROP TABLE user_calories_history_legacy;
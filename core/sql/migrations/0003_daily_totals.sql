@@ -0,0 +1,17 @@
+-- Агрегат за день на (пользователь, день): атомарная выдача order_id без MAX(order_id),
+-- итог и число записей обновляются вместе со вставкой в историю
+
+CREATE TABLE IF NOT EXISTS daily_totals (
+    telegram_id   BIGINT NOT NULL,
+    date          DATE NOT NULL,
+    last_order_id INTEGER NOT NULL,
+    total         NUMERIC(10, 2) NOT NULL DEFAULT 0,
+    items_count   INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (telegram_id, date)
+);
+
+INSERT INTO daily_totals (telegram_id, date, last_order_id, total, items_count)
+SELECT telegram_id, date, MAX(order_id), SUM(calories), COUNT(*)
+FROM user_calories_history
+GROUP BY telegram_id, date
+ON CONFLICT DO NOTHING;
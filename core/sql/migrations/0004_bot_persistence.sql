@@ -0,0 +1,15 @@
+-- Состояния ConversationHandler и user_data: переживают рестарт и переезд пользователя между процессами
+
+CREATE TABLE IF NOT EXISTS bot_conversations (
+    name       TEXT NOT NULL,
+    key        TEXT NOT NULL,
+    state      INTEGER NOT NULL,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    PRIMARY KEY (name, key)
+);
+
+CREATE TABLE IF NOT EXISTS bot_user_data (
+    telegram_id BIGINT PRIMARY KEY,
+    data        JSONB NOT NULL,
+    updated_at  TIMESTAMPTZ NOT NULL DEFAULT now()
+);
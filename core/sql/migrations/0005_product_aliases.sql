@@ -0,0 +1,9 @@
+-- Другие названия продуктов (английские, пользовательские) указывают на строку products.
+-- alias хранится нормализованным: нижний регистр, ё → е, одиночные пробелы
+
+CREATE TABLE IF NOT EXISTS product_aliases (
+    alias      TEXT PRIMARY KEY,
+    product_id UUID NOT NULL REFERENCES products (id) ON DELETE CASCADE
+);
+
+CREATE INDEX IF NOT EXISTS product_aliases_product_id_idx ON product_aliases (product_id);
@@ -0,0 +1,39 @@
+-- ensure_history_partition переживает строки месяца в DEFAULT-партиции.
+-- Если партиция месяца не была создана вовремя, записи попадают в DEFAULT, и
+-- CREATE TABLE ... PARTITION OF для этого месяца падает. Теперь партиция
+-- создаётся отдельной таблицей, строки месяца переносятся в неё из DEFAULT,
+-- и только потом она подключается
+
+CREATE OR REPLACE FUNCTION ensure_history_partition(day DATE) RETURNS void AS $$
+DECLARE
+    month_start DATE := date_trunc('month', day)::date;
+    month_end DATE := (month_start + INTERVAL '1 month')::date;
+    partition_name TEXT := format('user_calories_history_%s', to_char(month_start, 'YYYY_MM'));
+BEGIN
+    IF to_regclass(partition_name) IS NOT NULL THEN
+        RETURN;
+    END IF;
+    -- Несколько процессов бота могут проверять один месяц одновременно
+    PERFORM pg_advisory_xact_lock(hashtext(partition_name));
+    IF to_regclass(partition_name) IS NOT NULL THEN
+        RETURN;
+    END IF;
+
+    EXECUTE format(
+        'CREATE TABLE %I (LIKE user_calories_history INCLUDING DEFAULTS INCLUDING CONSTRAINTS)',
+        partition_name
+    );
+    EXECUTE format(
+        'WITH moved AS (
+             DELETE FROM user_calories_history_default WHERE date >= %L AND date < %L RETURNING *
+         )
+         INSERT INTO %I SELECT * FROM moved',
+        month_start, month_end, partition_name
+    );
+    -- Индексы родителя создаются на подключаемой таблице автоматически
+    EXECUTE format(
+        'ALTER TABLE user_calories_history ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+        partition_name, month_start, month_end
+    );
+END;
+$$ LANGUAGE plpgsql;
@@ -1,10 +1,26 @@
+import os
+import threading
+from functools import lru_cache
+
 from log.log_writer import log
-import pymorphy3
 
-morph = pymorphy3.MorphAnalyzer(lang='ru')
+_morph = None
+_morph_lock = threading.Lock()
+
+
+def get_morph():
+    """Общий MorphAnalyzer: словари (десятки МБ) грузятся при первой лемматизации, а не при импорте"""
+    global _morph
+    if _morph is None:
+        with _morph_lock:
+            if _morph is None:
+                import pymorphy3
+                _morph = pymorphy3.MorphAnalyzer(lang='ru')
+    return _morph
 
-def print_daily_report(products: list[tuple[str, int]]):
-    total = sum(cal for _, cal in products)
+def print_daily_report(products: list[tuple[str, int]], total: float = None):
+    if total is None:
+        total = sum(cal for _, cal in products)
     report = ""
     report += ("\n" + "=" * 40 + "\n")
     report +=("📊  Отчёт за сегодня".center(40) + "\n")
@@ -28,8 +44,18 @@ def print_product_info( products: list[tuple[str,int]]):
 
     log('info',"=" * 50 + "\n" + "\n")
 
+@lru_cache(maxsize=int(os.getenv("LEMMA_CACHE_SIZE", 50_000)))
 def get_lemma_word(word):
-    return morph.parse(word)[0].normal_form
+    return get_morph().parse(word)[0].normal_form
+
+def get_lemma_words(words) -> list[str]:
+    """Лемматизация пачки слов: повторы и уже встречавшиеся слова берутся из кэша"""
+    lemmas = {word: get_lemma_word(word) for word in dict.fromkeys(words)}
+    return [lemmas[word] for word in words]
+
+def get_lemma_phrase(text: str) -> str:
+    """Нормальная форма каждого слова многословного названия"""
+    return " ".join(get_lemma_words(text.split()))
 
 def multiply_calories(calories_per_hundred, product_weight):
     calories = (product_weight * calories_per_hundred) / 100
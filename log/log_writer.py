@@ -1,15 +1,196 @@
+import atexit
+import datetime
+import decimal
+import functools
+import inspect
+import json
 import logging
-logging.basicConfig(format = u'%(filename)s[LINE:%(lineno)d]# %(levelname)-8s [%(asctime)s]  %(message)s', level = logging.INFO)
-
-
-def log(level, value):
-    if level == 'info':
-        logging.info(value)
-    elif level == 'debug':
-        logging.debug(value)
-    elif level == 'warning':
-        logging.warning(value)
-    elif level == 'error':
-        logging.error(value)
-    elif level == 'critical':
-        logging.critical(value)
\ No newline at end of file
+import os
+import queue
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Optional
+
+TEXT_FORMAT = u'%(filename)s[LINE:%(lineno)d]# %(levelname)-8s [%(asctime)s]  %(message)s'
+
+_LEVELS = {
+    'debug': logging.DEBUG,
+    'info': logging.INFO,
+    'warning': logging.WARNING,
+    'error': logging.ERROR,
+    'critical': logging.CRITICAL,
+}
+
+# Контекст текущего обновления: попадает в каждую запись, сделанную при его обработке
+log_user_id: ContextVar[Optional[int]] = ContextVar("log_user_id", default=None)
+log_handler: ContextVar[Optional[str]] = ContextVar("log_handler", default=None)
+
+_listener: Optional[QueueListener] = None
+
+
+class ContextFilter(logging.Filter):
+    """Добавляет в запись user_id и handler из contextvars вызывающего кода"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.user_id = log_user_id.get()
+        record.handler = log_handler.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Пропускает только долю записей уровня; WARNING и выше — всегда"""
+
+    def __init__(self, rates: Dict[int, float]):
+        super().__init__()
+        self.rates = rates
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        rate = self.rates.get(record.levelno, 1.0)
+        return rate >= 1.0 or random.random() < rate
+
+
+# Значения, которые не меняются после вызова log: их можно форматировать позже
+_IMMUTABLE_ARGS = (str, int, float, bool, bytes, type(None), datetime.date, datetime.timedelta, decimal.Decimal)
+
+
+def _is_frozen(value) -> bool:
+    if isinstance(value, (tuple, frozenset)):
+        return all(_is_frozen(item) for item in value)
+    return isinstance(value, _IMMUTABLE_ARGS)
+
+
+class LazyQueueHandler(QueueHandler):
+    """
+    QueueHandler без лишнего форматирования на вызывающем потоке
+
+    Стандартный prepare() собирает сообщение до постановки в очередь, то есть
+    на event loop. Очередь здесь внутрипроцессная, поэтому запись с
+    неизменяемыми аргументами (строки, числа, даты) уходит как есть, и
+    msg % args форматирует поток слушателя. Если среди аргументов есть
+    изменяемые объекты, сообщение собирается сразу: к моменту форматирования
+    в другом потоке объект мог измениться.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        if not isinstance(record.msg, str) or not _is_frozen(record.args or ()):
+            record.msg = record.getMessage()
+            record.args = None
+        return record
+
+
+class JsonFormatter(logging.Formatter):
+    """Одна запись — одна строка JSON"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "source": f"{record.filename}:{record.lineno}",
+        }
+        user_id = getattr(record, "user_id", None)
+        if user_id is not None:
+            entry["user_id"] = user_id
+        handler = getattr(record, "handler", None)
+        if handler is not None:
+            entry["handler"] = handler
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+def _sample_rates() -> Dict[int, float]:
+    return {
+        logging.DEBUG: float(os.getenv("LOG_SAMPLE_DEBUG", 1.0)),
+        logging.INFO: float(os.getenv("LOG_SAMPLE_INFO", 1.0)),
+    }
+
+
+def setup_logging(json_format: bool = None, level: str = None, sample_rates: Dict[int, float] = None,
+                  stream=None) -> QueueListener:
+    """
+    Настраивает корневой логгер: QueueHandler → фоновый QueueListener → stderr
+
+    Вызывающий поток только кладёт запись в очередь; форматирование и запись
+    в поток вывода идут в отдельном потоке слушателя.
+    """
+    global _listener
+    if json_format is None:
+        json_format = os.getenv("LOG_FORMAT", "json") == "json"
+    level = level or os.getenv("LOG_LEVEL", "INFO")
+    if _listener is not None:
+        _listener.stop()
+
+    output = logging.StreamHandler(stream)
+    output.setFormatter(JsonFormatter() if json_format else logging.Formatter(TEXT_FORMAT))
+
+    records: queue.SimpleQueue = queue.SimpleQueue()
+    handler = LazyQueueHandler(records)
+    handler.addFilter(SamplingFilter(sample_rates if sample_rates is not None else _sample_rates()))
+    handler.addFilter(ContextFilter())
+
+    root = logging.getLogger()
+    for old in [h for h in root.handlers if isinstance(h, LazyQueueHandler)]:
+        root.removeHandler(old)
+    root.addHandler(handler)
+    root.setLevel(level)
+
+    _listener = QueueListener(records, output, respect_handler_level=True)
+    _listener.start()
+    return _listener
+
+
+def shutdown_logging():
+    """Дописывает очередь и останавливает поток слушателя"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+@contextmanager
+def log_context(user_id: int = None, handler: str = None):
+    """Привязывает user_id и handler ко всем записям внутри блока"""
+    user_token = log_user_id.set(user_id)
+    handler_token = log_handler.set(handler)
+    try:
+        yield
+    finally:
+        log_handler.reset(handler_token)
+        log_user_id.reset(user_token)
+
+
+def bind_handler_context(handlers) -> None:
+    """Оборачивает корутины обработчиков: записи внутри них несут user_id и имя обработчика"""
+    for name, func in inspect.getmembers(type(handlers), inspect.iscoroutinefunction):
+        if name.startswith("_"):
+            continue
+
+        def wrap(method, handler_name):
+            @functools.wraps(method)
+            async def wrapper(update, context, *args, **kwargs):
+                user = getattr(update, "effective_user", None)
+                with log_context(user.id if user else None, handler_name):
+                    return await method(update, context, *args, **kwargs)
+            return wrapper
+
+        setattr(handlers, name, wrap(getattr(handlers, name), name))
+
+
+def log(level, value, *args):
+    """
+    Запись в лог по имени уровня: log('info', "user %s added", user_id)
+
+    Аргументы подставляются только если запись действительно будет выведена.
+    """
+    level_no = _LEVELS.get(level)
+    if level_no is not None:
+        logging.log(level_no, value, *args, stacklevel=2)
+
+
+if not any(isinstance(h, LazyQueueHandler) for h in logging.getLogger().handlers):
+    setup_logging()
+    atexit.register(shutdown_logging)
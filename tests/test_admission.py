@@ -0,0 +1,72 @@
+from bot.admission import (
+    REJECT_COALESCED, REJECT_QUEUE_FULL, REJECT_RATE_LIMITED, AdmissionController, coalesce_key
+)
+from tests.test_update_processor import make_update
+
+
+class TestAdmissionController:
+    """Тесты на допуск обновлений"""
+
+    def _controller(self, **kwargs):
+        controller = AdmissionController(clock=lambda: controller.now, **kwargs)
+        controller.now = 100.0
+        return controller
+
+    def test_coalesce_key_only_for_idempotent_presses(self):
+        """Склеиваются только идемпотентные кнопки"""
+        assert coalesce_key(make_update(1, 42)) == "🔥 Калории сегодня"
+        assert coalesce_key(make_update(1, 42, text="овсянка")) is None
+        assert coalesce_key(object()) is None
+
+    def test_identical_queued_press_coalesced(self):
+        """Повтор ждущего нажатия отбрасывается, после dequeue снова допускается"""
+        controller = self._controller()
+        key = "🔥 Калории сегодня"
+
+        assert controller.admit(1, key, queue_depth=1) is None
+        assert controller.admit(1, key, queue_depth=2) == REJECT_COALESCED
+        assert controller.admit(2, key, queue_depth=0) is None
+
+        controller.dequeue(1, key)
+        assert controller.admit(1, key, queue_depth=1) is None
+        assert controller.stats()["coalesced"] == 1
+
+    def test_queue_bounded(self):
+        """Сверх max_pending ждущих обновления отбрасываются"""
+        controller = self._controller(max_pending=2)
+        assert controller.admit(1, None, queue_depth=2) is None
+        assert controller.admit(1, None, queue_depth=3) == REJECT_QUEUE_FULL
+
+    def test_rate_limit_refills(self):
+        """После запаса burst токены возвращаются со скоростью rate"""
+        controller = self._controller(rate=2, burst=3)
+
+        assert [controller.admit(1, None, 0) for _ in range(4)] == [None, None, None, REJECT_RATE_LIMITED]
+        assert controller.admit(2, None, 0) is None
+
+        controller.now += 0.5
+        assert controller.admit(1, None, 0) is None
+        assert controller.admit(1, None, 0) == REJECT_RATE_LIMITED
+
+    def test_idle_buckets_pruned(self):
+        """Корзины, успевшие наполниться, не хранятся"""
+        controller = self._controller(rate=1, burst=2)
+        controller.admit(1, None, 0)
+        controller.now += 5
+        controller.admit(2, None, 0)
+        assert controller.stats()["tracked_users"] == 1
+
+    def test_zero_rate_disables_limit(self):
+        """rate <= 0 отключает ограничение частоты"""
+        controller = self._controller(rate=0, burst=1)
+        assert all(controller.admit(1, None, 0) is None for _ in range(100))
+
+    def test_notify_once_until_admitted(self):
+        """Предупреждение об отказе — один раз до следующего допуска; о склейке — никогда"""
+        controller = self._controller()
+        assert not controller.should_notify(1, REJECT_COALESCED)
+        assert controller.should_notify(1, REJECT_RATE_LIMITED)
+        assert not controller.should_notify(1, REJECT_QUEUE_FULL)
+
+        controller.admit(1, None, 0)
+        assert controller.should_notify(1, REJECT_RATE_LIMITED)
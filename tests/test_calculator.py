@@ -1,3 +1,4 @@
+import datetime
 import pytest
 from core.calculator import CalorieCalculator
 
@@ -28,4 +29,43 @@ class TestCalorieCalculator:
     def test_calculate_large_values(self):
         """Большие значения"""
         result = CalorieCalculator.calculate(500, 1000)
-        assert result == 5000.0
\ No newline at end of file
+        assert result == 5000.0
+
+    def test_calculate_summary_matches_total(self):
+        """Отчёт по агрегату совпадает с отчётом по списку"""
+        items = [["Овсянка", 500.0], ["Яблоко", 300.0]]
+        assert CalorieCalculator.calculate_summary(800.0, 2, 2000) == CalorieCalculator.calculate_total(items, 2000)
+
+    def test_calculate_summary_exceeded(self):
+        """Превышение лимита"""
+        result = CalorieCalculator.calculate_summary(2500.0, 3, 2000)
+        assert result['exceeded'] == True
+        assert result['remaining'] == 0
+
+    def test_calculate_many_matches_scalar(self):
+        """Векторный расчёт поэлементно совпадает с calculate, включая границы округления"""
+        calories = [200, 33.333, 267.5, 111.5, 52, 0]
+        weights = [150, 100, 1, 1, 37.5, 250]
+        result = CalorieCalculator.calculate_many(calories, weights)
+        assert result.tolist() == [CalorieCalculator.calculate(c, w) for c, w in zip(calories, weights)]
+        assert result[2] == 2.67
+
+    def test_totals_by_day_matches_calculate_total(self):
+        """Итоги по дням совпадают с calculate_total по записям каждого дня"""
+        monday, tuesday = datetime.date(2026, 3, 2), datetime.date(2026, 3, 3)
+        dates = [tuesday, monday, tuesday, monday]
+        calories = [0.1, 500.0, 0.2, 1700.55]
+        result = CalorieCalculator.totals_by_day(dates, calories, 2000)
+        assert list(result) == [monday, tuesday]
+        assert result[monday] == CalorieCalculator.calculate_total([["a", 500.0], ["b", 1700.55]], 2000)
+        assert result[tuesday] == CalorieCalculator.calculate_total([["a", 0.1], ["b", 0.2]], 2000)
+
+    def test_calculate_period_with_limit(self):
+        """Среднее считается по всем дням периода, включая пустые"""
+        result = CalorieCalculator.calculate_period([1500.0, 2500.5], 7, 2000)
+        assert result['total'] == 4000.5
+        assert result['average'] == 571.5
+        assert result['logged_days'] == 2
+        assert result['average_delta'] == -1428.5
+        assert result['days_over_limit'] == 1
+
@@ -1,9 +1,12 @@
+import asyncio
+import datetime
 import pytest
 import sqlite3
 import tempfile
 import os
+from unittest.mock import AsyncMock, MagicMock
 
-from core.db import Database
+from core.db import HOT_QUERIES, Database, ProductCatalog, _pool_options
 
 
 @pytest.fixture(scope="function")
@@ -143,4 +146,518 @@ class TestDatabase:
         test_db.add_product("Яблоко", 52)
         test_db.add_product("Банан", 89)
         products = test_db.get_products_info()
-        assert len(products) == 2
\ No newline at end of file
+        assert len(products) == 2
+
+class TestProductCatalog:
+    """Тесты на кэш каталога продуктов"""
+
+    def test_load_and_get(self):
+        """Загруженный продукт отдаётся из кэша"""
+        catalog = ProductCatalog()
+        catalog.load([{"id": 1, "product_name": "гречка", "calories_per_hundred": 343}])
+        assert catalog.get("гречка") == ("1", 343, "гречка")
+        assert catalog.hits == 1
+        assert catalog.misses == 0
+
+    def test_get_missing(self):
+        """Промах кэша считается"""
+        catalog = ProductCatalog()
+        assert catalog.get("неизвестный") is None
+        assert catalog.misses == 1
+
+    def test_put(self):
+        """Запись в кэш после добавления продукта"""
+        catalog = ProductCatalog()
+        catalog.put("abc", "авокадо", 160)
+        assert catalog.get("авокадо") == ("abc", 160, "авокадо")
+        assert catalog.stats() == {"size": 1, "aliases": 0, "hits": 1, "misses": 0, "evictions": 0}
+
+    def test_alias_lookup(self):
+        """Синоним и другой регистр находят канонический продукт одним поиском"""
+        catalog = ProductCatalog()
+        catalog.load(
+            [{"id": 1, "product_name": "яблоко", "calories_per_hundred": 52}],
+            [{"alias": "apple", "product_id": 1}, {"alias": "orphan", "product_id": 2}]
+        )
+        assert catalog.get("Apple ") == ("1", 52, "яблоко")
+        assert catalog.get("ЯБЛОКО") == ("1", 52, "яблоко")
+        assert catalog.get("orphan") is None
+        assert catalog.aliases("яблоко") == ["apple"]
+
+    @pytest.mark.asyncio
+    async def test_known_name_stored_as_alias(self):
+        """Другая форма известного продукта сохраняется синонимом, а не новой строкой"""
+        conn = MagicMock(execute=AsyncMock(), fetchrow=AsyncMock())
+        db = Database()
+        db._pool = MagicMock()
+        db._pool.acquire.return_value = MagicMock(__aenter__=AsyncMock(return_value=conn),
+                                                  __aexit__=AsyncMock(return_value=False))
+        db.catalog.load([{"id": 1, "product_name": "яблоко", "calories_per_hundred": 52}])
+        db.search_index.add("яблоко")
+
+        assert await db.add_product("Яблоки", 60) == False
+        assert await db.add_product("Яблоко", 60) == False
+
+        conn.execute.assert_awaited_once()
+        assert conn.execute.await_args.args[1:] == ("яблоки", "яблоко")
+        assert not conn.fetchrow.called
+        assert db.catalog.get("яблоки") == ("1", 52, "яблоко")
+
+    @pytest.mark.asyncio
+    async def test_product_lookup_without_db_call(self):
+        """Поиск известного продукта не обращается к пулу"""
+        db = Database()
+        db._pool = MagicMock()
+        db.catalog.load([{"id": 1, "product_name": "гречка", "calories_per_hundred": 343}])
+
+        assert await db.check_product_exists("гречка") == True
+        assert (await db.get_product_info("гречка"))[1] == 343
+        assert not db._pool.acquire.called
+
+    def test_max_size_evicts_least_recent(self):
+        """Сверх max_size вытесняется давно не запрошенный продукт вместе с синонимами"""
+        catalog = ProductCatalog(max_size=2)
+        catalog.load(
+            [{"id": 1, "product_name": "яблоко", "calories_per_hundred": 52},
+             {"id": 2, "product_name": "гречка", "calories_per_hundred": 343}],
+            [{"alias": "apple", "product_id": 1}]
+        )
+        catalog.get("гречка")
+        catalog.get("яблоко")
+        catalog.put(3, "авокадо", 160)
+
+        assert catalog.get("гречка") is None
+        catalog.put(4, "рис", 130)
+        catalog.put(5, "овсянка", 370)
+        assert catalog.get("apple") is None
+        assert catalog.get("рис") == ("4", 130, "рис")
+        assert catalog.stats()["size"] == 2 and catalog.evictions == 3
+
+    @pytest.mark.asyncio
+    async def test_catalog_loaded_in_pages_up_to_limit(self, monkeypatch):
+        """Сначала базовые продукты, затем остальные по названию страницами, не больше max_size"""
+        monkeypatch.setattr("core.db._CATALOG_PAGE_SIZE", 2)
+        monkeypatch.setattr("core.db._base_product_names", lambda: ["яблоко"])
+        products = [{"id": i, "product_name": name, "calories_per_hundred": i}
+                    for i, name in enumerate(["авокадо", "банан", "груша", "киви", "яблоко", "арбуз"], 1)]
+
+        async def fetch(query, *args):
+            if "product_aliases" in query:
+                return [{"alias": f"alias {i}", "product_id": i} for i in args[0]]
+            if "ANY" in query:
+                return [row for row in products if row["product_name"] in args[0]]
+            last_name, limit, base = args
+            rows = sorted((row for row in products if row["product_name"] not in base
+                           and (last_name is None or row["product_name"] > last_name)),
+                          key=lambda row: row["product_name"])
+            return rows[:limit]
+
+        conn = MagicMock(fetch=AsyncMock(side_effect=fetch))
+        db = Database(replica_dsns=[], catalog_max_size=4)
+        db._pool = _pool_for(conn)
+
+        await db._load_catalog()
+
+        assert db.catalog.loaded
+        assert sorted(db.catalog.names()) == ["авокадо", "арбуз", "банан", "яблоко"]
+        assert db.catalog.get("alias 5") == ("5", 5, "яблоко")
+        assert db.catalog.get("груша") is None
+        page_args = [call.args[1:3] for call in conn.fetch.await_args_list if "LIMIT" in call.args[0]]
+        assert page_args == [(None, 2), ("арбуз", 1)]
+        assert db.search_index.lookup("банан") == "банан"
+
+
+class TestConnectionPool:
+    """Тесты на настройку и прогрев пула"""
+
+    def test_pool_options_from_env(self, monkeypatch):
+        """Размеры пула и таймауты берутся из окружения"""
+        monkeypatch.setenv("DB_POOL_MIN_SIZE", "4")
+        monkeypatch.setenv("DB_POOL_MAX_SIZE", "20")
+        monkeypatch.setenv("DB_COMMAND_TIMEOUT", "2.5")
+        options = _pool_options()
+        assert options["min_size"] == 4
+        assert options["max_size"] == 20
+        assert options["command_timeout"] == 2.5
+
+    @pytest.mark.asyncio
+    async def test_warmup_runs_hot_queries(self):
+        """Каждое из min_size соединений выполняет все горячие запросы через кэширующий fetch"""
+        connections = [MagicMock(fetch=AsyncMock(return_value=[]), prepare=AsyncMock()) for _ in range(3)]
+        db = Database()
+        db._pool = MagicMock()
+        db._pool.get_min_size.return_value = 3
+        db._pool.acquire = AsyncMock(side_effect=connections)
+        db._pool.release = AsyncMock()
+
+        await db.warmup()
+
+        for conn in connections:
+            assert [call.args[0] for call in conn.fetch.await_args_list] == [query for query, _ in HOT_QUERIES]
+            assert not conn.prepare.called
+        assert db._pool.release.await_count == 3
+
+    def test_hot_queries_read_only(self):
+        """Прогрев не выполняет пишущих запросов: он идёт и на репликах"""
+        for query, _ in HOT_QUERIES:
+            assert not any(word in query.upper() for word in ("INSERT", "UPDATE", "DELETE"))
+
+
+class FakeCursorConnection:
+    """Соединение, отдающее заранее заданные строки через fetch или cursor"""
+
+    def __init__(self, days, products):
+        self.results = {"daily_calories": days, "product_name": products}
+        self.fetched = []
+        self.cursors = []
+
+    def _result(self, query):
+        return next(rows for key, rows in self.results.items() if key in query.split("FROM")[0])
+
+    async def fetch(self, query, *args):
+        self.fetched.append(query)
+        return self._result(query)
+
+    def transaction(self, **kwargs):
+        return MagicMock(__aenter__=AsyncMock(), __aexit__=AsyncMock(return_value=False))
+
+    def cursor(self, query, *args, prefetch=None):
+        self.cursors.append(query)
+        rows = self._result(query)
+
+        async def iterate():
+            for row in rows:
+                yield row
+        return iterate()
+
+
+class FakeAcquire:
+    """Результат pool.acquire(): и контекстный менеджер, и awaitable, как в asyncpg"""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    async def __aenter__(self):
+        return self.conn
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+    def __await__(self):
+        if isinstance(self.conn, BaseException):
+            raise self.conn
+        return self.conn
+        yield
+
+
+def _pool_for(conn):
+    pool = MagicMock(release=AsyncMock())
+    pool.acquire.side_effect = lambda: FakeAcquire(conn)
+    return pool
+
+
+class TestRangeSummary:
+    """Тесты на итоги за период"""
+
+    DAY = datetime.date(2026, 3, 1)
+    DAYS = [
+        {"daily_calories": 2000, "date": DAY, "total": 1500, "items_count": 3},
+        {"daily_calories": 2000, "date": DAY + datetime.timedelta(days=1), "total": 2500.5, "items_count": 4},
+    ]
+    PRODUCTS = [{"product_name": "овсянка", "total": 1400, "items_count": 4}]
+
+    @pytest.mark.asyncio
+    async def test_short_range_fetched(self):
+        """Короткий период читается обычным fetch и собирается в RangeSummary"""
+        conn = FakeCursorConnection(self.DAYS, self.PRODUCTS)
+        db = Database()
+        db._pool = _pool_for(conn)
+
+        summary = await db.get_range_summary(1, self.DAY, self.DAY + datetime.timedelta(days=6))
+
+        assert summary.daily_limit == 2000
+        assert summary.total == 4000.5
+        assert summary.items_count == 7
+        assert summary.products == [("овсянка", 1400.0, 4)]
+        assert len(conn.fetched) == 2 and not conn.cursors
+
+    @pytest.mark.asyncio
+    async def test_recent_summary_uses_db_date(self):
+        """Границы последних дней берутся из CURRENT_DATE базы"""
+        today = self.DAY + datetime.timedelta(days=1)
+        conn = FakeCursorConnection([{**row, "today": today} for row in self.DAYS], self.PRODUCTS)
+        db = Database()
+        db._pool = _pool_for(conn)
+
+        summary = await db.get_recent_summary(1, 7)
+
+        assert (summary.start, summary.end) == (today - datetime.timedelta(days=6), today)
+        assert summary.daily_limit == 2000
+        assert len(summary.days) == 2 and summary.products == []
+        assert len(conn.fetched) == 1
+
+    @pytest.mark.asyncio
+    async def test_long_range_streams_without_products(self):
+        """Длинный период идёт через курсор; top_products=0 не трогает историю"""
+        conn = FakeCursorConnection([{"daily_calories": 0, "date": None, "total": None, "items_count": None}], [])
+        db = Database()
+        db._pool = _pool_for(conn)
+
+        summary = await db.get_range_summary(1, self.DAY, self.DAY + datetime.timedelta(days=365), top_products=0)
+
+        assert summary.daily_limit is None
+        assert summary.days == []
+        assert len(conn.cursors) == 1 and not conn.fetched
+
+
+class TestStreamHistory:
+    """Тесты на потоковое чтение истории"""
+
+    DAY = datetime.date(2026, 3, 1)
+
+    @pytest.mark.asyncio
+    async def test_stream_history_fetches_in_batches(self):
+        """История читается из курсора порциями, пока порция полная"""
+        rows = [{"date": self.DAY, "order_id": i, "product_name": "яблоко", "calories": 52} for i in range(1, 4)]
+        cursor = MagicMock(fetch=AsyncMock(side_effect=[rows[:2], rows[2:]]))
+        conn = FakeCursorConnection([], [])
+        conn.cursor = AsyncMock(return_value=cursor)
+        db = Database()
+        db._pool = _pool_for(conn)
+
+        streamed = [row async for row in db.stream_history(1, batch_size=2)]
+
+        assert streamed == [(self.DAY, i, "яблоко", 52.0) for i in range(1, 4)]
+        assert cursor.fetch.await_count == 2
+
+    @pytest.mark.asyncio
+    async def test_stream_history_open_end(self):
+        """Без end верхняя граница не берётся из часов процесса"""
+        cursor = MagicMock(fetch=AsyncMock(return_value=[]))
+        conn = FakeCursorConnection([], [])
+        conn.cursor = AsyncMock(return_value=cursor)
+        db = Database()
+        db._pool = _pool_for(conn)
+
+        assert [row async for row in db.stream_history(1)] == []
+
+        query, _, start, end = conn.cursor.await_args.args
+        assert start == datetime.date.min and end is None
+        assert "COALESCE($3::date, 'infinity')" in query
+
+
+class TestReadReplicas:
+    """Тесты на маршрутизацию чтений по репликам"""
+
+    def _db(self, replicas=2):
+        db = Database(replica_dsns=[], read_your_writes_window=5)
+        db._pool = "primary"
+        db._replicas = [f"replica{i}" for i in range(replicas)]
+        db.now = 100.0
+        db._clock = lambda: db.now
+        return db
+
+    def test_replica_dsns_from_env(self, monkeypatch):
+        """Список реплик берётся из DB_REPLICA_DSNS через запятую"""
+        monkeypatch.setenv("DB_REPLICA_DSNS", "postgres://r1/db, postgres://r2/db,")
+        assert Database().replica_dsns == ["postgres://r1/db", "postgres://r2/db"]
+
+    def test_reads_round_robin(self):
+        """Без недавних записей чтения идут на реплики по кругу"""
+        db = self._db()
+        assert [db._read_pool(1) for _ in range(4)] == ["replica0", "replica1", "replica0", "replica1"]
+
+    def test_no_replicas_reads_primary(self):
+        """Без реплик всё читается с primary, записи не запоминаются"""
+        db = self._db(replicas=0)
+        db._mark_write(1)
+        assert db._read_pool(1) == "primary"
+        assert not db._recent_writes
+
+    def test_read_your_writes_window(self):
+        """Писавший пользователь читает с primary, пока не истечёт окно; остальные — с реплик"""
+        db = self._db()
+        db._mark_write(1)
+
+        db.now += 4
+        assert db._read_pool(1) == "primary"
+        assert db._read_pool(2) == "replica0"
+
+        db.now += 2
+        assert db._read_pool(1) == "replica1"
+
+    def test_expired_writes_pruned(self):
+        """Истёкшие отметки о записи удаляются при следующих записях"""
+        db = self._db()
+        db._mark_write(1)
+        db.now += 10
+        db._mark_write(2)
+        assert list(db._recent_writes) == [2]
+
+    @pytest.mark.asyncio
+    async def test_write_routes_following_read_to_primary(self):
+        """После set_daily_calories лимит читается с primary"""
+        conn = MagicMock(fetchrow=AsyncMock(return_value=None), execute=AsyncMock(return_value="UPDATE 1"))
+        primary, replica = _pool_for(conn), _pool_for(conn)
+        db = Database(replica_dsns=[])
+        db._pool = primary
+        db._replicas = [replica]
+
+        await db.get_daily_limit(1)
+        assert replica.acquire.call_count == 1
+
+        await db.set_daily_calories(1, 2000)
+        await db.get_daily_limit(1)
+        assert replica.acquire.call_count == 1
+        assert primary.acquire.call_count == 2
+
+    @pytest.mark.asyncio
+    async def test_failed_replica_falls_back_and_leaves_rotation(self):
+        """Ошибка соединения с репликой: чтение уходит на primary, реплика временно исключена"""
+        primary_conn = MagicMock(fetchrow=AsyncMock(return_value={"daily_calories": 1500}))
+        broken_conn = MagicMock(fetchrow=AsyncMock(side_effect=ConnectionResetError()))
+        db = Database(replica_dsns=[])
+        db._pool = _pool_for(primary_conn)
+        db._replicas = [_pool_for(OSError("refused")), _pool_for(broken_conn)]
+        db.now = 100.0
+        db._clock = lambda: db.now
+
+        # Первая реплика не отдаёт соединение, вторая падает посреди запроса
+        assert await db.get_daily_limit(1) == 1500
+        assert await db.get_daily_limit(2) == 1500
+        assert db._read_pool(3) is db._pool
+        assert sorted(db._replica_down) == [0, 1]
+
+        db.now += 31
+        assert db._read_pool(3) is db._replicas[0]
+
+    @pytest.mark.asyncio
+    async def test_day_snapshot_read_from_replica(self):
+        """Известный реплике пользователь читает день с неё; неизвестный — создаётся на primary"""
+        day = {"daily_calories": 2000, "is_new": False, "total": 300, "items_count": 1,
+               "names": ["яблоко"], "calories": [300]}
+        replica_conn = MagicMock(fetchrow=AsyncMock(side_effect=[day, None]))
+        primary_conn = MagicMock(fetchrow=AsyncMock(return_value={**day, "is_new": True}))
+        db = Database(replica_dsns=[])
+        db._pool = _pool_for(primary_conn)
+        db._replicas = [_pool_for(replica_conn)]
+
+        snapshot = await db.get_user_day_snapshot(1)
+        assert snapshot.total == 300.0 and not snapshot.is_new_user
+        assert primary_conn.fetchrow.await_count == 0
+
+        snapshot = await db.get_user_day_snapshot(2)
+        assert snapshot.is_new_user
+        assert primary_conn.fetchrow.await_count == 1
+        # Созданный пользователь дальше читает с primary
+        assert db._read_pool(2) is db._pool
+
+    @pytest.mark.asyncio
+    async def test_ensure_user_marks_write(self):
+        """Только что созданный пользователь не читает с отстающей реплики"""
+        conn = MagicMock(fetchval=AsyncMock(return_value=0))
+        db = Database(replica_dsns=[])
+        db._pool = _pool_for(conn)
+        db._replicas = [_pool_for(conn)]
+
+        await db.ensure_user(1)
+
+        assert db._read_pool(1) is db._pool
+
+
+class TestUserDaySnapshot:
+    """Тесты на снимок дня пользователя"""
+
+    @pytest.mark.asyncio
+    async def test_concurrent_user_insert_reread(self):
+        """Пустой результат из-за параллельного создания пользователя перечитывается"""
+        row = {"daily_calories": 0, "is_new": False, "total": None, "items_count": None,
+               "names": None, "calories": None}
+        conn = MagicMock(fetchrow=AsyncMock(side_effect=[None, row]))
+        db = Database(replica_dsns=[])
+        db._pool = _pool_for(conn)
+
+        snapshot = await db.get_user_day_snapshot(1)
+
+        assert snapshot.items_count == 0 and snapshot.daily_limit is None
+        assert conn.fetchrow.await_count == 2
+
+
+class TestHistoryPartitions:
+    """Тесты на продление партиций истории"""
+
+    @pytest.mark.asyncio
+    async def test_ensure_partitions_months_ahead(self):
+        """Горизонт партиций передаётся параметром запроса"""
+        conn = MagicMock(execute=AsyncMock())
+        db = Database(replica_dsns=[])
+        db._pool = _pool_for(conn)
+
+        await db.ensure_history_partitions(3)
+
+        query, months = conn.execute.await_args.args
+        assert "ensure_history_partition" in query and months == 3
+
+    @pytest.mark.asyncio
+    async def test_maintenance_survives_errors(self, monkeypatch):
+        """Ошибка проверки не останавливает периодическое продление"""
+        sleeps = 0
+
+        async def fake_sleep(_):
+            nonlocal sleeps
+            sleeps += 1
+            if sleeps > 2:
+                raise asyncio.CancelledError
+
+        monkeypatch.setattr("core.db.asyncio.sleep", fake_sleep)
+        conn = MagicMock(execute=AsyncMock(side_effect=[OSError("down"), None]))
+        db = Database(replica_dsns=[])
+        db._pool = _pool_for(conn)
+
+        with pytest.raises(asyncio.CancelledError):
+            await db._maintain_partitions()
+
+        assert conn.execute.await_count == 2
+
+
+class TestAddCalories:
+    """Тесты на запись калорий за сегодня"""
+
+    @pytest.mark.asyncio
+    async def test_single_entry_one_statement(self):
+        """Одна запись — один запрос, строка ответа превращается в кортеж"""
+        row = {"order_id": 3, "product_name": "яблоко", "calories": 78, "daily_total": 428}
+        conn = MagicMock(fetchrow=AsyncMock(return_value=row))
+        db = Database(replica_dsns=[])
+        db._pool = _pool_for(conn)
+
+        result = await db.add_calories_for_today(1, 78.0, "яблоко")
+
+        assert result == (3, "яблоко", 78.0, 428.0)
+        assert isinstance(result[2], float) and isinstance(result[3], float)
+        conn.fetchrow.assert_awaited_once()
+        query, *params = conn.fetchrow.await_args.args
+        assert "daily_totals" in query and params == [1, 78.0, "яблоко"]
+
+    @pytest.mark.asyncio
+    async def test_batch_one_statement(self):
+        """Пачка записей уходит одним запросом параллельными массивами"""
+        conn = MagicMock(fetchval=AsyncMock(return_value=428))
+        db = Database(replica_dsns=[])
+        db._pool = _pool_for(conn)
+
+        total = await db.add_calories_batch(1, [("овсянка", 350.0), ("яблоко", 78.0)])
+
+        assert total == 428.0 and isinstance(total, float)
+        conn.fetchval.assert_awaited_once()
+        _, *params = conn.fetchval.await_args.args
+        assert params == [1, ["овсянка", "яблоко"], [350.0, 78.0]]
+
+    @pytest.mark.asyncio
+    async def test_empty_batch_skips_pool(self):
+        """Пустая пачка не берёт соединение"""
+        db = Database(replica_dsns=[])
+        db._pool = MagicMock()
+
+        assert await db.add_calories_batch(1, []) == 0.0
+        assert not db._pool.acquire.called
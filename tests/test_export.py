@@ -0,0 +1,46 @@
+import datetime
+import io
+import pytest
+
+from core.export import ExportError, export_history, write_csv
+
+
+async def history(count):
+    for i in range(count):
+        yield datetime.date(2026, 3, 1 + i % 28), i + 1, f"продукт {i}", 100.5 + i
+
+
+class TestExport:
+    """Тесты на выгрузку истории"""
+
+    @pytest.mark.asyncio
+    async def test_csv_streamed(self):
+        """CSV пишется построчно с заголовком, кириллица в utf-8-sig"""
+        buffer = io.BytesIO()
+
+        count = await write_csv(history(3), buffer)
+
+        lines = buffer.getvalue().decode("utf-8-sig").splitlines()
+        assert count == 3
+        assert lines[0] == "date,order_id,product_name,calories"
+        assert lines[1] == "2026-03-01,1,продукт 0,100.5"
+
+    @pytest.mark.asyncio
+    async def test_parquet_row_groups(self):
+        """Parquet пишется группами строк и читается обратно целиком"""
+        pq = pytest.importorskip("pyarrow.parquet")
+        buffer = io.BytesIO()
+
+        count = await export_history(history(25), buffer, "parquet")
+
+        buffer.seek(0)
+        table = pq.read_table(buffer)
+        assert count == 25
+        assert table.num_rows == 25
+        assert table.column("product_name")[0].as_py() == "продукт 0"
+
+    @pytest.mark.asyncio
+    async def test_unknown_format(self):
+        """Неизвестный формат — ExportError"""
+        with pytest.raises(ExportError):
+            await export_history(history(1), io.BytesIO(), "xlsx")
@@ -0,0 +1,19 @@
+import pytest
+
+from benchmarks.bench_handlers import BUDGETS, SCENARIOS, Budget, check_budgets, run_benchmarks
+
+
+class TestHandlerBudgets:
+    """Тесты на число обращений к БД в обработчиках"""
+
+    @pytest.mark.asyncio
+    async def test_db_round_trips_within_budget(self):
+        """Ни один обработчик не ходит в БД чаще, чем заложено в бюджет"""
+        results = await run_benchmarks(iterations=20)
+        # Задержки на CI нестабильны — проверяем только round trip'ы
+        budgets = {name: Budget(budget.db_calls, float("inf")) for name, budget in BUDGETS.items()}
+        assert check_budgets(results, budgets) == []
+
+    def test_every_scenario_has_budget(self):
+        """У каждого сценария бенчмарка есть бюджет"""
+        assert {scenario.name for scenario in SCENARIOS} == set(BUDGETS)
@@ -0,0 +1,109 @@
+import datetime
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+
+from core.history_writer import BufferedHistoryWriter
+
+
+@pytest.fixture
+def pool():
+    """Фейковый пул: запоминает пачки, ушедшие в COPY"""
+    conn = MagicMock()
+    conn.execute = AsyncMock()
+    conn.batches = []
+
+    async def copy_records_to_table(table, records, columns):
+        conn.batches.append(list(records))
+
+    conn.copy_records_to_table = copy_records_to_table
+    conn.transaction.return_value.__aenter__ = AsyncMock()
+    conn.transaction.return_value.__aexit__ = AsyncMock(return_value=False)
+
+    pool = MagicMock()
+    pool.acquire.return_value.__aenter__ = AsyncMock(return_value=conn)
+    pool.acquire.return_value.__aexit__ = AsyncMock(return_value=False)
+    pool.conn = conn
+    return pool
+
+
+class TestBufferedHistoryWriter:
+    """Тесты на отложенную запись истории"""
+
+    @pytest.mark.asyncio
+    async def test_entries_flushed_in_one_batch(self, pool):
+        """Параллельные записи уходят одной пачкой"""
+        writer = BufferedHistoryWriter(pool, flush_interval=0.01)
+        writer.start()
+
+        await asyncio.gather(*(writer.add(1, 100.0, f"продукт {i}") for i in range(10)))
+
+        assert len(pool.conn.batches) == 1
+        assert [record[0] for record in pool.conn.batches[0]] == list(range(10))
+        await writer.close()
+
+    @pytest.mark.asyncio
+    async def test_batch_size_limit(self, pool):
+        """Пачка не превышает batch_size"""
+        writer = BufferedHistoryWriter(pool, flush_interval=0.01, batch_size=4)
+        writer.start()
+
+        await asyncio.gather(*(writer.add(1, 100.0, "яблоко") for _ in range(10)))
+
+        assert [len(batch) for batch in pool.conn.batches] == [4, 4, 2]
+        await writer.close()
+
+    @pytest.mark.asyncio
+    async def test_close_flushes_enqueued(self, pool):
+        """close() дописывает записи, подтверждённые при постановке в очередь"""
+        writer = BufferedHistoryWriter(pool, flush_interval=10, wait_for_flush=False)
+        writer.start()
+        await writer.add(1, 100.0, "яблоко")
+        await writer.add(2, 50.0, "банан")
+
+        await writer.close()
+
+        assert writer.rows_written == 2
+        with pytest.raises(RuntimeError):
+            await writer.add(1, 10.0, "чай")
+
+    @pytest.mark.asyncio
+    async def test_failed_flush_retried(self, pool):
+        """Сброс, упавший один раз, повторяется с той же пачкой"""
+        pool.conn.execute = AsyncMock(side_effect=[ConnectionResetError(), None, None])
+        writer = BufferedHistoryWriter(pool, flush_interval=0.01, retry_delays=(0,))
+        writer.start()
+
+        await writer.add(1, 100.0, "яблоко")
+
+        assert writer.rows_written == 1
+        assert writer.failed_flushes == 1
+        await writer.close()
+
+    @pytest.mark.asyncio
+    async def test_acknowledged_rows_kept_after_failed_retries(self, pool):
+        """Подтверждённые при постановке записи не теряются, если все повторы не прошли"""
+        pool.conn.execute = AsyncMock(side_effect=ConnectionResetError())
+        writer = BufferedHistoryWriter(pool, flush_interval=0.01, wait_for_flush=False, retry_delays=(0,))
+        writer.start()
+        await writer.add(1, 100.0, "яблоко")
+        while writer.failed_flushes < 2:
+            await asyncio.sleep(0.01)
+        assert writer.stats()["carried"] == 1
+
+        pool.conn.execute = AsyncMock()
+        await writer.close()
+
+        assert writer.rows_written == 1
+        assert writer.stats()["carried"] == 0
+
+    @pytest.mark.asyncio
+    async def test_entry_stamped_with_add_time(self, pool):
+        """Дату считает БД из момента add(): в буфер уходит время с часовым поясом"""
+        writer = BufferedHistoryWriter(pool, flush_interval=0.01)
+        writer.start()
+        await writer.add(1, 100.0, "яблоко")
+        await writer.close()
+
+        added_at = pool.conn.batches[0][0][2]
+        assert isinstance(added_at, datetime.datetime) and added_at.tzinfo is not None
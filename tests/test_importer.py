@@ -0,0 +1,51 @@
+import io
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+
+from core.importer import ProductImporter, parse_calories, read_products
+
+
+@pytest.fixture
+def conn():
+    """Соединение, которое запоминает пачки COPY"""
+    conn = MagicMock()
+    conn.transaction.return_value = MagicMock(__aenter__=AsyncMock(), __aexit__=AsyncMock(return_value=False))
+    conn.execute = AsyncMock()
+    conn.copy_records_to_table = AsyncMock()
+    conn.fetchrow = AsyncMock(return_value={"distinct_rows": 2, "inserted": 1, "updated": 0})
+    return conn
+
+
+class TestImporter:
+    """Тесты на потоковый импорт каталога"""
+
+    def test_parse_calories(self):
+        """Калорийность округляется, пустые и отрицательные значения отбрасываются"""
+        assert parse_calories("52.6") == 53
+        assert parse_calories("") is None
+        assert parse_calories("abc") is None
+        assert parse_calories(-1) is None
+
+    def test_read_csv_and_jsonl(self):
+        """CSV и JSON Lines дают одинаковые строки, плохие строки — None"""
+        csv_input = io.StringIO("product_name,calories_per_hundred\n  Яблоко  зелёное ,52\n,10\nбанан,x\n")
+        jsonl_input = io.StringIO('{"product_name": "Яблоко зелёное", "calories_per_hundred": 52}\n\n'
+                                  '{"product_name": "", "calories_per_hundred": 10}\n')
+
+        assert list(read_products(csv_input)) == [("Яблоко зелёное", 52), None, None]
+        assert list(read_products(jsonl_input, "jsonl")) == [("Яблоко зелёное", 52), None]
+
+    @pytest.mark.asyncio
+    async def test_rows_copied_in_batches(self, conn):
+        """Каждая пачка — один COPY и один merge; пропуски считаются отдельно"""
+        rows = [("яблоко", 52), None, ("банан", 89), ("груша", 57)]
+
+        stats = await ProductImporter(conn, batch_size=2).import_rows(rows)
+
+        assert conn.copy_records_to_table.await_count == 2
+        first_batch = conn.copy_records_to_table.await_args_list[0].kwargs["records"]
+        assert [name for _, name, _ in first_batch] == ["яблоко", "банан"]
+        assert stats.read == 4
+        assert stats.skipped == 1
+        assert stats.inserted == 2
+        assert stats.unchanged == 2
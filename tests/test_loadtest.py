@@ -0,0 +1,30 @@
+import importlib
+import os
+
+import pytest
+
+import benchmarks.loadtest
+from benchmarks.loadtest import run
+
+
+class TestLoadTest:
+    """Тесты на нагрузочный тест с заменителем Bot API"""
+
+    @pytest.mark.asyncio
+    async def test_every_update_answered(self):
+        """Каждое сообщение виртуального пользователя получает ответ бота"""
+        generator = await run(users=5, sessions=2, concurrency=5, concurrent_updates=4,
+                              think_time=0, use_postgres=False)
+
+        assert generator.errors == 0
+        assert sum(len(values) for values in generator.latencies.values()) >= 10
+
+    def test_import_keeps_environment(self, monkeypatch):
+        """Импорт модуля не подменяет BOT_TOKEN и USER_RATE_LIMIT для остальных тестов"""
+        monkeypatch.delenv("BOT_TOKEN", raising=False)
+        monkeypatch.delenv("USER_RATE_LIMIT", raising=False)
+
+        importlib.reload(benchmarks.loadtest)
+
+        assert "BOT_TOKEN" not in os.environ
+        assert "USER_RATE_LIMIT" not in os.environ
@@ -0,0 +1,60 @@
+import asyncio
+import pytest
+
+from bot.locks import UserLockRegistry
+
+
+class TestUserLockRegistry:
+    """Тесты на реестр блокировок пользователей"""
+
+    @pytest.mark.asyncio
+    async def test_idle_lock_is_dropped(self):
+        """После выхода блокировка удаляется из реестра"""
+        registry = UserLockRegistry()
+        async with registry(1):
+            assert len(registry) == 1
+        assert len(registry) == 0
+
+    @pytest.mark.asyncio
+    async def test_same_user_serialized(self):
+        """Обновления одного пользователя выполняются по очереди"""
+        registry = UserLockRegistry()
+        order = []
+
+        async def worker(name):
+            async with registry(1):
+                order.append(f"{name}-start")
+                await asyncio.sleep(0.01)
+                order.append(f"{name}-end")
+
+        await asyncio.gather(worker("a"), worker("b"), worker("c"))
+
+        assert order == ["a-start", "a-end", "b-start", "b-end", "c-start", "c-end"]
+        stats = registry.stats()
+        assert stats["contended"] == 2
+        assert stats["max_queue_depth"] == 2
+        assert stats["max_wait"] > 0
+        assert len(registry) == 0
+
+    @pytest.mark.asyncio
+    async def test_different_users_not_blocked(self):
+        """Разные пользователи не ждут друг друга"""
+        registry = UserLockRegistry()
+        async with registry(1):
+            async with registry(2):
+                assert registry.queue_depth(1) == 1
+                assert registry.queue_depth(2) == 1
+        assert registry.stats()["contended"] == 0
+
+    @pytest.mark.asyncio
+    async def test_cancelled_waiter_released(self):
+        """Отменённое ожидание не оставляет запись в реестре"""
+        registry = UserLockRegistry()
+        async with registry(1):
+            waiter = asyncio.create_task(registry(1).__aenter__())
+            await asyncio.sleep(0)
+            waiter.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await waiter
+            assert registry.queue_depth(1) == 1
+        assert len(registry) == 0
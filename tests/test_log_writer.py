@@ -0,0 +1,87 @@
+import io
+import json
+import logging
+import queue
+import pytest
+
+from log.log_writer import LazyQueueHandler, bind_handler_context, log, setup_logging, shutdown_logging
+
+
+class FakeUser:
+    id = 42
+
+
+class FakeUpdate:
+    effective_user = FakeUser()
+
+
+class Handlers:
+    async def start(self, update, context):
+        logging.getLogger("bot").info("start pressed by %s", "user")
+
+
+@pytest.fixture
+def output():
+    stream = io.StringIO()
+    setup_logging(json_format=True, level="DEBUG", sample_rates={logging.DEBUG: 0.0}, stream=stream)
+    yield stream
+    setup_logging()
+
+
+def _records(stream):
+    shutdown_logging()
+    return [json.loads(line) for line in stream.getvalue().splitlines()]
+
+
+class TestLogWriter:
+    """Тесты на конвейер логирования"""
+
+    @pytest.mark.asyncio
+    async def test_records_carry_handler_context(self, output):
+        """Записи внутри обработчика несут user_id и имя обработчика"""
+        handlers = Handlers()
+        bind_handler_context(handlers)
+
+        await handlers.start(FakeUpdate(), None)
+        logging.getLogger("bot").info("outside")
+
+        records = _records(output)
+        assert records[0]["message"] == "start pressed by user"
+        assert records[0]["user_id"] == 42
+        assert records[0]["handler"] == "start"
+        assert "user_id" not in records[1]
+
+    def test_log_levels_and_sampling(self, output):
+        """log() по имени уровня работает, DEBUG с долей 0 отбрасывается"""
+        log('debug', "dropped")
+        log('info', "kept %d", 1)
+        log('error', "kept too")
+        log('unknown', "ignored")
+
+        assert [r["message"] for r in _records(output)] == ["kept 1", "kept too"]
+
+    def test_formatting_is_lazy(self):
+        """В очередь уходит неотформатированная запись: msg % args делает слушатель"""
+        records = queue.SimpleQueue()
+        handler = LazyQueueHandler(records)
+        record = logging.LogRecord("bot", logging.INFO, __file__, 1, "user %s", (42,), None)
+
+        handler.emit(record)
+
+        queued = records.get_nowait()
+        assert queued.msg == "user %s"
+        assert queued.args == (42,)
+
+    def test_mutable_args_snapshotted(self):
+        """Изменяемый аргумент форматируется сразу: поздняя правка объекта не попадает в лог"""
+        records = queue.SimpleQueue()
+        handler = LazyQueueHandler(records)
+        state = {"step": 1}
+        record = logging.LogRecord("bot", logging.INFO, __file__, 1, "state %s", (state,), None)
+
+        handler.emit(record)
+        state["step"] = 2
+
+        queued = records.get_nowait()
+        assert queued.getMessage() == "state {'step': 1}"
+        assert queued.args is None
@@ -0,0 +1,23 @@
+import pytest
+
+from bot.main import webhook_options
+
+
+class TestWebhookOptions:
+    """Тесты на настройку webhook из окружения"""
+
+    def test_webhook_url_required(self, monkeypatch):
+        """Без WEBHOOK_URL запуск падает, а не регистрирует недоступный адрес"""
+        monkeypatch.delenv("WEBHOOK_URL", raising=False)
+        with pytest.raises(ValueError, match="WEBHOOK_URL"):
+            webhook_options()
+
+    def test_options_from_env(self, monkeypatch):
+        """Адрес и порт берутся из окружения"""
+        monkeypatch.setenv("WEBHOOK_URL", "https://bot.example.com/telegram")
+        monkeypatch.setenv("WEBHOOK_PORT", "9000")
+
+        options = webhook_options()
+
+        assert options["webhook_url"] == "https://bot.example.com/telegram"
+        assert options["port"] == 9000
@@ -0,0 +1,119 @@
+import asyncio
+import pytest
+from unittest.mock import MagicMock
+
+from core.metrics import (
+    Histogram, InstrumentedPool, MetricsRegistry, MetricsServer, instrument, instrument_handlers
+)
+
+
+class Service:
+    async def ok(self):
+        return 1
+
+    async def fail(self):
+        raise ValueError("boom")
+
+    def sync(self, value):
+        return value * 2
+
+    async def _private(self):
+        return None
+
+
+class FakeAcquire:
+    async def __aenter__(self):
+        await asyncio.sleep(0.01)
+        return "conn"
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+
+class FakePool:
+    def acquire(self):
+        return FakeAcquire()
+
+    def get_size(self):
+        return 3
+
+
+class TestMetrics:
+    """Тесты на метрики и их выдачу"""
+
+    def test_histogram_buckets_cumulative(self):
+        """Корзины в выдаче накопительные, +Inf равна количеству"""
+        histogram = Histogram(buckets=(0.1, 1.0))
+        for value in (0.05, 0.5, 5.0):
+            histogram.observe(value)
+
+        lines = histogram.render("latency", (("handler", "start"),))
+
+        assert 'latency_bucket{handler="start",le="0.1"} 1' in lines
+        assert 'latency_bucket{handler="start",le="1.0"} 2' in lines
+        assert 'latency_bucket{handler="start",le="+Inf"} 3' in lines
+        assert 'latency_count{handler="start"} 3' in lines
+
+    @pytest.mark.asyncio
+    async def test_instrument_counts_calls_and_errors(self):
+        """Обёрнутые методы пишут задержку и ошибки, приватные не трогаются"""
+        registry = MetricsRegistry()
+        service = Service()
+
+        wrapped = instrument(service, "svc", "method", registry)
+        await service.ok()
+        assert service.sync(2) == 4
+        with pytest.raises(ValueError):
+            await service.fail()
+
+        assert sorted(wrapped) == ["fail", "ok", "sync"]
+        assert registry.histogram("svc_duration_seconds", "", method="ok").count == 1
+        assert registry.counter_value("svc_errors_total", method="fail") == 1
+        assert registry.counter_value("svc_errors_total", method="ok") == 0
+
+    @pytest.mark.asyncio
+    async def test_pool_wait_measured(self):
+        """Прокси пула замеряет ожидание соединения и отдаёт остальное как есть"""
+        histogram = Histogram()
+        pool = InstrumentedPool(FakePool(), histogram)
+
+        async with pool.acquire() as conn:
+            assert conn == "conn"
+
+        assert histogram.count == 1
+        assert histogram.sum >= 0.005
+        assert pool.get_size() == 3
+
+    def test_lock_stats_source_overridable(self):
+        """Статистика блокировок берётся из переданного источника (блокировки процессора)"""
+        registry = MetricsRegistry()
+        handlers = Service()
+        handlers.lock_stats = lambda: {}
+        handlers.profiles = MagicMock(stats=MagicMock(return_value={"hits": 0, "misses": 0}))
+        processor_stats = {"total_wait": 1.5, "contended": 3, "max_wait": 1.0, "acquisitions": 9,
+                           "active_users": 2}
+
+        instrument_handlers(handlers, registry, lock_stats=lambda: processor_stats)
+
+        assert "calories_lock_waits_total 3" in registry.render()
+
+    @pytest.mark.asyncio
+    async def test_endpoint_serves_text_format(self):
+        """/metrics отдаёт текстовый формат Prometheus вместе с коллекторами"""
+        registry = MetricsRegistry()
+        registry.inc("calories_test_total", "Test counter")
+        registry.add_collector(lambda: [("calories_gauge", "gauge", "Test gauge", 7)])
+        server = MetricsServer(registry, port=0)
+        await server.start()
+        try:
+            reader, writer = await asyncio.open_connection("127.0.0.1", server.port)
+            writer.write(b"GET /metrics HTTP/1.1\r\nHost: localhost\r\n\r\n")
+            response = (await reader.read()).decode()
+            writer.close()
+        finally:
+            await server.stop()
+
+        assert response.startswith("HTTP/1.1 200 OK")
+        assert "# TYPE calories_test_total counter" in response
+        assert "calories_test_total 1" in response
+        assert "calories_gauge 7" in response
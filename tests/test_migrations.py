@@ -0,0 +1,41 @@
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+
+from core.migrations import Migration, MigrationRunner, load_migrations, schema_fingerprint
+
+
+class TestMigrations:
+    """Тесты на версионированные миграции"""
+
+    def test_load_migrations_ordered(self):
+        """Миграции читаются по возрастанию версий"""
+        versions = [m.version for m in load_migrations()]
+        assert versions == sorted(versions)
+        assert versions[0] == 1
+
+    def test_versions_contiguous(self):
+        """Версии миграций идут без пропусков"""
+        versions = [m.version for m in load_migrations()]
+        assert versions == list(range(1, len(versions) + 1))
+
+    def test_fingerprint_changes_with_checksum(self):
+        """Изменение файла меняет отпечаток схемы"""
+        first = schema_fingerprint([(1, Migration(1, "initial", "SELECT 1").checksum)])
+        second = schema_fingerprint([(1, Migration(1, "initial", "SELECT 2").checksum)])
+        assert first != second
+
+    @pytest.mark.asyncio
+    async def test_run_skips_when_fingerprint_matches(self):
+        """Совпавший отпечаток — ни одной DDL-команды"""
+        migration = Migration(1, "initial", "SELECT 1")
+        conn = MagicMock()
+        conn.fetch = AsyncMock(return_value=[{"version": 1, "checksum": migration.checksum}])
+        conn.execute = AsyncMock()
+        pool = MagicMock()
+        pool.acquire.return_value.__aenter__ = AsyncMock(return_value=conn)
+        pool.acquire.return_value.__aexit__ = AsyncMock(return_value=False)
+
+        applied = await MigrationRunner(pool, [migration]).run()
+
+        assert applied == 0
+        assert not conn.execute.called
@@ -0,0 +1,69 @@
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+
+from bot.persistence import PostgresPersistence
+from bot.states import DialogState
+
+
+@pytest.fixture
+def db():
+    """Фейковая БД с пустым хранилищем"""
+    db = MagicMock()
+    db.connect = AsyncMock()
+    db.load_conversations = AsyncMock(return_value={"[1, 1]": 2})
+    db.load_user_data = AsyncMock(return_value={1: {"product_name": "яблоко"}})
+    db.save_conversations = AsyncMock()
+    db.save_user_data = AsyncMock()
+    return db
+
+
+class TestPostgresPersistence:
+    """Тесты на хранение диалогов в БД"""
+
+    @pytest.mark.asyncio
+    async def test_load(self, db):
+        """Ключи диалогов восстанавливаются в кортежи"""
+        persistence = PostgresPersistence(db)
+        assert await persistence.get_conversations("main_conversation") == {(1, 1): 2}
+        assert await persistence.get_user_data() == {1: {"product_name": "яблоко"}}
+
+    @pytest.mark.asyncio
+    async def test_updates_coalesced_into_one_batch(self, db):
+        """Изменения одного прохода пишутся одной пачкой"""
+        persistence = PostgresPersistence(db)
+        await persistence.update_conversation("main_conversation", (1, 1), DialogState.SET_PRODUCT_NAME)
+        await persistence.update_conversation("main_conversation", (1, 1), DialogState.SET_PRODUCT_WEIGHT)
+        await persistence.update_conversation("main_conversation", (2, 2), DialogState.SET_CALORIES)
+        await persistence.update_conversation("main_conversation", (2, 2), None)
+        await persistence.update_user_data(1, {"product_name": "банан"})
+
+        await persistence.flush()
+
+        db.save_conversations.assert_awaited_once_with(
+            "main_conversation", {"[1, 1]": int(DialogState.SET_PRODUCT_WEIGHT), "[2, 2]": None}
+        )
+        db.save_user_data.assert_awaited_once_with({1: {"product_name": "банан"}})
+
+    @pytest.mark.asyncio
+    async def test_unchanged_data_not_written(self, db):
+        """Неизменившиеся данные не помечаются грязными"""
+        persistence = PostgresPersistence(db)
+        await persistence.get_user_data()
+        await persistence.update_user_data(1, {"product_name": "яблоко"})
+
+        await persistence.flush()
+
+        assert not db.save_user_data.called
+
+    @pytest.mark.asyncio
+    async def test_failed_flush_retried(self, db):
+        """После ошибки записи изменения не теряются"""
+        db.save_user_data.side_effect = [RuntimeError("db is down"), None]
+        persistence = PostgresPersistence(db)
+        await persistence.update_user_data(1, {"product_name": "банан"})
+        await asyncio.sleep(0)
+
+        await persistence.flush()
+
+        assert db.save_user_data.await_count == 2
@@ -0,0 +1,81 @@
+import pytest
+from telegram.ext import ConversationHandler
+
+from benchmarks.bench_handlers import FakeContext, FakeUpdate
+from benchmarks.fake_db import InMemoryDatabase
+from bot.handlers import BotHandlers
+from bot.profile_cache import MISSING, UserProfileCache
+from core.calculator import CalorieCalculator
+
+
+class FakeClock:
+    """Управляемые часы для проверки TTL"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestUserProfileCache:
+    """Тесты на кэш профилей пользователей"""
+
+    def test_miss(self):
+        """Неизвестный пользователь"""
+        cache = UserProfileCache()
+        assert cache.get(1) is MISSING
+        assert cache.misses == 1
+
+    def test_known_user_without_limit(self):
+        """Известный пользователь без лимита отличается от промаха"""
+        cache = UserProfileCache()
+        cache.set(1, None)
+        assert cache.get(1) is None
+        assert cache.hits == 1
+
+    def test_ttl_expiry(self):
+        """Профиль устаревает по TTL"""
+        clock = FakeClock()
+        cache = UserProfileCache(ttl=10, clock=clock)
+        cache.set(1, 2000)
+        clock.now = 5
+        assert cache.get(1) == 2000
+        clock.now = 11
+        assert cache.get(1) is MISSING
+        assert len(cache) == 0
+
+    def test_lru_eviction(self):
+        """Вытесняется давно не использованный профиль"""
+        cache = UserProfileCache(max_size=2)
+        cache.set(1, 1000)
+        cache.set(2, 2000)
+        cache.get(1)
+        cache.set(3, 3000)
+        assert cache.get(2) is MISSING
+        assert cache.get(1) == 1000
+        assert cache.get(3) == 3000
+
+
+class TestProfileCacheConsistency:
+    """Тесты на согласованность кэша профилей с БД в обработчиках"""
+
+    @pytest.mark.asyncio
+    async def test_statistics_does_not_cache_unknown_user(self):
+        """Статистика не создаёт пользователя и не кладёт его в кэш"""
+        handlers = BotHandlers(InMemoryDatabase(), CalorieCalculator())
+        await handlers.handle_statistics(FakeUpdate(1, "📈 Статистика"), FakeContext())
+        assert handlers.profiles.get(1) is MISSING
+
+    @pytest.mark.asyncio
+    async def test_set_calories_recovers_from_stale_cache(self):
+        """Если кэш ошибочно знает пользователя, лимит всё равно сохраняется в БД"""
+        db = InMemoryDatabase()
+        handlers = BotHandlers(db, CalorieCalculator())
+        handlers.profiles.set(1, None)
+
+        state = await handlers.set_calories(FakeUpdate(1, "2000"), FakeContext())
+
+        assert state == ConversationHandler.END
+        assert await db.get_daily_limit(1) == 2000
+        assert handlers.profiles.get(1) == 2000
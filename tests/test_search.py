@@ -0,0 +1,49 @@
+import pytest
+from core.search import ProductSearchIndex, normalize_name, trigrams
+
+
+@pytest.fixture
+def index():
+    """Индекс на нескольких продуктах каталога"""
+    index = ProductSearchIndex()
+    index.add("яблоко", ["apple"])
+    index.add("хлеб ржаной", ["rye bread"])
+    index.add("хлеб пшеничный", ["wheat bread"])
+    index.add("гречка", ["buckwheat"])
+    return index
+
+
+class TestProductSearchIndex:
+    """Тесты на нечёткий поиск продуктов"""
+
+    def test_normalize_name(self):
+        """Регистр, ё и лишние пробелы"""
+        assert normalize_name("  Зелёный   Чай ") == "зеленый чай"
+
+    def test_trigrams(self):
+        """Триграммы слова с краевыми пробелами"""
+        assert trigrams("чай") == {"  ч", " ча", "чай", "ай "}
+
+    def test_exact_lemma(self, index):
+        """Множественное число находит продукт"""
+        assert index.search("Яблоки")[0] == ("яблоко", 1.0)
+
+    def test_alias(self, index):
+        """Английский синоним находит продукт"""
+        assert index.lookup("Apple") == "яблоко"
+
+    def test_typo(self, index):
+        """Опечатка даёт подсказку"""
+        results = index.search("гречко")
+        assert results[0][0] == "гречка"
+        assert results[0][1] < 1.0
+
+    def test_ranking_limit(self, index):
+        """Подсказки ранжируются и ограничиваются"""
+        results = index.search("хлеб", limit=1)
+        assert len(results) == 1
+        assert results[0][0].startswith("хлеб")
+
+    def test_unknown(self, index):
+        """Незнакомое название без подсказок"""
+        assert index.search("шоколад") == []
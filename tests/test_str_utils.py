@@ -0,0 +1,19 @@
+from core.str_utils import get_lemma_phrase, get_lemma_word, get_lemma_words
+
+
+class TestLemmatization:
+    """Тесты на лемматизацию"""
+
+    def test_lemma_word(self):
+        """Множественное число приводится к нормальной форме"""
+        assert get_lemma_word("яблоки") == "яблоко"
+
+    def test_lemma_words_cached(self):
+        """Повторы в пачке лемматизируются один раз"""
+        get_lemma_word.cache_clear()
+        assert get_lemma_words(["бананы", "бананы", "яблоки"]) == ["банан", "банан", "яблоко"]
+        assert get_lemma_word.cache_info().misses == 2
+
+    def test_lemma_phrase(self):
+        """Многословное название"""
+        assert get_lemma_phrase("ржаные хлеба") == "ржаной хлеб"
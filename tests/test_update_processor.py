@@ -0,0 +1,128 @@
+import asyncio
+import datetime
+import pytest
+from telegram import Chat, Message, Update, User
+
+from unittest.mock import AsyncMock, MagicMock
+
+from bot.admission import TOO_FREQUENT_TEXT, AdmissionController
+from bot.update_processor import PerUserUpdateProcessor, update_user_id
+
+
+def make_update(update_id: int, user_id: int, text: str = "🔥 Калории сегодня") -> Update:
+    """Текстовое сообщение от пользователя"""
+    user = User(id=user_id, first_name="test", is_bot=False)
+    message = Message(
+        message_id=update_id,
+        date=datetime.datetime.now(),
+        chat=Chat(id=user_id, type="private"),
+        from_user=user,
+        text=text
+    )
+    return Update(update_id=update_id, message=message)
+
+
+class TestPerUserUpdateProcessor:
+    """Тесты на параллельную обработку обновлений"""
+
+    def test_update_user_id(self):
+        """telegram_id берётся из автора сообщения"""
+        assert update_user_id(make_update(1, 42)) == 42
+        assert update_user_id(object()) is None
+
+    @pytest.mark.asyncio
+    async def test_same_user_in_order(self):
+        """Обновления одного пользователя не перемешиваются"""
+        processor = PerUserUpdateProcessor(8)
+        order = []
+
+        async def handle(name):
+            order.append(f"{name}-start")
+            await asyncio.sleep(0.01)
+            order.append(f"{name}-end")
+
+        await asyncio.gather(
+            processor.process_update(make_update(1, 42), handle("a")),
+            processor.process_update(make_update(2, 42), handle("b")),
+        )
+
+        assert order == ["a-start", "a-end", "b-start", "b-end"]
+
+    @pytest.mark.asyncio
+    async def test_different_users_concurrent(self):
+        """Медленный пользователь не задерживает остальных"""
+        processor = PerUserUpdateProcessor(8)
+        both_started = asyncio.Event()
+        started = []
+
+        async def handle(name):
+            started.append(name)
+            if len(started) == 2:
+                both_started.set()
+            await asyncio.wait_for(both_started.wait(), 1)
+
+        await asyncio.gather(
+            processor.process_update(make_update(1, 1), handle("a")),
+            processor.process_update(make_update(2, 2), handle("b")),
+        )
+
+        assert sorted(started) == ["a", "b"]
+
+    @pytest.mark.asyncio
+    async def test_user_queue_holds_one_slot(self):
+        """Очередь одного пользователя не занимает слоты остальных"""
+        processor = PerUserUpdateProcessor(2)
+        finished = []
+
+        async def handle(name, delay):
+            await asyncio.sleep(delay)
+            finished.append(name)
+
+        await asyncio.gather(
+            *(processor.process_update(make_update(i, 1, text=str(i)), handle(f"flood-{i}", 0.02))
+              for i in range(1, 4)),
+            processor.process_update(make_update(10, 2), handle("other", 0)),
+        )
+
+        # Со слотом, взятым до блокировки, flood-2 занял бы второй слот и other ждал бы flood-1
+        assert finished[0] == "other"
+        assert processor.locks.stats()["contended"] == 2
+
+    @pytest.mark.asyncio
+    async def test_repeated_presses_coalesced(self):
+        """Пока одно нажатие ждёт, его повторы не выполняются и не ждут блокировку"""
+        # Последовательный режим по умолчанию: очередь пользователя всё равно видна допуску
+        processor = PerUserUpdateProcessor(1, admission=AdmissionController(rate=0))
+        runs = []
+
+        async def handle(name):
+            runs.append(name)
+            await asyncio.sleep(0.01)
+
+        await asyncio.gather(*(
+            processor.process_update(make_update(i, 42), handle(i)) for i in range(1, 6)
+        ))
+
+        # Первое выполняется, второе ждёт, остальные склеены с ним
+        assert runs == [1, 2]
+        assert processor.admission.stats()["coalesced"] == 3
+        assert len(processor.locks) == 0
+
+    @pytest.mark.asyncio
+    async def test_rejected_user_notified_once(self):
+        """На первый отказ пользователь получает предупреждение, на следующие — нет"""
+        processor = PerUserUpdateProcessor(1, admission=AdmissionController(rate=1, burst=1))
+        bot = MagicMock(send_message=AsyncMock())
+        handled = []
+
+        async def handle(name):
+            handled.append(name)
+
+        for i in range(1, 4):
+            update = make_update(i, 42, text="150")
+            update.message.set_bot(bot)
+            await processor.process_update(update, handle(i))
+
+        assert handled == [1]
+        bot.send_message.assert_awaited_once()
+        assert bot.send_message.await_args.kwargs["text"] == TOO_FREQUENT_TEXT
@@ -0,0 +1,60 @@
+import pytest
+import queue
+from unittest.mock import MagicMock, patch
+
+from bot.workers import ShardSupervisor, extract_user_id, shard_for
+
+
+class TestShardRouting:
+    """Тесты на раздачу обновлений по воркерам"""
+
+    def test_extract_user_id_message(self):
+        """Автор сообщения"""
+        update = {"update_id": 1, "message": {"from": {"id": 42}, "chat": {"id": 42}}}
+        assert extract_user_id(update) == 42
+
+    def test_extract_user_id_callback(self):
+        """Автор нажатия inline-кнопки"""
+        update = {"update_id": 1, "callback_query": {"from": {"id": 7}}}
+        assert extract_user_id(update) == 7
+
+    def test_extract_user_id_channel_post(self):
+        """Обновление без автора"""
+        assert extract_user_id({"update_id": 1}) is None
+
+    def test_shard_is_stable(self):
+        """Один пользователь — всегда один воркер"""
+        assert shard_for(123456, 4) == shard_for(123456, 4)
+        assert {shard_for(uid, 4) for uid in range(100)} == {0, 1, 2, 3}
+
+    def test_dispatch_to_user_shard(self):
+        """Обновление попадает в очередь шарда пользователя"""
+        supervisor = ShardSupervisor(workers=3)
+        supervisor._queues = [MagicMock() for _ in range(3)]
+        update = {"update_id": 1, "message": {"from": {"id": 5}, "chat": {"id": 5}}}
+
+        index = supervisor.dispatch(update)
+
+        assert index == shard_for(5, 3)
+        supervisor._queues[index].put.assert_called_once_with(update)
+
+
+class TestShardSupervisorHealth:
+    """Тесты на перезапуск воркеров"""
+
+    @pytest.mark.asyncio
+    async def test_dead_worker_restarted_with_fresh_queue(self):
+        """Упавший воркер получает новую очередь с необработанными обновлениями"""
+        supervisor = ShardSupervisor(workers=1)
+        old = MagicMock()
+        old.get_nowait.side_effect = [{"update_id": 1}, queue.Empty()]
+        supervisor._queues = [old]
+        supervisor._processes = [MagicMock(is_alive=MagicMock(return_value=False), exitcode=1)]
+
+        with patch.object(supervisor, "_spawn") as spawn:
+            assert await supervisor.check_health() == 1
+
+        spawn.assert_called_once_with(0)
+        assert supervisor._queues[0] is not old
+        assert supervisor._queues[0].get(timeout=1) == {"update_id": 1}
+        old.close.assert_called_once()